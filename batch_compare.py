@@ -0,0 +1,205 @@
+"""SVG 一括比較（GUI 不要・プロセスプール並列）
+
+使い方:
+    python batch_compare.py testdata/identical/ref.svg testdata/identical/target*.svg -o result.json
+
+終了コード: 0 = 全て一致 / 1 = 差分あり / 2 = エラーあり
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PySide6.QtSvg import QSvgRenderer
+
+import tracing
+from svg_render import ensure_offscreen_app, RasterBuffer
+from diff_engine import compute_diff_rects, block_hashes, regions_to_dicts, Tolerance, ANTIALIAS_TOLERANCE
+from tiled_compare import DEFAULT_MEMORY_BUDGET_MB, fits_in_budget, compare_renderers_tiled
+from svg_structure import structural_diff
+from raster_cache import RasterCache, file_hash
+
+EXIT_IDENTICAL = 0
+EXIT_DIFFERENT = 1
+EXIT_ERROR = 2
+
+# ワーカープロセス内で基準SVGの renderer / 描画済み配列・ブロックハッシュを保持（同じ基準SVGを何度も描画しない）
+_worker_renderers = {}
+_worker_rasters = {}
+_worker_cache = None
+_worker_threads = 1  # プロセス並列と重ねるので既定では 1（--threads で変更）
+
+
+def _init_worker(cache_dir=None, threads=1):
+    global _worker_cache, _worker_threads
+    ensure_offscreen_app()
+    tracing.configure_worker()
+    if cache_dir:
+        _worker_cache = RasterCache(cache_dir)
+    _worker_threads = threads
+
+
+def _load_renderer(path, keep=False):
+    if path in _worker_renderers:
+        return _worker_renderers[path]
+    renderer = QSvgRenderer(path)
+    if not renderer.isValid():
+        raise ValueError(f"SVG を読み込めません: {path}")
+    if keep:
+        _worker_renderers[path] = renderer
+    return renderer
+
+
+def _load_raster(path, renderer, keep=False):
+    """(描画済み配列, ブロックハッシュ)"""
+    if path in _worker_rasters:
+        return _worker_rasters[path]
+    key = arr = None
+    if _worker_cache is not None:
+        size = renderer.defaultSize()
+        key = _worker_cache.make_key(file_hash(path), size.width(), size.height())
+        arr = _worker_cache.get(key)
+    if arr is None:
+        arr = RasterBuffer.from_renderer(renderer).array
+        if key is not None:
+            arr = _worker_cache.put(key, arr)
+    hashes = _worker_cache.block_hashes(key, arr) if key is not None else block_hashes(arr)
+    if keep:
+        _worker_rasters[path] = (arr, hashes)
+    return arr, hashes
+
+
+def compare_pair(ref_path, target_path, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, region_options=None,
+                 keep_reference=True):
+    """基準SVGと対象SVGを比較して結果を dict で返す（ワーカープロセスで実行）
+
+    構造比較で同一と分かれば描画しない。変更要素が特定できればその範囲だけ描画・比較する。
+    文書全体の描画がメモリ上限を超える場合はタイル分割で比較する。
+    region_options（min_area / padding / merge_gap / tolerance）は差分計算と差分領域の後処理に渡す。
+    keep_reference=False なら基準SVGの描画結果をワーカーに残さない（ペアごとに基準が変わるフォルダ比較用）。
+    """
+    options = region_options or {}
+    t0 = time.perf_counter()
+    started = tracing.now()
+    result = {"reference": ref_path, "target": target_path}
+    try:
+        with tracing.span("structural_diff"):
+            structure = structural_diff(ref_path, target_path)
+        if structure.identical:
+            result.update(status="identical", structural=True, rects=[])
+            result["elapsed"] = round(time.perf_counter() - t0, 4)
+            tracing.record("compare_pair", started, target=target_path, status="identical")
+            return result
+
+        renderer_l = _load_renderer(ref_path, keep=keep_reference)
+        renderer_r = _load_renderer(target_path)
+        size_l, size_r = renderer_l.defaultSize(), renderer_r.defaultSize()
+        result["size"] = [size_l.width(), size_l.height()]
+        if size_l != size_r:
+            result.update(status="different", reason="size_mismatch",
+                          target_size=[size_r.width(), size_r.height()],
+                          rects=[])
+        else:
+            if structure.regions is not None:
+                # 変更要素の範囲だけを描画して比較
+                result["regions"] = len(structure.regions)
+                rects = compare_renderers_tiled(renderer_l, renderer_r, memory_budget_mb=memory_budget_mb,
+                                                regions=structure.regions, **options)
+            elif fits_in_budget(size_l.width(), size_l.height(), memory_budget_mb):
+                arr_l, hashes_l = _load_raster(ref_path, renderer_l, keep=keep_reference)
+                arr_r, hashes_r = _load_raster(target_path, renderer_r)
+                rects = compute_diff_rects(arr_l, arr_r, hashes_l=hashes_l, hashes_r=hashes_r,
+                                           workers=_worker_threads, **options)
+            else:
+                result["tiled"] = True
+                rects = compare_renderers_tiled(renderer_l, renderer_r, memory_budget_mb=memory_budget_mb, **options)
+            result.update(status="different" if len(rects) else "identical", rects=regions_to_dicts(rects))
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result["elapsed"] = round(time.perf_counter() - t0, 4)
+    tracing.record("compare_pair", started, target=target_path, status=result["status"])
+    return result
+
+
+def run_batch(ref_path, targets, jobs=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, cache_dir=None,
+              region_options=None, threads=1):
+    """targets を並列比較し、入力順の結果リストを返す"""
+    jobs = jobs or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(targets)))
+    # Qt は fork 後の利用が安全でないため spawn で起動する
+    ctx = multiprocessing.get_context("spawn")
+    chunksize = max(1, len(targets) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx,
+                             initializer=_init_worker, initargs=(cache_dir, threads)) as executor:
+        return list(executor.map(compare_pair, [ref_path] * len(targets), targets,
+                                 [memory_budget_mb] * len(targets), [region_options] * len(targets),
+                                 chunksize=chunksize))
+
+
+def tolerance_from_args(args):
+    """--tolerance / --alpha-aware / --ignore-isolated / --antialias から Tolerance を作る（指定なしは None = 厳密比較）"""
+    if args.antialias:
+        return ANTIALIAS_TOLERANCE
+    tolerance = Tolerance(args.tolerance, args.alpha_aware, args.ignore_isolated)
+    return tolerance if any(tolerance) else None
+
+
+def exit_code(results):
+    if any(r["status"] == "error" for r in results):
+        return EXIT_ERROR
+    if any(r["status"] == "different" for r in results):
+        return EXIT_DIFFERENT
+    return EXIT_IDENTICAL
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SVG一括比較（基準SVG と 複数の対象SVG）")
+    parser.add_argument("reference", help="基準SVG")
+    parser.add_argument("targets", nargs="+", help="比較対象SVG")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    parser.add_argument("-t", "--threads", type=int, default=1,
+                        help="ワーカープロセスごとに差分領域を比較するスレッド数（既定: 1）")
+    parser.add_argument("-m", "--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="1比較あたりのメモリ上限MB（超える文書はタイル分割で比較）")
+    parser.add_argument("--cache-dir", default=None, help="描画済みラスタのキャッシュ先（指定時のみ使用）")
+    parser.add_argument("--min-area", type=int, default=0, help="差分画素数がこれ未満の領域を除く")
+    parser.add_argument("--padding", type=int, default=0, help="差分矩形を広げる幅（px）")
+    parser.add_argument("--merge-gap", type=int, default=None, help="この距離（px）以内の差分矩形を結合する")
+    parser.add_argument("--tolerance", type=int, default=0, help="チャンネルごとの差がこの値以下なら同じとみなす（0〜127）")
+    parser.add_argument("--alpha-aware", action="store_true", help="白背景に合成した見た目で比べる")
+    parser.add_argument("--ignore-isolated", action="store_true", help="孤立した差分画素を無視する")
+    parser.add_argument("--antialias", action="store_true",
+                        help="アンチエイリアスの違いを無視する（--tolerance 16 --alpha-aware --ignore-isolated）")
+    parser.add_argument("-o", "--output", default="-", help="結果JSONの出力先（既定: 標準出力）")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    region_options = {"min_area": args.min_area, "padding": args.padding, "merge_gap": args.merge_gap,
+                      "tolerance": tolerance_from_args(args)}
+    results = run_batch(args.reference, args.targets, args.jobs, args.memory_budget, args.cache_dir,
+                        region_options, args.threads)
+    summary = {
+        "total": len(results),
+        "identical": sum(r["status"] == "identical" for r in results),
+        "different": sum(r["status"] == "different" for r in results),
+        "error": sum(r["status"] == "error" for r in results),
+        "elapsed": round(time.perf_counter() - t0, 4),
+    }
+    report = {"summary": summary, "results": results}
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        print(f"[INFO] 比較結果を保存しました: {args.output}", file=sys.stderr)
+
+    return exit_code(results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""差分カーネルのベンチマーク: 画素ごとの Python ループ（旧実装） vs diff_engine のベクトル化版
+
+    python benchmarks/bench_diff_kernel.py --size 300
+
+旧実装（differ.py の highlight_diff / main2.py の compare_images）をそのまま再現して計測し、
+速度比が --min-speedup（既定 100 倍）を下回れば終了コード 1 を返す。
+"""
+import os
+import sys
+import time
+import ctypes
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtGui import QImage, QColor
+from PySide6.QtCore import Qt
+
+from svg_render import ensure_offscreen_app, qimage_to_numpy_safe, qimage_view, numpy_to_qimage
+from diff_engine import diff_mask, highlight_overlay, highlight_composite
+
+
+# -------------------- 旧実装（比較用にそのまま再現） --------------------
+def legacy_highlight_diff(img1, img2):
+    arr1 = qimage_to_numpy_safe(img1)
+    arr2 = qimage_to_numpy_safe(img2)
+    mask = np.any(arr1 != arr2, axis=-1)
+    highlight_img = QImage(img1.size(), QImage.Format_ARGB32)
+    highlight_img.fill(Qt.transparent)
+    for y in range(img1.height()):
+        for x in range(img1.width()):
+            if mask[y, x]:
+                highlight_img.setPixelColor(x, y, QColor(255, 0, 0, 120))
+    return highlight_img
+
+
+def legacy_compare_images(img1, img2):
+    result = QImage(img1.size(), QImage.Format_ARGB32)
+    for x in range(img1.width()):
+        for y in range(img1.height()):
+            c1 = img1.pixel(x, y)
+            c2 = img2.pixel(x, y)
+            if c1 != c2:
+                result.setPixel(x, y, QColor("red").rgb())
+            else:
+                result.setPixel(x, y, QColor(c1).rgb())
+    return result
+
+
+# -------------------- ベクトル化版（differ.py / main2.py と同じ処理） --------------------
+def vectorized_highlight_diff(img1, img2):
+    mask = diff_mask(qimage_view(img1), qimage_view(img2))
+    highlight_img = QImage(img1.size(), QImage.Format_RGBA8888)
+    highlight_overlay(mask, out=qimage_view(highlight_img, writable=True))
+    return highlight_img
+
+
+def vectorized_compare_images(img1, img2):
+    view1 = qimage_view(img1)
+    mask = diff_mask(view1, qimage_view(img2))
+    result = QImage(img1.size(), QImage.Format_ARGB32)
+    highlight_composite(view1 | 0xFF000000, mask, 0xFFFF0000, out=qimage_view(result, writable=True))
+    return result
+
+
+def make_images(size, diff_ratio, seed=0):
+    rng = np.random.default_rng(seed)
+    arr1 = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    arr1[..., 3] = 255
+    arr2 = arr1.copy()
+    changed = rng.random((size, size)) < diff_ratio
+    arr2[changed, 0] ^= 0xFF
+    img1 = numpy_to_qimage(arr1).convertToFormat(QImage.Format_ARGB32)
+    img2 = numpy_to_qimage(arr2).convertToFormat(QImage.Format_ARGB32)
+    return img1, img2
+
+
+def best_of(func, args, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="差分カーネルのベンチマーク")
+    parser.add_argument("--size", type=int, default=300, help="画像の一辺（旧実装が遅いので小さめに）")
+    parser.add_argument("--diff-ratio", type=float, default=0.05, help="差分画素の割合")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-speedup", type=float, default=100.0)
+    args = parser.parse_args(argv)
+
+    ensure_offscreen_app()
+    img1, img2 = make_images(args.size, args.diff_ratio)
+
+    # PySide6 6.12 + Python 3.11 では setPixel / setPixelColor の呼び出しごとに None の参照カウントが
+    # 1 つ減るバグがあり、旧実装のループは途中でインタプリタごと落ちる。
+    # 計測のため None への参照を持つリストを作り、そのリスト自体は解放されないようにしておく。
+    keep_none = [None] * (args.size * args.size * 4)
+    ctypes.pythonapi.Py_IncRef(ctypes.py_object(keep_none))
+
+    ok = True
+    cases = [
+        ("highlight_diff (differ.py)", legacy_highlight_diff, vectorized_highlight_diff),
+        ("compare_images (main2.py)", legacy_compare_images, vectorized_compare_images),
+    ]
+    print(f"画像サイズ: {args.size}x{args.size} / 差分率: {args.diff_ratio:.0%}")
+    for name, legacy, vectorized in cases:
+        # 結果が一致することを確認してから計測
+        same = qimage_to_numpy_safe(legacy(img1, img2)) == qimage_to_numpy_safe(vectorized(img1, img2))
+        if not same.all():
+            print(f"[ERROR] {name}: 旧実装と結果が一致しません")
+            ok = False
+            continue
+        t_legacy = best_of(legacy, (img1, img2), 1)
+        t_vec = best_of(vectorized, (img1, img2), args.repeat)
+        speedup = t_legacy / t_vec
+        print(f"{name}: 旧 {t_legacy:.3f} 秒 / 新 {t_vec * 1000:.2f} ミリ秒 / {speedup:.0f} 倍")
+        ok = ok and speedup >= args.min_speedup
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""比較パイプラインの段階別ベンチマーク（回帰の記録・比較つき）
+
+    python benchmarks/bench_pipeline.py --case small medium --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/bench_pipeline.py --case small medium --baseline results/abc1234.json --max-regression 1.25
+
+svg_corpus.py で合成した SVG ペアについて、各段階の所要時間（--repeat 回の最小値）を計測する。
+    parse      QSvgRenderer の読み込み（左右）
+    structure  構造比較 structural_diff
+    render     RasterBuffer への描画（左右）
+    convert    差分計算用の前処理（ブロックハッシュ。RasterBuffer は配列をそのまま共有するので変換コピーは無い）
+    diff       候補範囲の実解像度比較と連結成分の抽出（compute_diff_rects、まとめ処理なし）
+    label      差分領域のまとめ（refine_regions の merge_gap=LABEL_MERGE_GAP。既定の比較では結合しない）
+    scene      QGraphicsScene の構築（タイル表示アイテム×2・差分矩形アイテム・差分リスト）
+    save/load  比較結果ファイル（縮小画像つき）の書き込み・読み込み
+文書がメモリ上限（--memory-budget）を超えるケースは全体を一度に描画せず、
+render / convert / diff / label の代わりに tiled（タイル分割比較の合計）を計測する。
+
+結果は JSON（版・実行環境・ケースごとの段階別秒数）で保存し、--baseline で前の版と比べられる。
+いずれかの段階が --max-regression 倍より遅くなっていれば終了コード 1 を返す。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtWidgets import QApplication, QGraphicsScene
+from PySide6.QtCore import QCoreApplication
+
+from svg_render import RasterBuffer, render_thumbnail, qimage_to_png
+from svg_structure import structural_diff
+from diff_engine import block_hashes, compute_diff_rects, refine_regions, region_rects
+from tiled_compare import fits_in_budget, compare_renderers_tiled
+from diff_index import RectIndex
+from diff_view import DiffListModel, DiffRectsItem
+from tile_item import SvgTileItem
+from result_bundle import ResultBundle, write_bundle, read_bundle
+from raster_cache import file_hash
+
+from svg_corpus import CASES, write_pair
+
+RESULT_VERSION = 1
+LABEL_MERGE_GAP = 8  # label 段で計測する結合距離（px）
+NOISE_FLOOR = 0.005  # これより小さい増加（秒）は計測のばらつきとして遅化に数えない
+
+
+def code_version():
+    """計測対象の版（git のコミット。未コミットの変更があれば -dirty）"""
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class StageTimer:
+    """段階ごとに最小の所要時間を記録する"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, func, *args):
+        t0 = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - t0
+        self.stages[name] = min(elapsed, self.stages.get(name, float("inf")))
+        return result
+
+
+def run_case(timer, path_l, path_r, memory_budget_mb, out_dir):
+    """1 回分のパイプラインを段階ごとに計測して差分領域数を返す"""
+    renderers = timer.run("parse", lambda: [QSvgRenderer(path_l), QSvgRenderer(path_r)])
+    size = renderers[0].defaultSize()
+    width, height = size.width(), size.height()
+    timer.run("structure", structural_diff, path_l, path_r)
+
+    if fits_in_budget(width, height, memory_budget_mb):
+        buffers = timer.run("render", lambda: [RasterBuffer.from_renderer(r) for r in renderers])
+        hashes = timer.run("convert", lambda: [block_hashes(buf.array) for buf in buffers])
+        regions = timer.run("diff", lambda: compute_diff_rects(buffers[0].array, buffers[1].array,
+                                                               hashes_l=hashes[0], hashes_r=hashes[1],
+                                                               merge_gap=None))
+        regions = timer.run("label", refine_regions, regions, width, height, 0, 0, LABEL_MERGE_GAP)
+        del buffers
+    else:
+        regions = timer.run("tiled", compare_renderers_tiled, renderers[0], renderers[1], None, memory_budget_mb)
+    rects = region_rects(regions)
+
+    def build_scene():
+        scene = QGraphicsScene()
+        for renderer in renderers:
+            scene.addItem(SvgTileItem(renderer))
+        index = RectIndex(rects)
+        overlay = DiffRectsItem()
+        overlay.set_index(index)
+        scene.addItem(overlay)
+        model = DiffListModel()
+        model.set_index(index)
+        return scene, model
+    timer.run("scene", build_scene)
+
+    bundle_path = os.path.join(out_dir, "result.svgdiff")
+
+    def save():
+        thumbnails = {side: qimage_to_png(render_thumbnail(r)) for side, r in zip(("left", "right"), renderers)}
+        write_bundle(bundle_path, ResultBundle(width, height, rects, file_hash(path_l), file_hash(path_r), thumbnails))
+    timer.run("save", save)
+    timer.run("load", read_bundle, bundle_path)
+    return len(regions)
+
+
+def compare_results(current, baseline, max_regression):
+    """前の版の結果と段階ごとに比べ、閾値を超えて遅くなった (ケース, 段階) を返す"""
+    previous = {case["name"]: case for case in baseline["cases"]}
+    regressions = []
+    print(f"比較対象: {baseline['version']} → {current['version']}")
+    for case in current["cases"]:
+        before = previous.get(case["name"])
+        if before is None or before["params"] != case["params"]:
+            print(f"  {case['name']}: 比較対象なし")
+            continue
+        for stage, seconds in case["stages"].items():
+            old = before["stages"].get(stage)
+            if not old:
+                continue
+            ratio = seconds / old
+            mark = ""
+            if ratio > max_regression and seconds - old > NOISE_FLOOR:
+                regressions.append((case["name"], stage))
+                mark = "  [遅化]"
+            print(f"  {case['name']:>8} {stage:>9}: {old * 1000:9.1f} → {seconds * 1000:9.1f} ミリ秒 ({ratio:4.2f} 倍){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比較パイプラインの段階別ベンチマーク")
+    parser.add_argument("--case", choices=sorted(CASES), nargs="+", default=["small", "medium"])
+    parser.add_argument("--size", type=int, help="既定のケースの代わりに 1 ケースだけ指定する")
+    parser.add_argument("--elements", type=int, default=1000)
+    parser.add_argument("--path-segments", type=int, default=16)
+    parser.add_argument("--diff-density", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--memory-budget", type=int, default=1024, help="全体を一度に描画する上限（MB）")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    parser.add_argument("--baseline", help="比較する前の版の結果 JSON")
+    parser.add_argument("--max-regression", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    app = QCoreApplication.instance() or QApplication([])
+    if args.size:
+        cases = {"custom": dict(size=args.size, elements=args.elements,
+                                path_segments=args.path_segments, diff_density=args.diff_density)}
+    else:
+        cases = {name: CASES[name] for name in args.case}
+
+    result = {
+        "format": RESULT_VERSION,
+        "version": code_version(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "numpy": np.__version__},
+        "repeat": args.repeat,
+        "memory_budget_mb": args.memory_budget,
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, spec in cases.items():
+            t0 = time.perf_counter()
+            path_l, path_r = write_pair(tmp, name, seed=args.seed, **spec)
+            print(f"[INFO] {name}: {spec} （生成 {time.perf_counter() - t0:.1f} 秒）")
+            timer = StageTimer()
+            for _ in range(args.repeat):
+                regions = run_case(timer, path_l, path_r, args.memory_budget, tmp)
+                app.processEvents()
+            for stage, seconds in timer.stages.items():
+                print(f"  {stage:>9}: {seconds * 1000:9.1f} ミリ秒")
+            print(f"  差分領域: {regions} 件")
+            result["cases"].append({"name": name, "params": dict(spec, seed=args.seed),
+                                    "stages": timer.stages, "regions": regions})
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] 結果を保存しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(result, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""ラスタ保持方式のピークメモリ比較: 旧パイプライン vs RasterBuffer
+
+    python benchmarks/bench_raster_memory.py --size 6000
+
+旧: QImage(ARGB32) → RGBA8888 へ変換 → np.array でコピー、表示用に QPixmap も作る（1 側あたり 4 枚）
+新: RasterBuffer に直接描画し、差分計算はそのビューを使う（表示は SvgTileItem なので全面の QPixmap は作らない）
+それぞれ別プロセスで実行し、比較処理の前後の最大 RSS の増分を比べる。
+削減率が --min-reduction（既定 50%）を下回れば終了コード 1 を返す。
+"""
+import os
+import sys
+import json
+import resource
+import argparse
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_svg(path, size, shift=0):
+    shapes = "".join(
+        f'<rect x="{(i * 97) % (size - 100)}" y="{(i * 53 + shift) % (size - 100)}" width="80" height="50" '
+        f'fill="#{(i * 4567) % 0xFFFFFF:06x}"/>'
+        for i in range(2000))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}">{shapes}</svg>')
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux は KB 単位
+
+
+def run_pipeline(mode, path_l, path_r):
+    """1 回分の比較を実行し、処理中に増えた最大 RSS（MB）を返す"""
+    from PySide6.QtSvg import QSvgRenderer
+    from PySide6.QtGui import QPixmap, QImage, QPainter
+    from PySide6.QtCore import Qt
+    from svg_render import ensure_offscreen_app, qimage_to_numpy_safe, RasterBuffer
+    from diff_engine import compute_diff_rects
+
+    ensure_offscreen_app()
+    renderers = [QSvgRenderer(path_l), QSvgRenderer(path_r)]
+    compute_diff_rects(RasterBuffer(64, 64).array, RasterBuffer(64, 64).array)  # import・初期化分を除く
+    base = max_rss_mb()
+
+    keep = []
+    if mode == "legacy":
+        arrays = []
+        for renderer in renderers:
+            img = QImage(renderer.defaultSize(), QImage.Format_ARGB32)
+            img.fill(Qt.transparent)
+            p = QPainter(img)
+            renderer.render(p)
+            p.end()
+            arr = qimage_to_numpy_safe(img)
+            keep += [img, QPixmap.fromImage(img)]
+            arrays.append(arr)
+    else:
+        buffers = [RasterBuffer.from_renderer(renderer) for renderer in renderers]
+        keep += buffers
+        arrays = [buf.array for buf in buffers]
+    regions = compute_diff_rects(arrays[0], arrays[1])
+    return {"peak_mb": max_rss_mb() - base, "regions": len(regions)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ラスタ保持方式のピークメモリ比較")
+    parser.add_argument("--size", type=int, default=6000, help="SVG の一辺（px）")
+    parser.add_argument("--min-reduction", type=float, default=0.5)
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "LEFT", "RIGHT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_pipeline(*args.child)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path_l, path_r = os.path.join(tmp, "l.svg"), os.path.join(tmp, "r.svg")
+        make_svg(path_l, args.size)
+        make_svg(path_r, args.size, shift=7)
+
+        results = {}
+        for mode in ("legacy", "raster_buffer"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, path_l, path_r],
+                                 capture_output=True, text=True, check=True,
+                                 env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+            results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    legacy, new = results["legacy"], results["raster_buffer"]
+    reduction = 1 - new["peak_mb"] / legacy["peak_mb"]
+    buffer_mb = args.size * args.size * 4 / 1024 ** 2
+    print(f"画像サイズ: {args.size}x{args.size}（1 枚 {buffer_mb:.0f} MB）")
+    print(f"旧: 最大 RSS 増分 {legacy['peak_mb']:.0f} MB / 差分 {legacy['regions']} 件")
+    print(f"新: 最大 RSS 増分 {new['peak_mb']:.0f} MB / 差分 {new['regions']} 件")
+    print(f"削減率: {reduction:.0%}")
+    ok = reduction >= args.min_reduction and legacy["regions"] == new["regions"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""常駐比較サービスの応答時間と、毎回起動する場合（コールドスタート）の比較
+
+    python benchmarks/bench_service.py --repeat 50
+    python benchmarks/bench_service.py --case small --repeat 20 --inline
+
+小さな SVG ペア（既定は testdata/identical の ref.svg と target3.svg）について、
+    cold     python batch_compare.py ref target -j 1 を毎回起動（Python・PySide6 等の読み込みと Qt の初期化を含む）
+    service  compare_service.py を 1 回起動しておき、compare_client の接続を使い回して依頼
+の 1 件あたりの時間を計測する。サービスは Unix ソケットで一時ディレクトリに起動し、終了時に止める。
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compare_client import ServiceClient, latency_summary
+
+from svg_corpus import CASES, write_pair
+
+
+def measure_cold(ref, target, repeat, env):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, "batch_compare.py"), ref, target, "-j", "1"],
+                       cwd=ROOT, env=env, stdout=subprocess.DEVNULL, check=False)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def start_service(socket_path, env, timeout=60):
+    """サービスを起動し、応答するようになったら (プロセス, 起動にかかった秒数) を返す"""
+    t0 = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "compare_service.py"), "--socket", socket_path,
+                                "-j", "1"], cwd=ROOT, env=env)
+    while time.perf_counter() - t0 < timeout:
+        if process.poll() is not None:
+            raise RuntimeError("サービスが起動しませんでした")
+        if os.path.exists(socket_path):
+            client = ServiceClient(socket_path=socket_path, timeout=5)
+            try:
+                client.status()
+                return process, time.perf_counter() - t0
+            except OSError:
+                pass
+            finally:
+                client.close()
+        time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("サービスの起動が時間内に終わりませんでした")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐比較サービスの応答時間ベンチマーク")
+    parser.add_argument("--case", choices=sorted(CASES), help="testdata の代わりに合成コーパスのペアを使う")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cold-repeat", type=int, default=5, help="コールドスタートの計測回数")
+    parser.add_argument("--inline", action="store_true", help="パスではなく SVG の内容を送る")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.case:
+            ref, target = write_pair(tmp, args.case, **CASES[args.case])
+        else:
+            ref = os.path.join(ROOT, "testdata", "identical", "ref.svg")
+            target = os.path.join(ROOT, "testdata", "identical", "target3.svg")
+        # 毎回同じ条件で比べるよう、ラスタキャッシュは一時ディレクトリに置く
+        env = dict(os.environ, SVGDIFF_CACHE_DIR=os.path.join(tmp, "cache"), QT_QPA_PLATFORM="offscreen")
+
+        cold = measure_cold(ref, target, args.cold_repeat, env)
+        print(f"cold    : {latency_summary(cold)}")
+
+        socket_path = os.path.join(tmp, "svgdiff.sock")
+        process, startup = start_service(socket_path, env)
+        try:
+            client = ServiceClient(socket_path=socket_path)
+            client.compare(ref, target, args.inline)  # 1 件目（ラスタキャッシュへの書き込みを含む）
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                result = client.compare(ref, target, args.inline)
+                samples.append(time.perf_counter() - t0)
+            client.stop()
+            client.close()
+        finally:
+            process.wait(timeout=30)
+        print(f"service : {latency_summary(samples)}（起動 {startup:.2f} 秒は 1 回だけ）")
+        print(f"結果: {result['status']} / 差分 {len(result.get('rects', []))} 件 / "
+              f"コールドスタートの {sorted(cold)[len(cold) // 2] / sorted(samples)[len(samples) // 2]:.0f} 倍速")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
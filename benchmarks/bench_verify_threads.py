@@ -0,0 +1,71 @@
+"""候補範囲の実解像度比較のスレッド並列ベンチマーク
+
+    python benchmarks/bench_verify_threads.py --size 8000 --workers 1 2 4 8 16
+
+ブロックハッシュで見つかった候補範囲（多数の中くらいの領域）を compute_diff_rects で比較し、
+スレッド数ごとの所要時間と 1 スレッドに対する速度比を出す。
+結果がスレッド数によらず一致することも確認する（一致しなければ終了コード 1）。
+速度比はマシンのコア数が上限になる（1 コアの環境では 1 倍前後）。
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_engine import BLOCK_SIZE, block_hashes, compute_diff_rects
+
+
+def make_arrays(size, regions, seed=0):
+    """互いに離れた 3×3 ブロックの範囲ごとに、小さな差分矩形を 10 個ずつ入れた左右の配列"""
+    rng = np.random.default_rng(seed)
+    arr_l = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    arr_r = arr_l.copy()
+    cells = size // (BLOCK_SIZE * 4)
+    for i in rng.choice(cells * cells, min(regions, cells * cells), replace=False):
+        y, x = (i // cells) * BLOCK_SIZE * 4, (i % cells) * BLOCK_SIZE * 4
+        for px, py in rng.integers(0, BLOCK_SIZE * 3 - 16, (10, 2)):
+            arr_r[y + py:y + py + 16, x + px:x + px + 16, 0] ^= 0xFF
+    return arr_l, arr_r
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="候補範囲比較のスレッド並列ベンチマーク")
+    parser.add_argument("--size", type=int, default=8000)
+    parser.add_argument("--regions", type=int, default=600, help="候補範囲の数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    arr_l, arr_r = make_arrays(args.size, args.regions)
+    hashes_l, hashes_r = block_hashes(arr_l), block_hashes(arr_r)
+    print(f"画像サイズ: {args.size}x{args.size} / 候補範囲: {args.regions} / CPU: {os.cpu_count()}")
+
+    ok = True
+    baseline = reference = None
+    for workers in args.workers:
+        elapsed, regions = best_of(lambda: compute_diff_rects(arr_l, arr_r, hashes_l=hashes_l, hashes_r=hashes_r,
+                                                              merge_gap=None, workers=workers), args.repeat)
+        if reference is None:
+            baseline, reference = elapsed, regions
+        elif not np.array_equal(regions, reference):
+            print(f"[ERROR] workers={workers}: 1 スレッドと結果が一致しません")
+            ok = False
+        print(f"workers={workers:3d}: {elapsed * 1000:8.1f} ミリ秒 / {baseline / elapsed:5.2f} 倍 / {len(regions)} 領域")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""SVG 前処理（svg_normalize）の正しさの確認と効果の計測
+
+    python benchmarks/check_normalize.py --case small medium
+    python benchmarks/check_normalize.py --files testdata/identical/*.svg
+
+svg_corpus.py のコーパス（--cruft 付きと無しの両方）と --files の SVG について、
+元の文書と前処理した文書をそれぞれ描画し、画素単位で一致するかを確かめる（一致しなければ終了コード 1）。
+あわせて文書サイズと、QSvgRenderer の読み込み・描画時間（--repeat 回の最小値）を出す。
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QByteArray, QCoreApplication
+
+from svg_render import RasterBuffer
+from svg_normalize import normalize_svg
+
+from svg_corpus import CASES, write_pair
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def check_file(path, repeat):
+    """元の文書と前処理後の文書の描画が一致すれば True"""
+    with open(path, "rb") as f:
+        data = f.read()
+    t_norm, normalized = best_of(lambda: normalize_svg(data), 1)
+
+    rasters = []
+    timings = []
+    for doc in (data, normalized):
+        t_parse, renderer = best_of(lambda: QSvgRenderer(QByteArray(doc)), repeat)
+        t_render, raster = best_of(lambda: RasterBuffer.from_renderer(renderer), repeat)
+        rasters.append(raster)
+        timings.append((t_parse, t_render))
+
+    same = rasters[0].array.shape == rasters[1].array.shape and np.array_equal(rasters[0].array, rasters[1].array)
+    (p0, r0), (p1, r1) = timings
+    print(f"{os.path.basename(path)}: {len(data) / 1024:9.1f} → {len(normalized) / 1024:9.1f} KB / "
+          f"前処理 {t_norm * 1000:7.1f} ミリ秒 / 読み込み {p0 * 1000:7.1f} → {p1 * 1000:7.1f} / "
+          f"描画 {r0 * 1000:7.1f} → {r1 * 1000:7.1f} ミリ秒 / {'一致' if same else '[ERROR] 不一致'}")
+    if not same and rasters[0].array.shape == rasters[1].array.shape:
+        diff = np.any(rasters[0].array != rasters[1].array, axis=-1)
+        print(f"  不一致の画素: {int(diff.sum())}")
+    return same
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SVG 前処理の描画一致の確認")
+    parser.add_argument("--case", choices=sorted(CASES), nargs="*", default=["small", "medium"])
+    parser.add_argument("--files", nargs="*", default=[], help="追加で確認する SVG（glob 可）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    app = QCoreApplication.instance() or QApplication([])
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for name in args.case:
+            for cruft in (False, True):
+                label = f"{name}-cruft" if cruft else name
+                paths += write_pair(tmp, label, seed=args.seed, cruft=cruft, **CASES[name])
+        for pattern in args.files:
+            paths += sorted(glob.glob(pattern))
+        for path in paths:
+            ok &= check_file(path, args.repeat)
+            app.processEvents()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""タイル・範囲ごとに比較してつなぎ直した差分領域が、全体を一度に比較した結果と一致するかの確認
+
+    python benchmarks/check_stitch.py
+    python benchmarks/check_stitch.py --cases 200 --seed 1
+
+乱数で作った差分マスク（点・斜めの線・塊。タイル境界を斜めにまたぐ成分や、外接矩形だけが重なる別々の成分ができる）
+ごとに、
+    regions  compute_diff_rects_in_regions() に格子状の範囲を渡したもの
+    tiled    マスクを SVG の矩形にして compare_renderers_tiled() でタイル比較したもの
+の差分領域（外接矩形・画素数・重心）と差分画素を compute_diff_rects() の全体比較と比べる（どれかが合わなければ終了コード 1）。
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from PySide6.QtCore import QByteArray
+from PySide6.QtSvg import QSvgRenderer
+
+from svg_render import ensure_offscreen_app, RasterBuffer
+from diff_engine import compute_diff_rects, compute_diff_rects_in_regions
+from tiled_compare import compare_renderers_tiled, iter_tiles
+from sparse_mask import RunMask
+
+
+def random_mask(rng, width, height):
+    """点・斜めの線・小さな塊を散らした差分マスク"""
+    mask = rng.random((height, width)) < rng.uniform(0.0, 0.05)
+    for _ in range(rng.integers(0, 30)):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        dx, dy = rng.choice([-1, 0, 1]), rng.choice([-1, 0, 1])
+        for _ in range(rng.integers(2, max(width, height))):
+            if not (0 <= x < width and 0 <= y < height):
+                break
+            mask[y, x] = True
+            x, y = x + dx, y + dy
+    for _ in range(rng.integers(0, 10)):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        mask[y:y + rng.integers(1, 12), x:x + rng.integers(1, 12)] = True
+    return mask
+
+
+def mask_svg(mask):
+    """差分画素を 1 行ずつの黒い矩形にした SVG（整数座標なのでアンチエイリアスは掛からない）"""
+    height, width = mask.shape
+    rects = "".join(f'<rect x="{x0}" y="{y}" width="{x1 - x0}" height="1"/>'
+                    for y, x0, x1 in RunMask.from_dense(mask).runs.tolist())
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}" shape-rendering="crispEdges">{rects}</svg>').encode("utf-8")
+
+
+def summary(regions):
+    """順序によらず比べられるよう並べ替えた (x, y, w, h, 画素数) と重心 (cx, cy) の配列"""
+    rows = sorted((int(r["x"]), int(r["y"]), int(r["w"]), int(r["h"]), int(r["area"]),
+                   float(r["cx"]), float(r["cy"])) for r in regions)
+    table = np.array(rows, np.float64).reshape(-1, 7)
+    return table[:, :5].astype(np.int64), table[:, 5:]
+
+
+def same_regions(a, b):
+    """外接矩形・画素数が一致し、重心が float32 の丸め誤差の範囲で一致すれば True"""
+    (keys_a, centers_a), (keys_b, centers_b) = summary(a), summary(b)
+    return np.array_equal(keys_a, keys_b) and np.allclose(centers_a, centers_b, atol=1e-3)
+
+
+def check_case(rng, index, blank):
+    width, height = (int(v) for v in rng.integers(40, 200, 2))
+    tile = int(rng.integers(8, 64))
+    mask = random_mask(rng, width, height)
+
+    arr_l = blank[:height, :width].copy()
+    arr_r = arr_l.copy()
+    arr_r[mask] = (0, 0, 0, 255)
+    full, full_mask = compute_diff_rects(arr_l, arr_r, return_mask=True)
+
+    grid = list(iter_tiles(width, height, tile))
+    regions, regions_mask = compute_diff_rects_in_regions(arr_l, arr_r, grid, return_mask=True)
+
+    renderer_l = QSvgRenderer(QByteArray(mask_svg(np.zeros_like(mask))))
+    renderer_r = QSvgRenderer(QByteArray(mask_svg(mask)))
+    tiled, tiled_mask = compare_renderers_tiled(renderer_l, renderer_r, tile_size=tile, return_mask=True)
+
+    problems = []
+    for name, found, found_mask in (("regions", regions, regions_mask), ("tiled", tiled, tiled_mask)):
+        if not same_regions(found, full):
+            problems.append(f"{name} 領域 {len(found)} 件（全体比較 {len(full)} 件）")
+        if found_mask != full_mask:
+            problems.append(f"{name} 差分画素 {found_mask.count()}（全体比較 {full_mask.count()}）")
+    if problems:
+        print(f"[ERROR] case {index}: {width}x{height} タイル {tile}: " + " / ".join(problems))
+    return not problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="タイル・範囲ごとの比較のつなぎ直しの確認")
+    parser.add_argument("--cases", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    ensure_offscreen_app()
+    rng = np.random.default_rng(args.seed)
+    # 左側は白紙の SVG を描画したもの（タイル比較の左側と同じ画素値にする）
+    blank = RasterBuffer.from_renderer(QSvgRenderer(QByteArray(mask_svg(np.zeros((200, 200), bool))))).array
+    failed = sum(not check_case(rng, i, blank) for i in range(args.cases))
+    print(f"{args.cases - failed} / {args.cases} 件一致")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""構造比較（svg_structure）の絞り込みが安全かの確認
+
+    python benchmarks/check_structure.py
+    python benchmarks/check_structure.py --pair a.svg b.svg
+
+組み込みのペア（CSS の class で線幅を指定したパスを動かしたもの など）と --pair の SVG について、
+左右を全体描画した差分画素が、構造比較の結果（同一 / 絞り込んだ範囲）の外に出ていないかを確かめ、
+batch_compare.compare_pair() の判定が全体比較と一致するかも見る（どれかが合わなければ終了コード 1）。
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from PySide6.QtSvg import QSvgRenderer
+
+from svg_render import ensure_offscreen_app, RasterBuffer
+from diff_engine import diff_mask
+from svg_structure import structural_diff, clip_regions
+from batch_compare import compare_pair
+
+_HEADER = '<svg xmlns="http://www.w3.org/2000/svg" width="200" height="200" viewBox="0 0 200 200">'
+
+# 名前 → (左, 右)。右は左の図形を 10px 動かしたもの（use-clone だけは色を変えたもの）
+CASES = {
+    # 線幅が <style> の class セレクタにしか無い（属性だけ見ると線幅 1 の細い帯に絞り込んでしまう）
+    "css-class-stroke": (
+        _HEADER + '<style>.c{stroke:black;stroke-width:30;fill:none}</style>'
+                  '<path class="c" d="M40 100 H160"/></svg>',
+        _HEADER + '<style>.c{stroke:black;stroke-width:30;fill:none}</style>'
+                  '<path class="c" d="M40 110 H160"/></svg>'),
+    # 要素セレクタ（class 属性なし）
+    "css-type-selector": (
+        _HEADER + '<style>path{stroke:black;stroke-width:30;fill:none}</style><path d="M40 100 H160"/></svg>',
+        _HEADER + '<style>path{stroke:black;stroke-width:30;fill:none}</style><path d="M40 110 H160"/></svg>'),
+    # style 属性・プレゼンテーション属性（絞り込んでよい）
+    "inline-style": (
+        _HEADER + '<path style="stroke:black;stroke-width:30;fill:none" d="M40 100 H160"/></svg>',
+        _HEADER + '<path style="stroke:black;stroke-width:30;fill:none" d="M40 110 H160"/></svg>'),
+    # <use> で複製される要素の色だけを変える（複製元は白い矩形で隠れていて、複製先だけが見える）
+    "use-clone": (
+        _HEADER.replace('<svg ', '<svg xmlns:xlink="http://www.w3.org/1999/xlink" ')
+        + '<rect id="p" x="10" y="10" width="50" height="50" fill="red"/>'
+          '<rect x="0" y="0" width="80" height="80" fill="white"/><use xlink:href="#p" x="100"/></svg>',
+        _HEADER.replace('<svg ', '<svg xmlns:xlink="http://www.w3.org/1999/xlink" ')
+        + '<rect id="p" x="10" y="10" width="50" height="50" fill="blue"/>'
+          '<rect x="0" y="0" width="80" height="80" fill="white"/><use xlink:href="#p" x="100"/></svg>'),
+    "attributes": (
+        _HEADER + '<path stroke="black" stroke-width="30" fill="none" d="M40 100 H160"/></svg>',
+        _HEADER + '<path stroke="black" stroke-width="30" fill="none" d="M40 110 H160"/></svg>'),
+}
+
+
+def render(path):
+    renderer = QSvgRenderer(path)
+    if not renderer.isValid():
+        raise ValueError(f"SVG を読み込めません: {path}")
+    return RasterBuffer.from_renderer(renderer).array
+
+
+def check_pair(name, path_l, path_r):
+    """構造比較の結果が全体比較の差分画素をすべて含めば True"""
+    mask = diff_mask(render(path_l), render(path_r))
+    height, width = mask.shape
+    structure = structural_diff(path_l, path_r)
+    if structure.identical:
+        outside = int(mask.sum())
+        label = "同一"
+    elif structure.regions is None:
+        outside = 0
+        label = "全体比較"
+    else:
+        covered = np.zeros_like(mask)
+        for x, y, w, h in clip_regions(structure.regions, width, height):
+            covered[y:y + h, x:x + w] = True
+        outside = int((mask & ~covered).sum())
+        label = f"範囲 {len(structure.regions)} 件"
+
+    result = compare_pair(path_l, path_r, keep_reference=False)
+    expected = "different" if mask.any() else "identical"
+    ok = outside == 0 and result["status"] == expected
+    print(f"{name}: 差分画素 {int(mask.sum())} / 構造比較 {label} / 範囲外 {outside} / "
+          f"compare_pair {result['status']}（全体比較 {expected}） / {'OK' if ok else '[ERROR] 不一致'}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="構造比較の絞り込みの安全性の確認")
+    parser.add_argument("--pair", nargs=2, action="append", default=[], metavar=("LEFT", "RIGHT"),
+                        help="追加で確認する SVG のペア")
+    args = parser.parse_args(argv)
+
+    ensure_offscreen_app()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, docs in CASES.items():
+            paths = []
+            for side, doc in zip(("left", "right"), docs):
+                paths.append(os.path.join(tmp, f"{name}-{side}.svg"))
+                with open(paths[-1], "w", encoding="utf-8") as f:
+                    f.write(doc)
+            ok &= check_pair(name, *paths)
+        for path_l, path_r in args.pair:
+            ok &= check_pair(os.path.basename(path_r), path_l, path_r)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
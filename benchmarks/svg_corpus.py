@@ -0,0 +1,166 @@
+"""ベンチマーク用の合成 SVG コーパス生成
+
+    python benchmarks/svg_corpus.py out_dir --case medium
+    python benchmarks/svg_corpus.py out_dir --size 20000 --elements 50000 --path-segments 40 --diff-density 0.001
+
+同じ引数・シードからは同じファイルが生成される。
+左右のペア（<name>-left.svg / <name>-right.svg）を作り、右側だけ要素の一部を変更する。
+    size           文書の一辺（px）
+    elements       図形要素の数（rect / circle / ellipse / polygon / path を混ぜる）
+    path_segments  path 1 本あたりの 3 次ベジェ曲線の数（パスの複雑さ）
+    diff_density   右側で変更する要素の割合（色の変更・移動・削除を半々程度で混ぜる）
+    cruft          CAD・エディタの書き出しに多い、描画に関係しない内容を混ぜる
+                   （metadata・独自名前空間の属性・未使用の defs・入れ子の <g>・transform・字下げ）
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+# 既定のケース（bench_pipeline.py もこれを使う）
+CASES = {
+    "small": dict(size=1000, elements=500, path_segments=8, diff_density=0.01),
+    "medium": dict(size=4000, elements=5000, path_segments=16, diff_density=0.005),
+    "large": dict(size=8000, elements=20000, path_segments=24, diff_density=0.002),
+    "huge": dict(size=20000, elements=50000, path_segments=40, diff_density=0.001),
+}
+
+
+def _color(rng):
+    return "#%06x" % int(rng.integers(0, 0xFFFFFF))
+
+
+def _shape(rng, size, path_segments):
+    """ランダムな図形要素 1 つを (タグ, 属性 dict) で返す"""
+    kind = rng.choice(["rect", "circle", "ellipse", "polygon", "path"], p=[0.3, 0.2, 0.15, 0.15, 0.2])
+    extent = max(8, size // 40)
+    x, y = (int(v) for v in rng.integers(0, size - extent, 2))
+    attrs = {"fill": _color(rng)}
+    if kind == "rect":
+        attrs.update(x=x, y=y, width=int(rng.integers(4, extent)), height=int(rng.integers(4, extent)))
+    elif kind == "circle":
+        r = int(rng.integers(2, extent // 2))
+        attrs.update(cx=x + r, cy=y + r, r=r)
+    elif kind == "ellipse":
+        rx, ry = (int(v) for v in rng.integers(2, extent // 2, 2))
+        attrs.update(cx=x + rx, cy=y + ry, rx=rx, ry=ry)
+    elif kind == "polygon":
+        pts = rng.integers(0, extent, (int(rng.integers(3, 9)), 2)) + (x, y)
+        attrs["points"] = " ".join(f"{px},{py}" for px, py in pts.tolist())
+    else:
+        pts = rng.integers(0, extent, (path_segments * 3 + 1, 2)) + (x, y)
+        d = [f"M{pts[0, 0]},{pts[0, 1]}"]
+        for i in range(1, len(pts), 3):
+            (ax, ay), (bx, by), (cx, cy) = pts[i:i + 3].tolist()
+            d.append(f"C{ax},{ay} {bx},{by} {cx},{cy}")
+        attrs.update(d=" ".join(d) + "Z", stroke=_color(rng), fill="none" if rng.random() < 0.5 else attrs["fill"])
+    return str(kind), attrs
+
+
+def _element(tag, attrs):
+    return f"<{tag} " + " ".join(f'{k}="{v}"' for k, v in attrs.items()) + "/>"
+
+
+def _document(size, shapes, cruft=False):
+    # 一定数ごとに <g> でまとめる（構造比較の祖先チェーンも計測対象にする）
+    body = []
+    for i in range(0, len(shapes), 100):
+        body.append(f'<g id="g{i // 100}">' if not cruft else
+                    f'<g id="g{i // 100}" inkscape:label="layer {i // 100}" inkscape:groupmode="layer">')
+        for j, (tag, attrs) in enumerate(shapes[i:i + 100]):
+            if not tag:
+                continue
+            if not cruft:
+                body.append(_element(tag, attrs))
+                continue
+            if j % 11 == 0 and "fill" in attrs and attrs["fill"] != "none":
+                attrs = dict(attrs, fill="url(#grad0)")
+            element = "    " + _element(tag, dict(attrs, **{"sodipodi:nodetypes": "cc"}))
+            if j % 5 == 0:
+                element = f'  <g transform="translate(0,0)">\n  <g>\n{element}\n  </g>\n  </g>'
+            elif j % 5 == 1:
+                element = f'  <g transform="translate(2,1)">\n{element}\n  </g>'
+            body.append(element)
+        body.append("</g>")
+    if not cruft:
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+                f'viewBox="0 0 {size} {size}">\n' + "\n".join(body) + "\n</svg>\n")
+    defs = ['<defs>', '  <linearGradient id="grad0"><stop offset="0" stop-color="#336699"/>'
+                      '<stop offset="1" stop-color="#cc9933"/></linearGradient>']
+    defs += [f'  <linearGradient id="unused{k}"><stop offset="0" stop-color="#000"/></linearGradient>'
+             for k in range(50)]
+    defs += ['  <clipPath id="unusedclip"><rect width="10" height="10"/></clipPath>', '</defs>']
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<!-- generated by svg_corpus.py -->\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+            f'xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd" '
+            f'xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+            f'width="{size}" height="{size}" viewBox="0 0 {size} {size}" inkscape:version="1.2">\n'
+            '<title>corpus</title>\n<metadata><rdf:RDF><rdf:Description about="corpus"/></rdf:RDF></metadata>\n'
+            f'<sodipodi:namedview pagecolor="#ffffff" inkscape:zoom="1"/>\n'
+            + "\n".join(defs + body) + "\n</svg>\n")
+
+
+def generate_pair(size, elements, path_segments=16, diff_density=0.0, seed=0, cruft=False):
+    """(左 SVG 文字列, 右 SVG 文字列, 変更した要素数) を返す"""
+    rng = np.random.default_rng(seed)
+    shapes = [_shape(rng, size, path_segments) for _ in range(elements)]
+    changed = [(tag, dict(attrs)) for tag, attrs in shapes]
+
+    count = int(round(elements * diff_density))
+    if diff_density > 0:
+        count = max(count, 1)
+    for i in rng.choice(elements, min(count, elements), replace=False).tolist():
+        tag, attrs = changed[i]
+        op = rng.random()
+        if op < 0.5:
+            attrs["fill"] = _color(rng)
+            if attrs["fill"] == shapes[i][1]["fill"]:
+                attrs["fill"] = "#000000" if attrs["fill"] != "#000000" else "#ffffff"
+        elif op < 0.8:
+            # 位置をずらす（要素の種類ごとに座標の属性名が違う）
+            for key in ("x", "cx"):
+                if key in attrs:
+                    attrs[key] += 3
+            if "points" in attrs or "d" in attrs:
+                attrs["transform"] = "translate(3,0)"
+        else:
+            changed[i] = (None, attrs)  # 削除
+    return _document(size, shapes, cruft), _document(size, changed, cruft), count
+
+
+def write_pair(directory, name, size, elements, path_segments=16, diff_density=0.0, seed=0, cruft=False):
+    """ペアをファイルに書き出して (左パス, 右パス) を返す"""
+    os.makedirs(directory, exist_ok=True)
+    left, right, _ = generate_pair(size, elements, path_segments, diff_density, seed, cruft)
+    paths = os.path.join(directory, f"{name}-left.svg"), os.path.join(directory, f"{name}-right.svg")
+    for path, text in zip(paths, (left, right)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成 SVG ペアを生成する")
+    parser.add_argument("out_dir")
+    parser.add_argument("--case", choices=sorted(CASES), nargs="*", help="既定のケース（省略時は全ケース）")
+    parser.add_argument("--size", type=int)
+    parser.add_argument("--elements", type=int)
+    parser.add_argument("--path-segments", type=int, default=16)
+    parser.add_argument("--diff-density", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cruft", action="store_true", help="描画に関係しない内容（書き出しツールの付加情報など）を混ぜる")
+    args = parser.parse_args(argv)
+
+    if args.size:
+        cases = {"custom": dict(size=args.size, elements=args.elements or 1000,
+                                path_segments=args.path_segments, diff_density=args.diff_density)}
+    else:
+        cases = {name: CASES[name] for name in (args.case or CASES)}
+    for name, spec in cases.items():
+        left, right = write_pair(args.out_dir, name, seed=args.seed, cruft=args.cruft, **spec)
+        print(f"[INFO] {name}: {left} / {right}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""常駐比較サービス（compare_service.py）の軽量クライアント
+
+使い方:
+    python compare_client.py ref.svg target.svg
+    python compare_client.py ref.svg target.svg --inline --repeat 50     # SVG の内容を送る・応答時間を計測
+    python compare_client.py --socket /tmp/svgdiff.sock --status
+    python compare_client.py --stop
+
+標準ライブラリだけを使い、PySide6 / numpy / OpenCV は読み込まない（起動が速い）。
+結果 JSON を標準出力に書き、終了コードは batch_compare.py と同じ（0 = 一致 / 1 = 差分あり / 2 = エラー）。
+"""
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import http.client
+from urllib.parse import urlsplit
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+# batch_compare.py と同じ（重いモジュールを読み込まないよう値だけ持つ）
+EXIT_IDENTICAL = 0
+EXIT_DIFFERENT = 1
+EXIT_ERROR = 2
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ServiceClient:
+    """1 本の接続を使い回してサービスに依頼する"""
+
+    def __init__(self, url=DEFAULT_URL, socket_path=None, timeout=None):
+        if socket_path:
+            self.connection = UnixHTTPConnection(socket_path, timeout)
+        else:
+            parsed = urlsplit(url)
+            self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+
+    def _request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        try:
+            self.connection.request(method, path, data, headers)
+            response = self.connection.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # サービス側が接続を閉じていたら 1 回だけつなぎ直す
+            self.connection.close()
+            self.connection.request(method, path, data, headers)
+            response = self.connection.getresponse()
+        payload = json.loads(response.read() or b"{}")
+        if response.status != 200:
+            raise RuntimeError(payload.get("error") or f"HTTP {response.status}")
+        return payload
+
+    def compare(self, reference, target, inline=False, **options):
+        """reference / target はパス（inline=True なら内容を読んで送る）"""
+        body = dict(options)
+        for key, path in (("reference", reference), ("target", target)):
+            if inline:
+                with open(path, encoding="utf-8") as f:
+                    body[f"{key}_svg"] = f.read()
+            else:
+                body[key] = os.path.abspath(path)
+        return self._request("POST", "/compare", body)
+
+    def status(self):
+        return self._request("GET", "/status")
+
+    def stop(self):
+        return self._request("POST", "/shutdown", {})
+
+    def close(self):
+        self.connection.close()
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+    return (f"{len(samples)} 件 / 平均 {sum(samples) / len(samples) * 1000:.1f} / p50 {pct(0.5):.1f} / "
+            f"p95 {pct(0.95):.1f} / 最大 {samples[-1] * 1000:.1f} ミリ秒")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐比較サービスのクライアント")
+    parser.add_argument("reference", nargs="?", help="基準SVG")
+    parser.add_argument("target", nargs="?", help="比較対象SVG")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"サービスの URL（既定: {DEFAULT_URL}）")
+    parser.add_argument("--socket", default=None, help="Unix ソケットで接続する")
+    parser.add_argument("--inline", action="store_true", help="パスではなく SVG の内容を送る（別マシンのファイルなど）")
+    parser.add_argument("--repeat", type=int, default=1, help="同じ比較を繰り返して応答時間を計測する")
+    parser.add_argument("--timeout", type=float, default=None, help="応答待ちの上限（秒）")
+    parser.add_argument("--status", action="store_true", help="サービスの状態を表示する")
+    parser.add_argument("--stop", action="store_true", help="サービスを停止する")
+    parser.add_argument("--min-area", type=int, default=0)
+    parser.add_argument("--padding", type=int, default=0)
+    parser.add_argument("--merge-gap", type=int, default=None)
+    parser.add_argument("--tolerance", type=int, default=0)
+    parser.add_argument("--alpha-aware", action="store_true")
+    parser.add_argument("--ignore-isolated", action="store_true")
+    parser.add_argument("--antialias", action="store_true")
+    args = parser.parse_args(argv)
+
+    client = ServiceClient(args.url, args.socket, args.timeout)
+    try:
+        if args.status or args.stop:
+            result = client.stop() if args.stop else client.status()
+            json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write("\n")
+            return 0
+        if not (args.reference and args.target):
+            parser.error("基準SVGと比較対象SVGを指定してください")
+
+        options = {"min_area": args.min_area, "padding": args.padding, "merge_gap": args.merge_gap,
+                   "tolerance": args.tolerance, "alpha_aware": args.alpha_aware,
+                   "ignore_isolated": args.ignore_isolated, "antialias": args.antialias}
+        samples = []
+        for _ in range(max(1, args.repeat)):
+            t0 = time.perf_counter()
+            result = client.compare(args.reference, args.target, args.inline, **options)
+            samples.append(time.perf_counter() - t0)
+    except (OSError, RuntimeError, http.client.HTTPException) as e:
+        print(f"[ERROR] サービスに依頼できません: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        client.close()
+
+    json.dump(result, sys.stdout, ensure_ascii=False)
+    sys.stdout.write("\n")
+    if args.repeat > 1:
+        print(f"[INFO] 応答時間: {latency_summary(samples)}", file=sys.stderr)
+    if result["status"] == "error":
+        return EXIT_ERROR
+    return EXIT_DIFFERENT if result["status"] == "different" else EXIT_IDENTICAL
+
+
+if __name__ == "__main__":
+    sys.exit(main())
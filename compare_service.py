@@ -0,0 +1,374 @@
+"""常駐比較サービス（localhost の HTTP または Unix ソケット）
+
+使い方:
+    python compare_service.py                      # http://127.0.0.1:8765
+    python compare_service.py --socket /tmp/svgdiff.sock -j 4
+    python compare_client.py ref.svg target.svg    # 比較を依頼する（compare_client.py を参照）
+
+起動時にワーカープロセス（offscreen の Qt・numpy・OpenCV を読み込み済み）を立ち上げて温めておき、
+比較のたびに Python の起動・ライブラリの読み込み・Qt の初期化をしないで済むようにする。
+描画済みラスタは内容ハッシュのディスクキャッシュ（RasterCache）に残るので、同じ SVG の再比較は描画も省く。
+
+API（JSON）:
+    POST /compare   {"reference": パス, "target": パス} または {"reference_svg": SVG 文字列, "target_svg": ...}
+                    （パスと文字列は片側ずつ混ぜてよい。min_area / padding / merge_gap / tolerance /
+                    alpha_aware / ignore_isolated / antialias は batch_compare.py の同名オプションと同じ）
+                    → batch_compare.compare_pair の結果（status / rects / elapsed など）に server_elapsed を加えたもの
+    GET  /status    稼働時間・ワーカー数・処理件数・応答時間の統計
+    POST /shutdown  サービスを止める
+POST は Content-Type: application/json のものだけ受け付ける（415）。ブラウザはこのヘッダ付きの別オリジンへの POST を
+事前確認なしには送らないので、開いた Web ページから比較させられたり止められたりしない。
+オプションの型・範囲が不正な依頼はワーカーに渡さず HTTP 400 で返す。
+想定外の例外（ワーカープロセスの異常終了など）は HTTP 500 と {"status": "error", "error": ...} で返す。
+ワーカーが異常終了したプールは作り直すので、次の依頼からはそのまま処理できる。
+"""
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import tracing
+from batch_compare import _init_worker, compare_pair, tolerance_from_args
+from tiled_compare import DEFAULT_MEMORY_BUDGET_MB
+from raster_cache import default_cache_dir
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_REQUEST_BYTES = 256 * 1024 ** 2
+LATENCY_WINDOW = 1000  # 応答時間の統計に使う直近の件数
+
+_WARM_UP_SVG = (b'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64">'
+                b'<rect x="8" y="8" width="32" height="32" fill="#08f"/><circle cx="40" cy="40" r="16"/></svg>')
+
+
+def _int_option(request, name, default, high=None):
+    value = request.get(name, default)
+    if value is None and default is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0 or (high is not None and value > high):
+        limit = f"0〜{high} の" if high is not None else "0 以上の"
+        raise ValueError(f"{name} は {limit}整数で指定してください: {value!r}")
+    return value
+
+
+def _bool_option(request, name):
+    value = request.get(name, False)
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} は true / false で指定してください: {value!r}")
+    return value
+
+
+def request_options(request):
+    """依頼の min_area / padding / merge_gap / tolerance 等を検査して compare_pair の region_options にする
+
+    型・範囲が不正なら ValueError（ワーカーに渡す前に弾く）。
+    """
+    args = SimpleNamespace(tolerance=_int_option(request, "tolerance", 0, 127),
+                           alpha_aware=_bool_option(request, "alpha_aware"),
+                           ignore_isolated=_bool_option(request, "ignore_isolated"),
+                           antialias=_bool_option(request, "antialias"))
+    return {"min_area": _int_option(request, "min_area", 0), "padding": _int_option(request, "padding", 0),
+            "merge_gap": _int_option(request, "merge_gap", None), "tolerance": tolerance_from_args(args)}
+
+
+def _warm_up():
+    """ワーカープロセスで一度だけ描画・比較を通しておく（初回だけかかる読み込み・初期化を先に済ませる）"""
+    from PySide6.QtCore import QByteArray
+    from PySide6.QtSvg import QSvgRenderer
+    from svg_render import RasterBuffer
+    from diff_engine import compute_diff_rects
+    arr = RasterBuffer.from_renderer(QSvgRenderer(QByteArray(_WARM_UP_SVG))).array
+    compute_diff_rects(arr, arr.copy())
+    return os.getpid()
+
+
+class LatencyStats:
+    """直近の応答時間（秒）の件数・平均・パーセンタイル"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.samples = []
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.total += 1
+            self.samples.append(seconds)
+            if len(self.samples) > self.window:
+                del self.samples[:len(self.samples) - self.window]
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.total}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+        return {"count": self.total, "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": round(samples[-1] * 1000, 2)}
+
+
+class CompareService:
+    """温めたワーカープールで比較ジョブを処理する（HTTP の受け口とは独立）"""
+
+    def __init__(self, jobs=None, threads=1, cache_dir=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.memory_budget_mb = memory_budget_mb
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.spool = tempfile.TemporaryDirectory(prefix="svgdiff-service-")
+        self.started = time.time()
+        self.latency = LatencyStats()
+        self.counts = {"identical": 0, "different": 0, "error": 0}
+        self.restarts = 0
+        self.threads = threads
+        self._lock = threading.Lock()
+        self.executor = self._make_executor()
+
+    def _make_executor(self):
+        # Qt は fork 後の利用が安全でないため spawn で起動する
+        ctx = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=self.jobs, mp_context=ctx,
+                                   initializer=_init_worker, initargs=(self.cache_dir, self.threads))
+
+    def _restart(self, broken):
+        """ワーカーが異常終了したプールを作り直す（同時に気づいた他のスレッドが作り直していれば何もしない）"""
+        with self._lock:
+            if self.executor is not broken:
+                return
+            print("[ERROR] ワーカープロセスが異常終了したため、ワーカープールを作り直します", file=sys.stderr)
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._make_executor()
+            self.restarts += 1
+            for _ in range(self.jobs):
+                self.executor.submit(_warm_up)  # 次の依頼を待たせないよう先に起動しておく（結果は待たない）
+
+    def warm_up(self):
+        """全ワーカーを起動して温める（ワーカーの PID のリスト）"""
+        with tracing.span("service.warm_up", jobs=self.jobs):
+            futures = [self.executor.submit(_warm_up) for _ in range(self.jobs)]
+            return sorted({f.result() for f in futures})
+
+    def _side(self, request, name):
+        """(パス, 後で消す一時ファイル)。SVG 文字列で渡された側は一時ファイルに書き出す"""
+        if request.get(f"{name}_svg") is not None:
+            data = request[f"{name}_svg"]
+            data = data.encode("utf-8") if isinstance(data, str) else data
+            fd, path = tempfile.mkstemp(suffix=".svg", dir=self.spool.name)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return path, path
+        path = request.get(name)
+        if not path:
+            raise ValueError(f"{name} または {name}_svg を指定してください")
+        if not os.path.isabs(path):
+            raise ValueError(f"{name} は絶対パスで指定してください: {path}")
+        return path, None
+
+    def compare(self, request, region_options=None):
+        """1 件の比較ジョブを実行して結果の dict を返す（複数の受け口スレッドから同時に呼ばれる）
+
+        region_options は request_options() の結果（None なら request から作る）。
+        """
+        t0 = time.perf_counter()
+        started = tracing.now()
+        temporary = []
+        try:
+            if region_options is None:
+                region_options = request_options(request)
+            ref_path, tmp = self._side(request, "reference")
+            temporary.append(tmp)
+            target_path, tmp = self._side(request, "target")
+            temporary.append(tmp)
+            # パスは次の依頼までに書き換わり得るので、ワーカーには描画結果を残さない（内容ハッシュのキャッシュは使う）
+            executor = self.executor
+            try:
+                result = executor.submit(compare_pair, ref_path, target_path, self.memory_budget_mb,
+                                         region_options, False).result()
+            except BrokenProcessPool:
+                self._restart(executor)
+                raise
+            for key in ("reference", "target"):
+                if request.get(f"{key}_svg") is not None:
+                    result[key] = None  # 一時ファイル名は返さない
+        except (ValueError, TypeError) as e:
+            result = {"status": "error", "error": str(e)}
+        except Exception:
+            with self._lock:
+                self.counts["error"] += 1
+            raise  # 受け口で HTTP 500 にする
+        finally:
+            for path in temporary:
+                if path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        elapsed = time.perf_counter() - t0
+        result["server_elapsed"] = round(elapsed, 4)
+        self.latency.add(elapsed)
+        with self._lock:
+            self.counts[result["status"]] = self.counts.get(result["status"], 0) + 1
+        tracing.record("service.compare", started, status=result["status"])
+        return result
+
+    def status(self):
+        return {"uptime": round(time.time() - self.started, 1), "pid": os.getpid(), "jobs": self.jobs,
+                "cache_dir": self.cache_dir, "results": dict(self.counts), "restarts": self.restarts,
+                "latency": self.latency.summary()}
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.spool.cleanup()
+
+
+# -------------------- HTTP の受け口 --------------------
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 接続を使い回して、依頼ごとの接続確立を省く
+    server_version = "SvgDiffService/1"
+
+    def _send(self, code, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _guarded(self, handler):
+        """想定外の例外でも接続を切らず、HTTP 500 と JSON の結果を返す"""
+        try:
+            handler()
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            print(f"[ERROR] {self.command} {self.path}: {message}", file=sys.stderr)
+            try:
+                self._send(500, {"status": "error", "error": message})
+            except OSError:
+                self.close_connection = True
+
+    def do_GET(self):
+        self._guarded(self._get)
+
+    def do_POST(self):
+        self._guarded(self._post)
+
+    def _get(self):
+        if self.path == "/status":
+            self._send(200, self.server.service.status())
+        else:
+            self._send(404, {"error": f"不明なパスです: {self.path}"})
+
+    def _post(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_REQUEST_BYTES:
+            self._send(413, {"error": "依頼が大きすぎます"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+        if self.headers.get_content_type() != "application/json":
+            self._send(415, {"error": "Content-Type: application/json で送ってください"})
+            return
+        if self.path == "/shutdown":
+            self._send(200, {"status": "stopping"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if self.path != "/compare":
+            self._send(404, {"error": f"不明なパスです: {self.path}"})
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            self._send(400, {"error": f"JSON を解析できません: {e}"})
+            return
+        if not isinstance(request, dict):
+            self._send(400, {"error": "JSON オブジェクトを送ってください"})
+            return
+        try:
+            region_options = request_options(request)
+        except ValueError as e:
+            self._send(400, {"status": "error", "error": str(e)})
+            return
+        self._send(200, self.server.service.compare(request, region_options))
+
+    def address_string(self):
+        # Unix ソケットでは client_address が文字列になる
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if tracing.tracer.enabled:
+            print(f"[DEBUG] {self.address_string()} {format % args}", file=sys.stderr)
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # 前回の異常終了で残ったソケット
+        server = UnixHTTPServer(socket_path, ServiceHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceHandler)
+        server.daemon_threads = True
+        server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐比較サービス（localhost の HTTP / Unix ソケット）")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="待ち受けるアドレス（既定: 127.0.0.1。外部公開はしない）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", default=None, help="HTTP の代わりにこの Unix ソケットで待ち受ける")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    parser.add_argument("-t", "--threads", type=int, default=1,
+                        help="ワーカープロセスごとに差分領域を比較するスレッド数（既定: 1）")
+    parser.add_argument("-m", "--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="1比較あたりのメモリ上限MB（超える文書はタイル分割で比較）")
+    parser.add_argument("--cache-dir", default=None, help="描画済みラスタのキャッシュ先（既定: ~/.cache/svgdiff/rasters）")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    service = CompareService(args.jobs, args.threads, args.cache_dir, args.memory_budget)
+    try:
+        server = make_server(service, args.host, args.port, args.socket)
+    except OSError as e:
+        service.close()
+        print(f"[ERROR] 待ち受けを開始できません: {e}", file=sys.stderr)
+        return 2
+    pids = service.warm_up()
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"[INFO] 比較サービスを開始しました: {where}（ワーカー {len(pids)} / 起動 {time.perf_counter() - t0:.1f} 秒）",
+          file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    print(f"[INFO] 比較サービスを停止しました（{service.latency.total} 件）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,555 @@
+"""差分計算エンジン（GUI 非依存）
+
+main.py / main2.py / differ.py の差分処理はすべてここを通す。
+画素ごとの Python ループは使わず、配列全体の演算で
+差分マスク・ハイライト重ね画像・差分領域リストを作る。
+"""
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import namedtuple
+
+import numpy as np
+import cv2
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+import tracing
+from sparse_mask import RunMask
+
+HIGHLIGHT_COLOR = (255, 0, 0, 120)  # RGBA
+DEFAULT_WORKERS = os.cpu_count() or 1  # 候補範囲の実解像度比較に使うスレッド数
+
+
+def pack_rgba(color):
+    """RGBA タプルを RGBA8888 配列と同じメモリ順の uint32 にする"""
+    return np.array(color, np.uint8).view(np.uint32)[0]
+
+
+def packed_view(arr):
+    """(H, W, 4) の uint8 配列を (H, W) の uint32 として参照する（詰められていなければ None）"""
+    if arr.ndim == 3 and arr.shape[2] == 4 and arr.dtype == np.uint8 and arr.strides[2] == 1 and arr.strides[1] == 4:
+        return arr.view(np.uint32)[..., 0]
+    return None
+
+
+def diff_mask(arr_l, arr_r, tolerance=None):
+    """画素ごとの差分マスク（H×W の bool）
+
+    (H, W, 4) の uint8 配列でも (H, W) の uint32（1画素=1要素）でもよい。
+    4チャンネルを1回の uint32 比較で済ませる。
+    tolerance（Tolerance）を渡すとアンチエイリアス程度の違いを無視する（tolerant_mask() を参照）。
+    """
+    if tolerance is not None and any(tolerance):
+        return tolerant_mask(arr_l, arr_r, tolerance)
+    if arr_l.ndim == 2:
+        return arr_l != arr_r
+    packed_l, packed_r = packed_view(arr_l), packed_view(arr_r)
+    if packed_l is not None and packed_r is not None:
+        return packed_l != packed_r
+    return np.any(arr_l != arr_r, axis=2)
+
+
+# -------------------- 許容差付きの比較 --------------------
+# channel          チャンネルごとの差がこの値以下なら同じとみなす（0〜127）
+# alpha_aware      白背景に合成した見た目で比べる（半透明の縁の違いは見た目の差の分だけ数える。乗算済みアルファ前提）
+# ignore_isolated  8 近傍に差分画素が無い孤立した差分画素を無視する
+Tolerance = namedtuple("Tolerance", "channel alpha_aware ignore_isolated", defaults=(0, False, False))
+ANTIALIAS_TOLERANCE = Tolerance(channel=16, alpha_aware=True, ignore_isolated=True)
+TOLERANCE_BAND = 64  # 一度に処理する行数（作業配列を CPU キャッシュに収める）
+
+_LOW7 = np.uint32(0x7F7F7F7F)
+_HIGH = np.uint32(0x80808080)
+_ONES = np.uint32(0x01010101)
+
+
+def _packed(arr):
+    packed = arr if arr.ndim == 2 else packed_view(arr)
+    if packed is None:
+        packed = np.ascontiguousarray(arr).view(np.uint32)[..., 0]
+    return packed
+
+
+def tolerant_mask(arr_l, arr_r, tolerance, out=None):
+    """許容差付きの差分マスク（H×W の bool）
+
+    TOLERANCE_BAND 行ずつ、使い回す作業配列の上で次の処理をまとめて行う（画像全体の一時配列は作らない）。
+      1. alpha_aware なら白背景に合成: 乗算済みの各バイト c に 255 - alpha を足す（繰り上がりは起きない）
+      2. cv2.absdiff でバイトごとの差の絶対値
+      3. 4 バイトのどれかが channel を超えるかを uint32 のままビット演算で判定（SWAR）
+      4. ignore_isolated なら 3×3 の合計（boxFilter）で近傍に差分の無い画素を落とす（前後 1 行を余分に処理）
+    """
+    packed_l, packed_r = _packed(arr_l), _packed(arr_r)
+    h, w = packed_l.shape
+    if out is None:
+        out = np.empty((h, w), bool)
+    t = min(max(int(tolerance.channel), 0), 127)
+    bias = np.uint32((127 - t) * 0x01010101)
+    halo = 1 if tolerance.ignore_isolated else 0
+
+    rows = TOLERANCE_BAND + 2 * halo
+    s1 = np.empty((rows, w), np.uint32)
+    s2 = np.empty((rows, w), np.uint32)
+    raw = np.empty((rows, w), bool)
+    for y in range(0, h, TOLERANCE_BAND):
+        y0, y1 = max(0, y - halo), min(h, y + TOLERANCE_BAND + halo)
+        n = y1 - y0
+        a, b, d, m = packed_l[y0:y1], packed_r[y0:y1], s1[:n], s2[:n]
+        if tolerance.alpha_aware:
+            for src, dst in ((a, d), (b, m)):
+                np.right_shift(src, 24, out=dst)
+                np.multiply(dst, _ONES, out=dst)
+                np.invert(dst, out=dst)
+                np.add(src, dst, out=dst)
+            a, b = d, m
+        cv2.absdiff(a.view(np.uint8), b.view(np.uint8), dst=d.view(np.uint8))
+        # hasmore(x, t): いずれかのバイトが t より大きければ、そのバイトの最上位ビットが立つ
+        np.bitwise_and(d, _LOW7, out=m)
+        np.add(m, bias, out=m)
+        np.bitwise_or(m, d, out=m)
+        np.bitwise_and(m, _HIGH, out=m)
+        mask = np.not_equal(m, 0, out=raw[:n])
+
+        top = y - y0
+        bottom = top + min(TOLERANCE_BAND, h - y)
+        if tolerance.ignore_isolated:
+            count = cv2.boxFilter(mask.view(np.uint8), -1, (3, 3), normalize=False, borderType=cv2.BORDER_CONSTANT)
+            np.logical_and(mask[top:bottom], count[top:bottom] >= 2, out=out[y:y + bottom - top])
+        else:
+            out[y:y + bottom - top] = mask[top:bottom]
+    return out
+
+
+def highlight_overlay(mask, color=HIGHLIGHT_COLOR, out=None):
+    """差分画素だけを color で塗った RGBA 画像（他は透明）
+
+    out に (H, W) の uint32（RGBA8888 の QImage の qimage_view など）を渡すとそこへ直接書き込む。
+    """
+    if out is not None:
+        return np.multiply(mask, pack_rgba(color), out=out)
+    packed = np.multiply(mask, pack_rgba(color), dtype=np.uint32)
+    return packed.view(np.uint8).reshape(mask.shape + (4,))
+
+
+def highlight_composite(packed, mask, color, out=None):
+    """1画素=uint32 の画像 packed のうち、差分画素だけを color（同じ画素形式）に置き換える"""
+    if out is None:
+        out = np.empty_like(packed)
+    np.copyto(out, packed)
+    np.copyto(out, np.uint32(color), where=mask)
+    return out
+
+
+def find_regions(mask):
+    """差分マスクの連結領域ごとの外接矩形 (x, y, w, h) のリスト"""
+    labels, _ = ndimage.label(mask, structure=np.ones((3, 3), bool))
+    return [(sl[1].start, sl[0].start, sl[1].stop - sl[1].start, sl[0].stop - sl[0].start)
+            for sl in ndimage.find_objects(labels) if sl is not None]
+
+
+BLOCK_SIZE = 64
+_HASH_SEED = 0x5D1FF  # 固定（キャッシュしたハッシュを別プロセス・次回起動でも使えるように）
+
+
+def _hash_keys(block, width):
+    """ブロック内の位置ごとの乗数（奇数の 64bit 乱数）"""
+    rng = np.random.default_rng(_HASH_SEED)
+    return rng.integers(0, 2 ** 63, (block, width), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def block_hashes(arr, block=BLOCK_SIZE):
+    """block×block 画素ごとの 64bit ハッシュ（(ceil(H/block), ceil(W/block)) の uint64 配列）
+
+    画素値（uint32）と位置ごとの奇数乱数の積の和（mod 2**64）。
+    ブロック行ずつ処理するので、一時配列は block 行分で済む。
+    """
+    packed = arr if arr.ndim == 2 else packed_view(arr)
+    if packed is None:
+        packed = np.ascontiguousarray(arr).view(np.uint32)[..., 0]
+    h, w = packed.shape
+    keys = _hash_keys(block, w)
+    starts = np.arange(0, w, block)
+    out = np.empty(((h + block - 1) // block, len(starts)), np.uint64)
+    for by, y in enumerate(range(0, h, block)):
+        rows = packed[y:y + block]
+        weighted = rows.astype(np.uint64) * keys[:len(rows)]
+        out[by] = np.add.reduceat(weighted.sum(axis=0), starts)
+    return out
+
+
+def update_block_hashes(hashes, arr, regions, block=BLOCK_SIZE):
+    """regions (x, y, w, h) に掛かるブロックのハッシュだけを計算し直す（hashes をその場で書き換えて返す）
+
+    一部の範囲だけ描画し直した配列用。結果は block_hashes(arr) と同じになる。
+    """
+    packed = arr if arr.ndim == 2 else packed_view(arr)
+    if packed is None:
+        packed = np.ascontiguousarray(arr).view(np.uint32)[..., 0]
+    h, w = packed.shape
+    keys = _hash_keys(block, w)
+    rows_n, cols_n = hashes.shape
+    for x, y, rw, rh in regions:
+        bx1, by1 = max(0, int(x) // block), max(0, int(y) // block)
+        bx2 = min(cols_n, int(math.ceil((x + rw + 1) / block)))
+        by2 = min(rows_n, int(math.ceil((y + rh + 1) / block)))
+        if bx2 <= bx1 or by2 <= by1:
+            continue
+        x1, x2 = bx1 * block, min(w, bx2 * block)
+        starts = np.arange(0, x2 - x1, block)
+        for by in range(by1, by2):
+            rows = packed[by * block:(by + 1) * block, x1:x2]
+            weighted = rows.astype(np.uint64) * keys[:len(rows), x1:x2]
+            hashes[by, bx1:bx2] = np.add.reduceat(weighted.sum(axis=0), starts)
+    return hashes
+
+
+# 差分領域: 外接矩形 (x, y, w, h)、差分画素数 area、差分画素の重心 (cx, cy)
+# w / h は従来どおり「右端 - 左端」（画素数 - 1）
+REGION_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("w", "<f4"), ("h", "<f4"),
+                         ("area", "<i8"), ("cx", "<f4"), ("cy", "<f4")])
+
+
+def empty_regions():
+    return np.zeros(0, REGION_DTYPE)
+
+
+def region_rects(regions):
+    """差分領域（構造化配列・(N, 4) 配列・(x, y, w, h) のリスト）を (N, 4) の float32 配列にする"""
+    if isinstance(regions, np.ndarray) and regions.dtype == REGION_DTYPE:
+        return np.stack([regions["x"], regions["y"], regions["w"], regions["h"]], axis=1)
+    return np.asarray(regions, np.float32).reshape(-1, 4)
+
+
+def regions_to_dicts(regions):
+    """JSON 出力用の dict のリスト"""
+    return [dict(zip(REGION_DTYPE.names, r)) for r in regions.tolist()]
+
+
+def offset_regions(regions, dx, dy):
+    out = regions.copy()
+    out["x"] += dx
+    out["cx"] += dx
+    out["y"] += dy
+    out["cy"] += dy
+    return out
+
+
+def _group_regions(regions, inverse, count):
+    """inverse（領域ごとのグループ番号 0..count-1）でまとめた領域を返す（面積は合計、重心は面積で重み付け）"""
+    x1, y1 = regions["x"].astype(np.float64), regions["y"].astype(np.float64)
+    x2, y2 = x1 + regions["w"], y1 + regions["h"]
+    merged = np.zeros(count, REGION_DTYPE)
+    gx1, gy1 = np.full(count, np.inf), np.full(count, np.inf)
+    gx2, gy2 = np.full(count, -np.inf), np.full(count, -np.inf)
+    np.minimum.at(gx1, inverse, x1)
+    np.minimum.at(gy1, inverse, y1)
+    np.maximum.at(gx2, inverse, x2)
+    np.maximum.at(gy2, inverse, y2)
+    area = np.bincount(inverse, regions["area"], count)
+    weight = np.maximum(area, 1)
+    merged["x"], merged["y"], merged["w"], merged["h"] = gx1, gy1, gx2 - gx1, gy2 - gy1
+    merged["area"] = area
+    merged["cx"] = np.bincount(inverse, regions["cx"] * regions["area"], count) / weight
+    merged["cy"] = np.bincount(inverse, regions["cy"] * regions["area"], count) / weight
+    return merged
+
+
+def merge_regions(regions, gap=1):
+    """gap px 以内で接する・重なる領域を結合する（面積は合計、重心は面積で重み付け）"""
+    while len(regions) > 1:
+        x1, y1 = regions["x"].astype(np.float64), regions["y"].astype(np.float64)
+        x2, y2 = x1 + regions["w"], y1 + regions["h"]
+
+        # x でソートして走査し、x 方向に重なりうる範囲だけ y の重なりを調べる（Union-Find）
+        parent = np.arange(len(regions))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        order = np.argsort(x1, kind="stable")
+        active = []
+        for i in order.tolist():
+            active = [j for j in active if x2[j] + gap >= x1[i]]
+            for j in active:
+                if y1[i] <= y2[j] + gap and y1[j] <= y2[i] + gap:
+                    parent[find(i)] = find(j)
+            active.append(i)
+
+        roots = np.array([find(i) for i in range(len(regions))])
+        groups, inverse = np.unique(roots, return_inverse=True)
+        if len(groups) == len(regions):
+            break
+        regions = _group_regions(regions, inverse, len(groups))
+    return regions
+
+
+# タイル・範囲ごとの比較結果（すべて文書座標）
+#   regions 差分領域 / runs 差分画素のラン (N, 3) [y, x0, x1) / owner 各ランが属する regions の番号 / rect 範囲 (x, y, w, h)
+Piece = namedtuple("Piece", "regions runs owner rect")
+
+
+def _rects_near(rects, rect):
+    """rects（(N, 4) の (x, y, w, h)）のうち、rect と重なる・8 近傍で接するものの真偽配列"""
+    x, y, w, h = rect
+    return ((rects[:, 0] <= x + w) & (x <= rects[:, 0] + rects[:, 2])
+            & (rects[:, 1] <= y + h) & (y <= rects[:, 1] + rects[:, 3]))
+
+
+def _runs_near(runs, rect):
+    """ランのうち、rect (x, y, w, h) 内の画素と重なる・8 近傍で接するものの真偽配列"""
+    x, y, w, h = rect
+    return (runs[:, 0] >= y - 1) & (runs[:, 0] <= y + h) & (runs[:, 2] >= x) & (runs[:, 1] <= x + w)
+
+
+def seam_runs(piece, rects):
+    """piece のランを、ほかの範囲 rects の画素と接しうるもの（境界の行・列と重なる部分）だけに減らす
+
+    stitch_regions() が見るのはこのランだけなので、タイルごとに呼べば全差分画素を持ち続けなくてよい。
+    rects には piece 自身の範囲が入っていてもよい（除いて扱う）。
+    """
+    rects = np.asarray(rects, np.int64).reshape(-1, 4)
+    keep = np.zeros(len(piece.runs), bool)
+    for rect in rects[_rects_near(rects, piece.rect)].tolist():
+        if tuple(rect) != tuple(piece.rect):
+            keep |= _runs_near(piece.runs, rect)
+    return piece._replace(runs=piece.runs[keep], owner=piece.owner[keep])
+
+
+def _touching_runs(runs_a, runs_b):
+    """8 近傍で接する・重なるランの組を (runs_a の番号の配列, runs_b の番号の配列) で返す"""
+    order = np.argsort(runs_b[:, 0], kind="stable")
+    yb = runs_b[order, 0]
+    found_a, found_b = [], []
+    for dy in (-1, 0, 1):
+        lo = np.searchsorted(yb, runs_a[:, 0] + dy, "left")
+        counts = np.searchsorted(yb, runs_a[:, 0] + dy, "right") - lo
+        a = np.repeat(np.arange(len(runs_a)), counts)
+        b = order[np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())]
+        ok = (runs_a[a, 1] <= runs_b[b, 2]) & (runs_b[b, 1] <= runs_a[a, 2])
+        found_a.append(a[ok])
+        found_b.append(b[ok])
+    return np.concatenate(found_a), np.concatenate(found_b)
+
+
+def stitch_regions(pieces):
+    """タイル・範囲ごとの結果（Piece のリスト）を 1 つにし、境界で分断された連結成分をつなぎ直す
+
+    別々の範囲の成分は、差分画素どうしが 8 近傍で接する（範囲が重なる場合は同じ画素を含む）ときだけ結合する。
+    外接矩形が近いだけの別の成分はまとめないので、全体を一度に比較した結果と同じ領域になる。
+    """
+    if not pieces:
+        return empty_regions()
+    regions = np.concatenate([p.regions for p in pieces])
+    offsets = np.cumsum([0] + [len(p.regions) for p in pieces])
+    # 差分画素のある範囲どうしで、接している組だけを調べる
+    active = [i for i, p in enumerate(pieces) if len(p.runs)]
+    rects = np.asarray([pieces[i].rect for i in active], np.int64).reshape(-1, 4)
+    edges_a, edges_b = [], []
+    for k, i in enumerate(active):
+        a = pieces[i]
+        for j in np.flatnonzero(_rects_near(rects[k + 1:], a.rect)).tolist():
+            j = active[k + 1 + j]
+            b = pieces[j]
+            near_a, near_b = _runs_near(a.runs, b.rect), _runs_near(b.runs, a.rect)
+            ia, ib = _touching_runs(a.runs[near_a], b.runs[near_b])
+            edges_a.append(a.owner[near_a][ia] + offsets[i])
+            edges_b.append(b.owner[near_b][ib] + offsets[j])
+    if not edges_a:
+        return regions
+    edges_a, edges_b = np.concatenate(edges_a), np.concatenate(edges_b)
+    graph = coo_matrix((np.ones(len(edges_a), np.int8), (edges_a, edges_b)), shape=(len(regions), len(regions)))
+    count, labels = connected_components(graph, directed=False)
+    if count == len(regions):
+        return regions
+    return _group_regions(regions, labels, count)
+
+
+def refine_regions(regions, width, height, min_area=0, padding=0, merge_gap=None):
+    """差分画素数 min_area 未満の領域を除き、padding px 広げ（画像内にクリップ）、merge_gap px 以内を結合する"""
+    if min_area > 0:
+        regions = regions[regions["area"] >= min_area]
+    if padding > 0:
+        regions = regions.copy()
+        x1 = np.maximum(regions["x"] - padding, 0)
+        y1 = np.maximum(regions["y"] - padding, 0)
+        x2 = np.minimum(regions["x"] + regions["w"] + padding, width - 1)
+        y2 = np.minimum(regions["y"] + regions["h"] + padding, height - 1)
+        regions["x"], regions["y"], regions["w"], regions["h"] = x1, y1, x2 - x1, y2 - y1
+    if merge_gap is not None:
+        regions = merge_regions(regions, merge_gap)
+    return regions
+
+
+def _verify_candidate(arr_l, arr_r, labels, stats, label_id, block=BLOCK_SIZE, tolerance=None, with_runs=False):
+    """候補範囲 label_id を実解像度で比較し、差分画素の連結成分（構造化配列）を返す（差分が無ければ None）
+
+    with_runs=True なら (連結成分, 差分画素のラン (N, 3) の [y, x0, x1), 各ランが属する成分の番号) を返す。
+
+    numpy の比較と OpenCV のラベリングは GIL を解放するので、別スレッドで並列に実行できる。
+    """
+    h, w = arr_l.shape[:2]
+    bx, by, bw, bh = stats[label_id, :4].tolist()
+
+    # ブロック座標 → 画素座標（端のブロックはクリップ）
+    x1h, y1h = bx * block, by * block
+    x2h, y2h = min(w, (bx + bw) * block), min(h, (by + bh) * block)
+    mask = diff_mask(arr_l[y1h:y2h, x1h:x2h], arr_r[y1h:y2h, x1h:x2h], tolerance)
+    tracing.count("pixels_compared", mask.size)
+
+    # 外接矩形内に別ラベルのブロックが入り込む場合（L 字など）はその分を除く
+    own = labels[by:by + bh, bx:bx + bw] == label_id
+    if not own.all():
+        own = np.repeat(np.repeat(own, block, axis=0), block, axis=1)
+        mask &= own[:mask.shape[0], :mask.shape[1]]
+
+    count, px_labels, px_stats, centroids = cv2.connectedComponentsWithStats(mask.view(np.uint8), connectivity=8)
+    if count <= 1:
+        return (None, None, None) if with_runs else None
+    part = np.zeros(count - 1, REGION_DTYPE)
+    part["x"] = px_stats[1:, cv2.CC_STAT_LEFT] + x1h
+    part["y"] = px_stats[1:, cv2.CC_STAT_TOP] + y1h
+    part["w"] = px_stats[1:, cv2.CC_STAT_WIDTH] - 1
+    part["h"] = px_stats[1:, cv2.CC_STAT_HEIGHT] - 1
+    part["area"] = px_stats[1:, cv2.CC_STAT_AREA]
+    part["cx"] = centroids[1:, 0] + x1h
+    part["cy"] = centroids[1:, 1] + y1h
+    if with_runs:
+        runs = RunMask.from_dense(mask, x1h, y1h).runs
+        # ランは連結なので、先頭の画素のラベルがそのランの成分
+        return part, runs, px_labels[runs[:, 0] - y1h, runs[:, 1] - x1h].astype(np.int64) - 1
+    return part
+
+
+def diff_components(arr_l, arr_r, progress=None, hashes_l=None, hashes_r=None, block=BLOCK_SIZE, workers=None,
+                    tolerance=None, with_runs=True):
+    """左右の RGBA 配列の差分画素の連結成分（REGION_DTYPE。min_area 等で絞り込む前）を返す
+
+    with_runs=True なら (連結成分, 差分画素のラン (N, 3) の [y, x0, x1), 各ランが属する成分の番号) を返す
+    （タイル・範囲ごとの結果を stitch_regions() で画素単位につなぎ直すのに使う）。
+    ほかの引数は compute_diff_rects() を参照。
+    """
+    # --- ステップ1: ブロックハッシュ比較（縮小しないので小さな変更も落とさない） ---
+    with tracing.span("diff.block_hashes"):
+        if hashes_l is None:
+            hashes_l = block_hashes(arr_l, block)
+        if hashes_r is None:
+            hashes_r = block_hashes(arr_r, block)
+        changed = (hashes_l != hashes_r).astype(np.uint8)
+
+    # --- ステップ2: 隣接する不一致ブロックをまとめる（外接矩形は 1 回の走査で得る） ---
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+
+    # --- ステップ3: 各候補範囲を実解像度で比較し、差分画素の連結成分を統計付きで取り出す ---
+    total = num_labels - 1  # 0 は背景
+    verify = partial(_verify_candidate, arr_l, arr_r, labels, stats, block=block, tolerance=tolerance,
+                     with_runs=with_runs)
+    workers = min(DEFAULT_WORKERS if workers is None else max(1, workers), max(total, 1))
+    executor = ThreadPoolExecutor(workers) if workers > 1 else None
+    results = executor.map(verify, range(1, num_labels)) if executor else map(verify, range(1, num_labels))
+    found = []
+    runs = []
+    owners = []
+    count = 0
+    try:
+        # map は投入順に結果を返すので、スレッド数によらず順序は決まっている
+        with tracing.span("diff.verify", candidates=total, workers=workers):
+            for done, part in enumerate(results, 1):
+                if progress:
+                    progress(done, total)
+                if with_runs:
+                    part, part_runs, owner = part
+                    if part_runs is not None:
+                        runs.append(part_runs)
+                        owners.append(owner + count)
+                if part is not None:
+                    found.append(part)
+                    count += len(part)
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    regions = np.concatenate(found) if found else empty_regions()
+    if with_runs:
+        return (regions, np.concatenate(runs) if runs else np.zeros((0, 3), np.int32),
+                np.concatenate(owners) if owners else np.zeros(0, np.int64))
+    return regions
+
+
+def compute_diff_rects(arr_l, arr_r, progress=None, hashes_l=None, hashes_r=None, block=BLOCK_SIZE,
+                       min_area=0, padding=0, merge_gap=None, workers=None, tolerance=None,
+                       return_mask=False):
+    """左右の RGBA 配列を比較して差分領域（REGION_DTYPE の構造化配列）を返す
+
+    block×block のブロックハッシュが一致しない範囲だけを実解像度で比較し、
+    差分画素の連結成分ごとに外接矩形・画素数・重心を求める（connectedComponentsWithStats の 1 回の走査）。
+    hashes_l / hashes_r に block_hashes() の結果を渡せば計算を省略できる（1 対 N 比較で基準側を使い回す）。
+    min_area / padding / merge_gap は refine_regions() を参照（既定では結合しない。GUI・CLI とも同じ）。
+    workers は候補範囲を比較するスレッド数（None なら DEFAULT_WORKERS、1 なら並列化しない）。
+    結果の順序はスレッド数によらず同じ。
+    tolerance（Tolerance）を渡すとアンチエイリアス程度の違いを差分に数えない（ハッシュが一致するブロックは常に同一）。
+    return_mask=True なら (差分領域, 差分画素の RunMask) を返す（マスクは min_area 等で絞り込む前の全差分画素）。
+    progress(done, total) は候補範囲ごとに呼ばれる（例外を投げれば中断できる）
+    """
+    h, w = arr_l.shape[:2]
+    found = diff_components(arr_l, arr_r, progress, hashes_l, hashes_r, block, workers, tolerance, return_mask)
+    regions, runs = (found[0], found[1]) if return_mask else (found, None)
+    with tracing.span("diff.refine"):
+        regions = refine_regions(regions, w, h, min_area, padding, merge_gap)
+    tracing.count("regions_found", len(regions))
+    if return_mask:
+        # 候補範囲は互いに重ならないので、並べ替えて行ごとに接するランをつなぐだけでよい
+        return regions, RunMask.concatenate([RunMask(w, h, runs)], w, h)
+    return regions
+
+
+def compute_diff_rects_in_regions(arr_l, arr_r, regions, progress=None, tolerance=None, return_mask=False,
+                                  **options):
+    """指定領域 (x, y, w, h) の中だけを比較して差分領域を返す（構造比較で絞り込んだ場合用）
+
+    範囲の境界で分断された連結成分は画素単位でつなぎ直し（stitch_regions）、
+    options（min_area / padding / merge_gap）はその後に適用する。
+    return_mask=True なら (差分領域, 差分画素の RunMask) を返す。
+    領域は重ならないものとする（重なった部分の差分画素は、面積・重心に両方の範囲の分が数えられる）。
+    """
+    h, w = arr_l.shape[:2]
+    found = []
+    for i, (rx, ry, rw, rh) in enumerate(regions):
+        x1, y1 = max(0, int(rx)), max(0, int(ry))
+        x2, y2 = min(w, int(rx + rw)), min(h, int(ry + rh))
+        if x2 > x1 and y2 > y1:
+            part, runs, owner = diff_components(arr_l[y1:y2, x1:x2], arr_r[y1:y2, x1:x2], tolerance=tolerance)
+            runs[:, 0] += y1
+            runs[:, 1:] += x1
+            found.append(Piece(offset_regions(part, x1, y1), runs, owner, (x1, y1, x2 - x1, y2 - y1)))
+        if progress:
+            progress(i + 1, len(regions))
+    regions = refine_regions(stitch_regions(found), w, h, **options)
+    if return_mask:
+        return regions, RunMask.concatenate([RunMask(w, h, p.runs) for p in found], w, h)
+    return regions
+
+
+def merge_touching_rects(rects):
+    """タイル境界で分断された矩形 (x, y, w, h) のうち、接している・重なっているものを結合する"""
+    boxes = [[x, y, x + w, y + h] for x, y, w, h in rects]
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for b in boxes:
+            for o in out:
+                # 1px の隙間までは同じ領域とみなす
+                if b[0] <= o[2] + 1 and o[0] <= b[2] + 1 and b[1] <= o[3] + 1 and o[1] <= b[3] + 1:
+                    o[0], o[1] = min(o[0], b[0]), min(o[1], b[1])
+                    o[2], o[3] = max(o[2], b[2]), max(o[3], b[3])
+                    merged = True
+                    break
+            else:
+                out.append(b)
+        boxes = out
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes]
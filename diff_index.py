@@ -0,0 +1,88 @@
+"""差分矩形の空間インデックス（GUI 非依存）
+
+矩形 (x, y, w, h) の (N, 4) 配列に対して一様グリッドを作り、
+範囲検索（表示範囲に入る矩形）・面積順の並び・面積での絞り込みを配列操作で行う。
+グリッドは CSR 形式（セルごとの矩形番号を 1 本の配列に詰め、開始位置を別配列に持つ）。
+"""
+import math
+import numpy as np
+
+MIN_CELL_SIZE = 64.0
+
+
+class RectIndex:
+    def __init__(self, rects, cell_size=None):
+        self.rects = np.asarray(rects, np.float32).reshape(-1, 4)
+        n = len(self.rects)
+        x1, y1 = self.rects[:, 0], self.rects[:, 1]
+        x2, y2 = x1 + self.rects[:, 2], y1 + self.rects[:, 3]
+
+        self.areas = self.rects[:, 2].astype(np.float64) * self.rects[:, 3]
+        self.by_area = np.argsort(-self.areas, kind="stable")   # 面積の大きい順
+        self._areas_desc = self.areas[self.by_area]
+
+        if n == 0:
+            self.origin = (0.0, 0.0)
+            self.cell_size = MIN_CELL_SIZE
+            self.cols = self.rows = 1
+            self.cell_start = np.zeros(2, np.int64)
+            self.cell_items = np.zeros(0, np.int64)
+            return
+
+        ox, oy = float(x1.min()), float(y1.min())
+        width, height = float(x2.max()) - ox, float(y2.max()) - oy
+        if cell_size is None:
+            # 1 セルあたり数件になるよう、領域の広さと件数から決める
+            cell_size = max(MIN_CELL_SIZE, math.sqrt(max(width * height, 1.0) / n) * 2)
+        self.origin = (ox, oy)
+        self.cell_size = cell_size
+        self.cols = max(1, int(width // cell_size) + 1)
+        self.rows = max(1, int(height // cell_size) + 1)
+
+        cx1, cy1 = self._cell(x1, ox, self.cols), self._cell(y1, oy, self.rows)
+        cx2, cy2 = self._cell(x2, ox, self.cols), self._cell(y2, oy, self.rows)
+        spans_x = cx2 - cx1 + 1
+        counts = spans_x * (cy2 - cy1 + 1)
+
+        # 矩形が覆うセルをすべて (セル番号, 矩形番号) の組に展開する
+        items = np.repeat(np.arange(n), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        spans = np.repeat(spans_x, counts)
+        cells = (np.repeat(cy1, counts) + offsets // spans) * self.cols + np.repeat(cx1, counts) + offsets % spans
+
+        order = np.argsort(cells, kind="stable")
+        self.cell_items = items[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.cols * self.rows + 1))
+
+    def __len__(self):
+        return len(self.rects)
+
+    def _cell(self, v, origin, limit):
+        return np.clip(((np.asarray(v, np.float64) - origin) // self.cell_size).astype(np.int64), 0, limit - 1)
+
+    def query(self, x, y, w, h):
+        """範囲 (x, y, w, h) と重なる矩形の番号（昇順）"""
+        if len(self.rects) == 0:
+            return np.zeros(0, np.int64)
+        ox, oy = self.origin
+        cx1, cx2 = self._cell([x, x + w], ox, self.cols)
+        cy1, cy2 = self._cell([y, y + h], oy, self.rows)
+        chunks = []
+        for cy in range(cy1, cy2 + 1):
+            row = cy * self.cols
+            chunks.append(self.cell_items[self.cell_start[row + cx1]:self.cell_start[row + cx2 + 1]])
+        found = np.unique(np.concatenate(chunks))
+
+        r = self.rects[found]
+        hit = (r[:, 0] <= x + w) & (r[:, 0] + r[:, 2] >= x) & (r[:, 1] <= y + h) & (r[:, 1] + r[:, 3] >= y)
+        return found[hit]
+
+    def ordered(self, key="position", min_area=0.0):
+        """表示順の矩形番号（key: "position" = 検出順, "area" = 面積の大きい順）、面積 min_area 未満は除く"""
+        if key == "area":
+            # 面積の降順配列を二分探索して、min_area 以上の先頭部分だけを返す
+            end = len(self._areas_desc) - np.searchsorted(self._areas_desc[::-1], min_area, side="left")
+            return self.by_area[:end]
+        if min_area <= 0:
+            return np.arange(len(self.rects))
+        return np.flatnonzero(self.areas >= min_area)
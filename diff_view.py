@@ -0,0 +1,88 @@
+"""大量の差分矩形を扱う表示部品
+
+DiffListModel  差分リスト用の仮想リストモデル（表示する行だけ data() で文字列を作る）
+DiffRectsItem  全矩形を 1 つのアイテムで描く QGraphicsItem（見えている範囲だけ描画）
+どちらも RectIndex を共有し、矩形ごとの Qt オブジェクトは作らない。
+"""
+import numpy as np
+
+from PySide6.QtWidgets import QGraphicsItem
+from PySide6.QtGui import QPen
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRectF
+
+from diff_index import RectIndex
+
+
+class DiffListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.index_ = RectIndex(np.zeros((0, 4), np.float32))
+        self.order = np.zeros(0, np.int64)   # 行 → 矩形番号
+        self.sort_key = "position"
+        self.min_area = 0.0
+
+    def set_index(self, index):
+        self.beginResetModel()
+        self.index_ = index
+        self.order = index.ordered(self.sort_key, self.min_area)
+        self.endResetModel()
+
+    def set_view(self, sort_key=None, min_area=None):
+        """並び順・面積の下限を変える"""
+        if sort_key is not None:
+            self.sort_key = sort_key
+        if min_area is not None:
+            self.min_area = min_area
+        self.set_index(self.index_)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.order):
+            return None
+        if role == Qt.DisplayRole:
+            x, y, w, h = self.index_.rects[self.order[index.row()]].tolist()
+            return f"差分 ({x}, {y})"
+        if role == Qt.UserRole:
+            return self.rect_at(index.row())
+        return None
+
+    def rect_at(self, row):
+        return QRectF(*self.index_.rects[self.order[row]].tolist())
+
+
+class DiffRectsItem(QGraphicsItem):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.index_ = RectIndex(np.zeros((0, 4), np.float32))
+        self.pen = QPen(Qt.red)
+        self.bounds = QRectF()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def set_index(self, index, pen=None):
+        self.prepareGeometryChange()
+        self.index_ = index
+        if pen is not None:
+            self.pen = pen
+        rects = index.rects
+        if len(rects):
+            x1, y1 = rects[:, :2].min(axis=0).tolist()
+            x2, y2 = (rects[:, :2] + rects[:, 2:]).max(axis=0).tolist()
+            m = self.pen.widthF() / 2 + 1
+            self.bounds = QRectF(x1 - m, y1 - m, x2 - x1 + 2 * m, y2 - y1 + 2 * m)
+        else:
+            self.bounds = QRectF()
+        self.update()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        r = option.exposedRect
+        found = self.index_.query(r.x(), r.y(), r.width(), r.height())
+        if len(found) == 0:
+            return
+        painter.setPen(self.pen)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRects([QRectF(*rect) for rect in self.index_.rects[found].tolist()])
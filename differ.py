@@ -1,3 +1,12 @@
+from PySide6.QtWidgets import QApplication, QGraphicsView, QGraphicsScene
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtGui import QImage, QPainter, QPixmap, QWheelEvent
+from PySide6.QtCore import Qt
+
+from svg_render import qimage_view
+from diff_engine import diff_mask, highlight_overlay
+
+
 class SvgComparisonView(QGraphicsView):
     def __init__(self):
         super().__init__()
@@ -6,12 +15,17 @@ class SvgComparisonView(QGraphicsView):
 
         self.image1 = None
         self.image2 = None
-        self.pixmap1 = None
-        self.pixmap2 = None
+        self.diff_image = None  # 差分ハイライト（load_svgs で入力が変わったときだけ作り直す）
+
+        # 表示アイテムは作り直さず、不透明度・表示切り替えはプロパティの変更だけで済ませる
+        self.pixmap1 = self.scene.addPixmap(QPixmap())
+        self.pixmap2 = self.scene.addPixmap(QPixmap())
+        self.diff_item = self.scene.addPixmap(QPixmap())
 
         self.opacity = 0.5
         self.scale_factor = 1.0
         self.show_diff = True  # 差分表示のフラグ
+        self.tolerance = None  # 比較の許容差（diff_engine.Tolerance。None は厳密比較。load_svgs 時に反映）
 
         self.setRenderHint(QPainter.Antialiasing)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
@@ -19,12 +33,18 @@ class SvgComparisonView(QGraphicsView):
     def load_svgs(self, file1, file2):
         self.image1 = self.render_svg(file1)
         self.image2 = self.render_svg(file2)
+        self.diff_image = self.highlight_diff(self.image1, self.image2)
+
+        self.pixmap1.setPixmap(QPixmap.fromImage(self.image1))
+        self.pixmap2.setPixmap(QPixmap.fromImage(self.image2))
+        self.diff_item.setPixmap(QPixmap.fromImage(self.diff_image))
+        self.scene.setSceneRect(self.pixmap1.boundingRect().united(self.pixmap2.boundingRect()))
         self.update_display()
 
     def render_svg(self, file_path):
         renderer = QSvgRenderer(file_path)
         size = renderer.defaultSize()
-        image = QImage(size, QImage.Format_ARGB32)
+        image = QImage(size, QImage.Format_ARGB32_Premultiplied)
         image.fill(Qt.transparent)
 
         painter = QPainter(image)
@@ -33,37 +53,14 @@ class SvgComparisonView(QGraphicsView):
         return image
 
     def update_display(self):
-        if not self.image1 or not self.image2:
-            return
-
-        self.scene.clear()
-
-        # Pixmapを追加
-        pix1 = QPixmap.fromImage(self.image1)
-        pix2 = QPixmap.fromImage(self.image2)
-        pixmap1_item = self.scene.addPixmap(pix1)
-        pixmap2_item = self.scene.addPixmap(pix2)
-        pixmap2_item.setOpacity(self.opacity)
-
-        # 差分がONならばハイライト表示を追加
-        if self.show_diff:
-            diff = self.highlight_diff(self.image1, self.image2)
-            diff_pix = QPixmap.fromImage(diff)
-            self.scene.addPixmap(diff_pix)
+        self.pixmap2.setOpacity(self.opacity)
+        # 差分がONならばハイライト表示
+        self.diff_item.setVisible(self.show_diff)
 
     def highlight_diff(self, img1, img2):
-        arr1 = np.array(img1.convertToFormat(QImage.Format_RGB32))
-        arr2 = np.array(img2.convertToFormat(QImage.Format_RGB32))
-
-        diff_mask = np.any(arr1 != arr2, axis=-1)
-        highlight_img = QImage(img1.size(), QImage.Format_ARGB32)
-        highlight_img.fill(Qt.transparent)
-
-        for y in range(img1.height()):
-            for x in range(img1.width()):
-                if diff_mask[y, x]:
-                    highlight_img.setPixelColor(x, y, QColor(255, 0, 0, 120))
-
+        mask = diff_mask(qimage_view(img1), qimage_view(img2), self.tolerance)
+        highlight_img = QImage(img1.size(), QImage.Format_RGBA8888)
+        highlight_overlay(mask, out=qimage_view(highlight_img, writable=True))
         return highlight_img
 
     def set_opacity(self, value):
@@ -0,0 +1,236 @@
+"""フォルダ同士の一括比較（旧フォルダ vs 新フォルダ、中断しても続きから再開できる）
+
+使い方:
+    python dir_compare.py old_dir new_dir -w work_dir
+
+相対パスが同じ SVG 同士を比較する。内容ハッシュが一致するペアは描画せず「同一」とし、
+残りを batch_compare.compare_pair でワーカープロセスに割り振る。
+    work_dir/index.jsonl   1 ペア 1 行の追記専用の結果ログ（比較が終わるたびに書き足す）
+    work_dir/summary.json  変更・追加・削除・同一・エラーの一覧
+再実行すると index.jsonl に記録済みで、かつ左右のハッシュと比較オプション（--min-area / --padding /
+--merge-gap / 許容差）が変わっていないペアは飛ばす。
+
+終了コード: 0 = 全て一致 / 1 = 変更・追加・削除あり / 2 = エラーあり
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from batch_compare import _init_worker, compare_pair, tolerance_from_args, EXIT_IDENTICAL, EXIT_DIFFERENT, EXIT_ERROR
+from tiled_compare import DEFAULT_MEMORY_BUDGET_MB
+from raster_cache import file_hash, content_hash
+
+INDEX_NAME = "index.jsonl"
+SUMMARY_NAME = "summary.json"
+# 結果に影響する比較オプションとその既定値（指定の省略と既定値の明示を同じ指紋にする）
+OPTION_DEFAULTS = {"min_area": 0, "padding": 0, "merge_gap": None, "tolerance": None}
+
+
+# -------------------- ファイルの対応付け --------------------
+def list_svgs(root):
+    """root 以下の SVG の相対パス（区切りは "/"）"""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(".svg"):
+                rel = os.path.relpath(os.path.join(dirpath, name), root)
+                found.append(rel.replace(os.sep, "/"))
+    return sorted(found)
+
+
+def pair_files(old_dir, new_dir):
+    """(両方にある相対パス, 新フォルダにだけある, 旧フォルダにだけある)"""
+    old, new = set(list_svgs(old_dir)), set(list_svgs(new_dir))
+    return sorted(old & new), sorted(new - old), sorted(old - new)
+
+
+# -------------------- 結果ログ --------------------
+def options_fingerprint(region_options):
+    """比較オプションの指紋（記録済みの結果を使い回せるかの判定用。メモリ上限・並列数は結果を変えないので含めない）"""
+    options = dict(OPTION_DEFAULTS, **(region_options or {}))
+    tolerance = options["tolerance"]
+    options["tolerance"] = list(tolerance) if tolerance is not None and any(tolerance) else None
+    return content_hash(json.dumps(options, sort_keys=True).encode("utf-8"))[:16]
+
+
+def read_index(path):
+    """index.jsonl を読み、相対パス → 最後の記録 の dict を返す
+
+    中断時に書きかけになった最後の行は読み飛ばす（そのペアは比較し直す）。
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["path"]] = record
+    return records
+
+
+class IndexWriter:
+    """1 行ずつ追記して即座にフラッシュする（書き込みはメインプロセスだけ）"""
+
+    def __init__(self, path):
+        # 書きかけの行で終わっていれば改行を補う
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                partial = f.read(1) != b"\n"
+        else:
+            partial = False
+        self.file = open(path, "a", encoding="utf-8")
+        if partial:
+            self.file.write("\n")
+
+    def append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# -------------------- 比較 --------------------
+def run_dir_compare(old_dir, new_dir, work_dir, jobs=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                    cache_dir=None, region_options=None, threads=1, progress=None):
+    """フォルダ同士を比較して summary（dict）を返す
+
+    progress(done, total) はペアの記録ごとに呼ばれる（例外を投げれば中断できる。記録済みの分は残る）
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    index_path = os.path.join(work_dir, INDEX_NAME)
+    pairs, added, removed = pair_files(old_dir, new_dir)
+    done = read_index(index_path)
+    fingerprint = options_fingerprint(region_options)
+
+    records = {}
+    pending = []
+    writer = IndexWriter(index_path)
+    try:
+        for rel in pairs:
+            old_path, new_path = os.path.join(old_dir, rel), os.path.join(new_dir, rel)
+            try:
+                old_hash, new_hash = file_hash(old_path), file_hash(new_path)
+            except OSError as e:
+                record = {"path": rel, "status": "error", "error": str(e)}
+                records[rel] = record
+                writer.append(record)
+                continue
+            previous = done.get(rel)
+            if (previous and previous.get("old_hash") == old_hash and previous.get("new_hash") == new_hash
+                    and previous.get("options") == fingerprint):
+                records[rel] = previous  # 前回の実行で同じオプションで比較済み
+            elif old_hash == new_hash:
+                record = {"path": rel, "status": "identical", "hash": True,
+                          "old_hash": old_hash, "new_hash": new_hash, "options": fingerprint, "rects": []}
+                records[rel] = record
+                writer.append(record)
+            else:
+                pending.append((rel, old_path, new_path, old_hash, new_hash))
+
+        total = len(pairs)
+        finished = len(records)
+        if progress:
+            progress(finished, total)
+        if pending:
+            jobs = max(1, min(jobs or os.cpu_count() or 1, len(pending)))
+            # Qt は fork 後の利用が安全でないため spawn で起動する
+            ctx = multiprocessing.get_context("spawn")
+            executor = ProcessPoolExecutor(max_workers=jobs, mp_context=ctx,
+                                           initializer=_init_worker, initargs=(cache_dir, threads))
+            try:
+                futures = {executor.submit(compare_pair, old_path, new_path, memory_budget_mb, region_options, False):
+                           (rel, old_hash, new_hash)
+                           for rel, old_path, new_path, old_hash, new_hash in pending}
+                for future in as_completed(futures):
+                    rel, old_hash, new_hash = futures[future]
+                    result = future.result()
+                    record = {"path": rel, "status": result["status"], "old_hash": old_hash, "new_hash": new_hash,
+                              "options": fingerprint}
+                    record.update((k, v) for k, v in result.items() if k not in ("reference", "target", "status"))
+                    if record["status"] == "error":
+                        # エラーは次回もう一度試す（ハッシュを残さない）
+                        record.pop("old_hash"), record.pop("new_hash")
+                    records[rel] = record
+                    writer.append(record)
+                    finished += 1
+                    if progress:
+                        progress(finished, total)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        writer.close()
+
+    changed = [rel for rel in pairs if records[rel]["status"] == "different"]
+    summary = {
+        "old_dir": old_dir,
+        "new_dir": new_dir,
+        "total": len(pairs) + len(added) + len(removed),
+        "compared": len(pending),
+        "identical": sum(records[rel]["status"] == "identical" for rel in pairs),
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+        "errors": [{"path": rel, "error": records[rel].get("error")}
+                   for rel in pairs if records[rel]["status"] == "error"],
+    }
+    with open(os.path.join(work_dir, SUMMARY_NAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def exit_code(summary):
+    if summary["errors"]:
+        return EXIT_ERROR
+    if summary["changed"] or summary["added"] or summary["removed"]:
+        return EXIT_DIFFERENT
+    return EXIT_IDENTICAL
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="フォルダ同士の SVG 一括比較（再開可能）")
+    parser.add_argument("old_dir", help="旧フォルダ")
+    parser.add_argument("new_dir", help="新フォルダ")
+    parser.add_argument("-w", "--work-dir", required=True, help="index.jsonl / summary.json の保存先")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    parser.add_argument("-t", "--threads", type=int, default=1,
+                        help="ワーカープロセスごとに差分領域を比較するスレッド数（既定: 1）")
+    parser.add_argument("-m", "--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="1比較あたりのメモリ上限MB（超える文書はタイル分割で比較）")
+    parser.add_argument("--cache-dir", default=None, help="描画済みラスタのキャッシュ先（指定時のみ使用）")
+    parser.add_argument("--min-area", type=int, default=0, help="差分画素数がこれ未満の領域を除く")
+    parser.add_argument("--padding", type=int, default=0, help="差分矩形を広げる幅（px）")
+    parser.add_argument("--merge-gap", type=int, default=None, help="この距離（px）以内の差分矩形を結合する")
+    parser.add_argument("--tolerance", type=int, default=0, help="チャンネルごとの差がこの値以下なら同じとみなす（0〜127）")
+    parser.add_argument("--alpha-aware", action="store_true", help="白背景に合成した見た目で比べる")
+    parser.add_argument("--ignore-isolated", action="store_true", help="孤立した差分画素を無視する")
+    parser.add_argument("--antialias", action="store_true",
+                        help="アンチエイリアスの違いを無視する（--tolerance 16 --alpha-aware --ignore-isolated）")
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r[INFO] {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    t0 = time.perf_counter()
+    region_options = {"min_area": args.min_area, "padding": args.padding, "merge_gap": args.merge_gap,
+                      "tolerance": tolerance_from_args(args)}
+    summary = run_dir_compare(args.old_dir, args.new_dir, args.work_dir, args.jobs, args.memory_budget,
+                              args.cache_dir, region_options, args.threads, progress)
+    print(file=sys.stderr)
+    print(f"[INFO] 変更 {len(summary['changed'])} / 追加 {len(summary['added'])} / 削除 {len(summary['removed'])} / "
+          f"同一 {summary['identical']} / エラー {len(summary['errors'])}（{time.perf_counter() - t0:.1f} 秒）",
+          file=sys.stderr)
+    print(f"[INFO] 比較結果を保存しました: {os.path.join(args.work_dir, SUMMARY_NAME)}", file=sys.stderr)
+    return exit_code(summary)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,19 +8,28 @@ from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QFileDialog, QSlider, QLabel, QColorDialog,
     QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsRectItem,
-    QProgressDialog, QListWidget, QListWidgetItem, QSplitter,QSizePolicy,QMessageBox ,
-    QDialog,QProgressBar,QDialogButtonBox
+    QProgressDialog, QListView, QSplitter,QSizePolicy,QMessageBox ,
+    QDialog,QProgressBar,QDialogButtonBox, QComboBox, QSpinBox
 )
 from PySide6.QtSvg import QSvgRenderer
 from PySide6.QtGui import QPainter, QPixmap, QImage, QColor, QPen
-from PySide6.QtCore import Qt,QRectF, QThread, Signal, Slot
+from PySide6.QtCore import Qt,QRectF, QThread, Signal, Slot, QFileSystemWatcher, QTimer
 from scipy.ndimage import label
-import time  
 import cv2
 
-class MyExceptionCancel(Exception):
-    def __init__(self, arg=""):
-        self.arg = arg
+import tracing
+from svg_render import svg_to_qimage, qimage_to_numpy_safe, render_thumbnail, qimage_to_png
+from workers import SvgLoadThread, SvgUpdateThread, DiffThread, PreviewThread, TiledDiffThread
+from raster_cache import RasterCache, file_hash
+from svg_normalize import NormalizedCache
+from sparse_mask import write_mask_png
+from result_bundle import BUNDLE_NAME, ResultBundle, write_bundle, read_bundle
+from tile_item import SvgTileItem
+from diff_index import RectIndex
+from diff_view import DiffListModel, DiffRectsItem
+from diff_engine import REGION_DTYPE, ANTIALIAS_TOLERANCE, region_rects, regions_to_dicts
+
+HEATMAP_MAX_SIDE = 1024  # 保存する差分ヒートマップの長辺（縮小画像と同じ）
 
 class GraphicsView(QGraphicsView):
     def __init__(self, parent=None):
@@ -62,14 +71,42 @@ class SVGOverlayCompare(QWidget):
         # from PySide6.QtOpenGLWidgets import QOpenGLWidget
         # self.view.setViewport(QOpenGLWidget())
 
-        # 差分リスト
-        self.diff_list = QListWidget()
-        self.diff_list.itemSelectionChanged.connect(self.on_diff_selection_changed)
+        # 差分リスト（仮想リスト: 表示する行の文字列だけ作る）
+        self.diff_model = DiffListModel(self)
+        self.diff_list = QListView()
+        self.diff_list.setModel(self.diff_model)
+        self.diff_list.setUniformItemSizes(True)
+        self.diff_list.selectionModel().selectionChanged.connect(self.on_diff_selection_changed)
+
+        # 並び順・面積の下限・前後移動
+        self.diff_sort_combo = QComboBox()
+        self.diff_sort_combo.addItem("検出順", "position")
+        self.diff_sort_combo.addItem("面積順", "area")
+        self.diff_sort_combo.currentIndexChanged.connect(self.update_diff_view)
+        self.diff_min_area_spin = QSpinBox()
+        self.diff_min_area_spin.setRange(0, 10 ** 9)
+        self.diff_min_area_spin.setPrefix("最小面積: ")
+        self.diff_min_area_spin.valueChanged.connect(self.update_diff_view)
+        prev_diff_btn = QPushButton("前の差分")
+        next_diff_btn = QPushButton("次の差分")
+        prev_diff_btn.clicked.connect(lambda: self.select_diff(-1))
+        next_diff_btn.clicked.connect(lambda: self.select_diff(1))
+
+        list_panel = QWidget()
+        list_layout = QVBoxLayout(list_panel)
+        list_layout.setContentsMargins(0, 0, 0, 0)
+        list_layout.addWidget(self.diff_sort_combo)
+        list_layout.addWidget(self.diff_min_area_spin)
+        nav_layout = QHBoxLayout()
+        nav_layout.addWidget(prev_diff_btn)
+        nav_layout.addWidget(next_diff_btn)
+        list_layout.addLayout(nav_layout)
+        list_layout.addWidget(self.diff_list)
 
         # レイアウト：左にビュー、右にリスト
         splitter = QSplitter(Qt.Horizontal)
         splitter.addWidget(self.view)
-        splitter.addWidget(self.diff_list)
+        splitter.addWidget(list_panel)
         splitter.setStretchFactor(0, 9)
         splitter.setStretchFactor(1, 1)
         splitter.setSizes([1260, 140]) 
@@ -78,22 +115,56 @@ class SVGOverlayCompare(QWidget):
         self.left_pixmap_item = None
         self.right_pixmap_item = None
 
-        # 差分矩形
-        self.diff_items = []
+        # 差分矩形（全件を 1 つのアイテムで描く。見えている範囲だけ空間インデックスで引く）
+        self.diff_overlay = DiffRectsItem()
+        self.diff_overlay.setZValue(10)
+        self.scene.addItem(self.diff_overlay)
+        self.diff_rects = np.zeros((0, 4), np.float32)  # (x, y, w, h)。保存時はこれをそのまま書き出す
+        self.diff_regions = None    # 差分計算の結果（面積・重心付きの構造化配列）。保存結果の復元時は None
+        self.diff_mask = None       # 差分画素（sparse_mask.RunMask）。分からなければ None
+
+        # 縮小画像（保存結果・段階表示の 1 段目。SVG の読み込みが終わるまでの仮表示）
+        self.thumbnail_items = []
 
         # 状態
         self.left_renderer = None
         self.right_renderer = None
+        self.left_path = None
+        self.right_path = None
         self.left_img = None
         self.right_img = None
         self.left_arr = None
         self.right_arr = None
+        self.left_hashes = None     # ブロックハッシュ（片側だけ読み直したとき、もう片側は再計算しない）
+        self.right_hashes = None
+        self.sources = {}           # side -> 描画した SVG の内容（監視中に保存し直されたときの比較元）
         self.alpha = 0.5
         self.diff_enabled = False
         self.background_color = QColor(Qt.white)
-
-        # キャンセルフラグ
-        self.cancel_requested = False
+        self.tolerance = None       # 比較の許容差（None は厳密比較）
+
+        # バックグラウンド処理
+        self.load_threads = {}      # side -> 実行中の SvgLoadThread
+        self.diff_thread = None
+        self.preview_thread = None
+        self.after_load = None      # 左右の読み込み完了後に実行する処理（None なら差分計算）
+
+        # ファイル監視（保存し直された側だけ、変わった範囲を描画・比較し直す）
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_watched_file_changed)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(300)  # 保存中の連続した書き込みをまとめる
+        self.watch_timer.timeout.connect(self.on_watch_timer)
+        self.watch_pending = set()
+
+        # 描画済みラスタのディスクキャッシュ（作れなければ使わない）
+        try:
+            self.raster_cache = RasterCache()
+        except OSError as e:
+            print(f"[ERROR] ラスタキャッシュを作成できません: {e}")
+            self.raster_cache = None
+        self.normalizer = None      # SVG 前処理（ON のとき NormalizedCache）
 
         # UIボタン群
         load_left_btn = QPushButton("左SVGを読み込む")
@@ -124,6 +195,20 @@ class SVGOverlayCompare(QWidget):
         self.diff_toggle_btn = QPushButton("差分ハイライト ON")
         self.diff_toggle_btn.clicked.connect(self.toggle_diff)
 
+        self.tolerance_combo = QComboBox()
+        self.tolerance_combo.addItem("厳密比較", "strict")
+        self.tolerance_combo.addItem("アンチエイリアスを無視", "antialias")
+        self.tolerance_combo.currentIndexChanged.connect(self.change_tolerance)
+
+        self.watch_btn = QPushButton("ファイル監視 OFF")
+        self.watch_btn.setCheckable(True)
+        self.watch_btn.toggled.connect(self.toggle_watch)
+
+        self.normalize_btn = QPushButton("SVG前処理 OFF")
+        self.normalize_btn.setCheckable(True)
+        self.normalize_btn.setToolTip("描画に関係しない内容を取り除いた文書を描画する（次の読み込みから有効）")
+        self.normalize_btn.toggled.connect(self.toggle_normalize)
+
         load_left_btn.clicked.connect(self.load_left)
         load_right_btn.clicked.connect(self.load_right)
         bg_color_btn.clicked.connect(self.change_background_color)
@@ -147,6 +232,9 @@ class SVGOverlayCompare(QWidget):
         btn_layout.addWidget(self.save_result_btn)
         btn_layout.addWidget(self.load_result_btn)
         btn_layout.addWidget(self.diff_toggle_btn)
+        btn_layout.addWidget(self.tolerance_combo)
+        btn_layout.addWidget(self.watch_btn)
+        btn_layout.addWidget(self.normalize_btn)
 
 
         left_layout = QHBoxLayout()
@@ -167,21 +255,12 @@ class SVGOverlayCompare(QWidget):
         layout.addWidget(splitter)
         self.setLayout(layout)
 
-    def log_time(label, t0):
-        print(f"[DEBUG] {label}: {time.time()-t0:.3f} 秒")
-        
     # -------------------- SVG読み込み --------------------
     def load_left(self):
-        try:
-            self.load_svg("left")
-        except(MyExceptionCancel) as e :
-            QMessageBox.information(self, "情報", "キャンセルしました")
+        self.load_svg("left")
 
     def load_right(self):
-        try:
-            self.load_svg("right")
-        except(MyExceptionCancel) as e :
-            QMessageBox.information(self, "情報", "キャンセルしました")
+        self.load_svg("right")
 
     def load_svg(self, side: str):
         is_left = (side == "left")
@@ -190,71 +269,270 @@ class SVGOverlayCompare(QWidget):
         if not path:
             return
 
-        progress = QProgressDialog("...", "キャンセル", 0, 100, self)
-        progress.setWindowTitle("進捗")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)
-        progress.canceled.connect(self._on_cancel)
-
-        # 共通処理
-        progress.setLabelText("ラベル更新")
-        t0 = time.time()
         label = self.left_path_label if is_left else self.right_path_label
         label.setText(f"{'左' if is_left else '右'}画像: {path}")
         label.setToolTip(path)
-        print(f"[DEBUG] ラベル更新: {time.time() - t0:.3f} 秒")
-        progress.setValue(5)
-        if self.cancel_requested: raise MyExceptionCancel("")
-            
-
-        progress.setLabelText("QSvgRenderer作成")
-        t0 = time.time()
-        renderer = QSvgRenderer(path)
-        print(f"[DEBUG] QSvgRenderer作成: {time.time() - t0:.3f} 秒")
-        progress.setValue(20)
-        if self.cancel_requested: raise MyExceptionCancel("")
-
-        progress.setLabelText("svg_to_qimage")
-        t0 = time.time()
-        img = self.svg_to_qimage(renderer)
-        print(f"[DEBUG] svg_to_qimage: {time.time() - t0:.3f} 秒")
-        progress.setValue(30)
-        if self.cancel_requested: raise MyExceptionCancel("")
-
-        progress.setLabelText("qimage_to_numpy_safe")
-        t0 = time.time()
-        arr = self.qimage_to_numpy_safe(img)
-        print(f"[DEBUG] qimage_to_numpy_safe: {time.time() - t0:.3f} 秒")
-        progress.setValue(40)
-        if self.cancel_requested: raise MyExceptionCancel("")
-
-        if is_left:
-            self.left_renderer, self.left_img, self.left_arr = renderer, img, arr
+
+        self.after_load = None
+        self.clear_thumbnails()
+        self.start_load(side, path)
+        self.start_preview()
+
+    def start_load(self, side, path):
+        """SVG をバックグラウンドで読み込む（同じ側で読み込み中のジョブはキャンセル）"""
+        old = self.load_threads.get(side)
+        if old is not None:
+            old.cancel()
+        self.cancel_diff()  # 入力が変わるので実行中の差分計算は無効
+        self.diff_mask = None
+
+        thread = SvgLoadThread(side, path, self.raster_cache, self.normalizer, parent=self)
+        self.make_progress(f"進捗（{'左' if side == 'left' else '右'}）", thread)
+        thread.parsed.connect(lambda info, t=thread: self.on_svg_parsed(t, info))
+        thread.succeeded.connect(lambda result, t=thread: self.on_svg_loaded(t, result))
+        thread.canceled.connect(lambda t=thread: self.on_job_canceled(t))
+        thread.failed.connect(lambda message, t=thread: self.on_job_failed(t, message))
+        self.load_threads[side] = thread
+        thread.start()
+
+    def start_preview(self):
+        """大きいページは縮小描画で概略の差分を先に表示する（本描画・本計算の結果で置き換える）"""
+        paths = {}
+        for side, path in (("left", self.left_path), ("right", self.right_path)):
+            thread = self.load_threads.get(side)
+            paths[side] = thread.path if thread is not None else path
+        if not paths["left"] or not paths["right"]:
+            return
+
+        if self.preview_thread is not None:
+            self.preview_thread.cancel()
+        thread = PreviewThread(paths["left"], paths["right"], parent=self)
+        thread.succeeded.connect(lambda result, t=thread: self.on_preview_ready(t, result))
+        thread.failed.connect(lambda message: print(f"[ERROR] 仮表示: {message}"))
+        thread.finished.connect(thread.deleteLater)
+        self.preview_thread = thread
+        thread.start(QThread.HighPriority)  # 本描画より先に終わらせたい
+
+    def on_preview_ready(self, thread, result):
+        if thread is not self.preview_thread:
+            return
+        self.preview_thread = None
+        if result is None or not self.load_threads:
+            return  # 小さいページ、または本描画が先に終わった
+        self.clear_thumbnails()
+        if self.waiting_for_parse():
+            self.show_thumbnails(result["images"], result["width"], result["height"])
+        pen = QPen(Qt.red)
+        pen.setStyle(Qt.DashLine)
+        self.set_diff_rects(result["rects"], pen, True)
+        print(f"[INFO] 仮表示: 概略の差分 {len(result['rects'])} 件")
+
+    def make_progress(self, title, thread):
+        """スレッドの進捗を表示するダイアログ（非モーダル: 処理中もビューを操作できる）"""
+        progress = QProgressDialog("...", "キャンセル", 0, 100, self)
+        progress.setWindowTitle(title)
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(0)
+        progress.canceled.connect(thread.cancel)
+
+        def on_progress(value, text):
+            progress.setLabelText(text)
+            progress.setValue(value)
+
+        def on_finished():
+            # close() は canceled を発行するので hide() で閉じる
+            progress.hide()
+            progress.deleteLater()
+
+        thread.progress.connect(on_progress)
+        thread.finished.connect(on_finished)
+        thread.finished.connect(thread.deleteLater)
+        return progress
+
+    def is_current_job(self, thread):
+        return thread is self.diff_thread or thread in self.load_threads.values()
+
+    def forget_job(self, thread):
+        if thread is self.diff_thread:
+            self.diff_thread = None
+        for side, t in list(self.load_threads.items()):
+            if t is thread:
+                del self.load_threads[side]
+
+    def waiting_for_parse(self):
+        """解析が終わっていない（まだ表示できない）読み込みがあるか"""
+        return any(isinstance(t, SvgLoadThread) and not hasattr(t, "display_renderer")
+                   for t in self.load_threads.values())
+
+    def on_svg_parsed(self, thread, info):
+        """解析が終わった側をすぐ表示する（差分は描画・比較が終わってから重ねる）
+
+        renderer はワーカーが解析して GUI スレッドに移したもの（GUI スレッドでは解析しない）。
+        """
+        if not self.is_current_job(thread):
+            return
+        renderer = info["renderer"]
+        thread.display_renderer = renderer
+        with tracing.span("scene", side=info["side"]):
+            self.show_renderer(info["side"], renderer)
+        if not self.waiting_for_parse():
+            self.clear_thumbnails()
+
+    def on_svg_loaded(self, thread, result):
+        if not self.is_current_job(thread):
+            return  # 置き換えられた古いジョブ
+        self.forget_job(thread)
+
+        # 表示中のレンダラ（解析直後に受け取ったもの）と同じなので、タイルは描き直さない
+        renderer = result["renderer"]
+        if result["side"] == "left":
+            self.left_renderer, self.left_img, self.left_arr = renderer, result["img"], result["arr"]
+            self.left_hashes = result["hashes"]
+            self.left_path = result["path"]
+        else:
+            self.right_renderer, self.right_img, self.right_arr = renderer, result["img"], result["arr"]
+            self.right_hashes = result["hashes"]
+            self.right_path = result["path"]
+        self.sources[result["side"]] = result["data"]
+        self.update_watch_paths()
+
+        self.update_scene_pixmaps()
+
+        if self.load_threads:
+            return  # もう片方の読み込み完了を待つ
+        if self.after_load is not None:
+            after_load, self.after_load = self.after_load, None
+            after_load()
+        else:
+            self.compute_diff()
+
+    # -------------------- SVG 前処理 --------------------
+    def toggle_normalize(self, checked):
+        self.normalize_btn.setText(f"SVG前処理 {'ON' if checked else 'OFF'}")
+        if not checked:
+            self.normalizer = None
+            return
+        try:
+            self.normalizer = NormalizedCache.default()
+        except OSError as e:
+            print(f"[ERROR] 前処理キャッシュを作成できません（メモリ上だけで保持します）: {e}")
+            self.normalizer = NormalizedCache()
+
+    # -------------------- ファイル監視 --------------------
+    def toggle_watch(self, checked):
+        self.watch_btn.setText(f"ファイル監視 {'ON' if checked else 'OFF'}")
+        self.update_watch_paths()
+
+    def update_watch_paths(self):
+        watched = self.watcher.files()
+        if watched:
+            self.watcher.removePaths(watched)
+        if self.watch_btn.isChecked():
+            paths = [p for p in {self.left_path, self.right_path} if p and os.path.exists(p)]
+            if paths:
+                self.watcher.addPaths(paths)
+
+    def on_watched_file_changed(self, path):
+        for side, p in (("left", self.left_path), ("right", self.right_path)):
+            if p == path:
+                self.watch_pending.add(side)
+        self.watch_timer.start()
+
+    def on_watch_timer(self):
+        # 置き換えで保存するエディタでは監視が外れるので付け直す
+        self.update_watch_paths()
+        pending, self.watch_pending = self.watch_pending, set()
+        for side in sorted(pending):
+            path = self.left_path if side == "left" else self.right_path
+            if path and os.path.exists(path):
+                self.start_update(side, path)
+
+    def start_update(self, side, path):
+        """保存し直された側を、前の内容との構造比較で変わった範囲だけ描画・比較し直す"""
+        old = self.load_threads.pop(side, None)
+        if old is not None:
+            old.cancel()
+        arr, hashes = (self.left_arr, self.left_hashes) if side == "left" else (self.right_arr, self.right_hashes)
+        other_arr = self.right_arr if side == "left" else self.left_arr
+        if (self.load_threads or self.diff_thread is not None or self.sources.get(side) is None
+                or arr is None or other_arr is None):
+            self.start_load(side, path)  # 読み込み・差分計算の途中なら通常の読み込みからやり直す
+            return
+
+        self.cancel_diff()
+        regions = self.diff_regions if self.diff_regions is not None else self.diff_rects
+        thread = SvgUpdateThread(side, path, self.sources[side], arr, hashes, other_arr, regions,
+                                 self.tolerance, self.normalizer, self.diff_mask, parent=self)
+        thread.succeeded.connect(lambda result, t=thread: self.on_svg_updated(t, result))
+        thread.canceled.connect(lambda t=thread: self.forget_job(t))
+        thread.failed.connect(lambda message, t=thread: self.on_job_failed(t, message))
+        thread.finished.connect(thread.deleteLater)
+        self.load_threads[side] = thread
+        thread.start()
+
+    def on_svg_updated(self, thread, result):
+        if not self.is_current_job(thread):
+            return
+        self.forget_job(thread)
+        side = result["side"]
+        if result["mode"] == "full":
+            print(f"[INFO] 監視: 変更範囲を特定できないため読み込み直します: {result['path']}")
+            self.start_load(side, result["path"])
+            return
+        self.sources[side] = result["data"]
+        if result["mode"] == "same":
+            print(f"[INFO] 監視: 描画に影響しない変更です: {result['path']}")
+            return
+
+        item = self.left_pixmap_item if side == "left" else self.right_pixmap_item
+        if side == "left":
+            self.left_renderer, self.left_img, self.left_arr = result["renderer"], result["img"], result["arr"]
+            self.left_hashes = result["hashes"]
         else:
-            self.right_renderer, self.right_img, self.right_arr = renderer, img, arr
+            self.right_renderer, self.right_img, self.right_arr = result["renderer"], result["img"], result["arr"]
+            self.right_hashes = result["hashes"]
+        item.setRenderer(result["renderer"], result["changed"])  # 変わった範囲のタイルだけ描き直す
+        self.set_diff_rects(result["regions"], QPen(Qt.red), True)
+        self.diff_mask = result["mask"]
+        print(f"[INFO] 監視: 変更範囲 {len(result['changed'])} 件を比較し直しました（差分 {len(result['regions'])} 件）")
+
+    def on_job_canceled(self, thread):
+        if not self.is_current_job(thread):
+            return
+        self.forget_job(thread)
+        self.update_scene_pixmaps()  # 解析だけ済んだ新しい内容を表示していたら元に戻す
+        QMessageBox.information(self, "情報", "キャンセルしました")
 
-        progress.setLabelText("update_scene_pixmaps")
-        t0 = time.time()
+    def on_job_failed(self, thread, message):
+        if not self.is_current_job(thread):
+            return
+        self.forget_job(thread)
         self.update_scene_pixmaps()
-        print(f"[DEBUG] update_scene_pixmaps: {time.time() - t0:.3f} 秒")
-        progress.setValue(50)
-        if self.cancel_requested: raise MyExceptionCancel("")
-
-        progress.setLabelText("compute_diff")
-        t0 = time.time()
-        self.compute_diff()
-        print(f"[DEBUG] compute_diff: {time.time() - t0:.3f} 秒")
-        progress.setValue(100)
-        if self.cancel_requested: raise MyExceptionCancel("")
-                    
+        print(f"[ERROR] {message}")
+        QMessageBox.warning(self, "エラー", message)
+
+    def cancel_diff(self):
+        if self.diff_thread is not None:
+            self.diff_thread.cancel()
+            self.diff_thread = None
+
+    def closeEvent(self, event):
+        # 実行中のスレッドを止めてから閉じる
+        threads = list(self.load_threads.values())
+        threads += [t for t in (self.diff_thread, self.preview_thread) if t is not None]
+        for thread in threads:
+            thread.cancel()
+        for thread in threads:
+            thread.wait()
+        super().closeEvent(event)
+
     def save_compare_result(self):
-        if self.left_arr is None or self.right_arr is None:
+        if self.left_renderer is None or self.right_renderer is None:
             return
 
         folder = QFileDialog.getExistingDirectory(self, "保存先フォルダを選択")
         if not folder:
             return
-        self.cancel_requested = False
         self.progress = QProgressDialog("...", "キャンセル", 0, 100, self)
         self.progress.setWindowTitle("進捗")
         self.progress.setWindowModality(Qt.WindowModal)
@@ -262,31 +540,50 @@ class SVGOverlayCompare(QWidget):
         self.progress.setLabelText("左右SVGコピー開始")
         self.progress.setValue(0)
         # 左右SVGコピー
-        left_src = self.left_path_label.text().replace("左画像: ", "")
-        right_src = self.right_path_label.text().replace("右画像: ", "")
-        if os.path.exists(left_src):
-            shutil.copy(left_src, os.path.join(folder, "left.svg"))
-        if os.path.exists(right_src):
-            shutil.copy(right_src, os.path.join(folder, "right.svg"))
+        left_svg = os.path.join(folder, "left.svg")
+        right_svg = os.path.join(folder, "right.svg")
+        if self.left_path and os.path.exists(self.left_path):
+            shutil.copy(self.left_path, left_svg)
+        if self.right_path and os.path.exists(self.right_path):
+            shutil.copy(self.right_path, right_svg)
         self.progress.setLabelText("左右SVGコピー完了")
         self.progress.setValue(10)
 
-        self.progress.setLabelText("差分矩形データJson変換-開始")
-        addVal = 80/len(self.diff_items)
-        # 差分矩形データをJSONに保存
-        rects = []
-        for rect in self.diff_items:
-            self.progress.setValue( self.progress.value() + addVal )
-            r = rect.rect()
-            rects.append({
-                "x": r.x(), "y": r.y(), "w": r.width(), "h": r.height()
-            })
-
-        self.progress.setLabelText("Json保存-開始")
-        self.progress.setValue(90)
+        # 縮小画像（読み込み時に SVG を描画し直さず表示するため）
+        self.progress.setLabelText("縮小画像作成")
+        with tracing.span("save.thumbnails"):
+            thumbnails = {
+                "left": qimage_to_png(render_thumbnail(self.left_renderer)),
+                "right": qimage_to_png(render_thumbnail(self.right_renderer)),
+            }
+        self.progress.setValue(50)
+
+        # 差分矩形は配列のまま書き出す（件数が多くても矩形ごとの処理はしない）
+        self.progress.setLabelText("比較結果保存-開始")
+        size = self.left_renderer.defaultSize()
+        # 元の SVG が無くてコピーしなかった側はハッシュを持たない
+        content_hashes = [file_hash(p) if os.path.exists(p) else None for p in (left_svg, right_svg)]
+        bundle = ResultBundle(size.width(), size.height(), self.diff_rects, *content_hashes, thumbnails, self.diff_mask)
+        with tracing.span("save.bundle", rects=len(self.diff_rects)):
+            write_bundle(os.path.join(folder, BUNDLE_NAME), bundle)
+        self.progress.setValue(70)
+
+        # 差分画素のヒートマップ（縮小画像に重ねられる大きさ。マスクから帯ごとに書き出す）
+        if self.diff_mask is not None:
+            self.progress.setLabelText("差分ヒートマップ作成")
+            scale = min(1.0, HEATMAP_MAX_SIDE / max(size.width(), size.height(), 1))
+            with tracing.span("save.heatmap", runs=len(self.diff_mask)):
+                write_mask_png(self.diff_mask, os.path.join(folder, "diff_heatmap.png"), scale)
+        self.progress.setValue(80)
+
+        # 旧形式（他ツール向け）
+        if self.diff_regions is not None:
+            rects = regions_to_dicts(self.diff_regions)
+        else:
+            rects = [dict(zip("xywh", r)) for r in self.diff_rects.tolist()]
         with open(os.path.join(folder, "diff_rects.json"), "w", encoding="utf-8") as f:
-            json.dump(rects, f, ensure_ascii=False, indent=2)
-        self.progress.setLabelText("Json保存-完了")
+            json.dump(rects, f, ensure_ascii=False)
+        self.progress.setLabelText("比較結果保存-完了")
         self.progress.setValue(99)
 
         print(f"[INFO] 比較結果を保存しました: {folder}")
@@ -303,65 +600,95 @@ class SVGOverlayCompare(QWidget):
         right_svg = os.path.join(folder, "right.svg")
         self.right_path_label.setText(f"右画像: {right_svg}")
 
+        bundle_path = os.path.join(folder, BUNDLE_NAME)
         rects_json = os.path.join(folder, "diff_rects.json")
 
-        if not (os.path.exists(left_svg) and os.path.exists(right_svg) and os.path.exists(rects_json)):
+        if not (os.path.exists(left_svg) and os.path.exists(right_svg)
+                and (os.path.exists(bundle_path) or os.path.exists(rects_json))):
             print("[ERROR] 保存結果が不完全です。")
             return
 
-        self.cancel_requested = False
-        self.progress = QProgressDialog("...", "キャンセル", 0, 100, self)
-        self.progress.setWindowTitle("進捗")
-        self.progress.setWindowModality(Qt.WindowModal)
-        self.progress.setMinimumDuration(0)
-        self.progress.setLabelText("左右SVG再読み込み開始")
-        self.progress.setValue(10)
-        # 左右再読込
-        self.left_renderer = QSvgRenderer(left_svg)
-        self.right_renderer = QSvgRenderer(right_svg)
-        
-        self.progress.setLabelText("左右SVG再読み込み開始")
-        self.progress.setValue(20)
-        self.left_img = self.svg_to_qimage(self.left_renderer)
-        self.right_img = self.svg_to_qimage(self.right_renderer)
-        self.progress.setLabelText("左右SVG再読み込み完了")
-        self.progress.setValue(50)
+        print(f"[INFO] 保存結果を読み込みます: {folder}")
+        self.clear_thumbnails()
+        preview = True
+        if os.path.exists(bundle_path):
+            try:
+                with tracing.span("load.bundle") as sp:
+                    bundle = read_bundle(bundle_path)
+                    sp.set(rects=len(bundle.rects))
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] {e}")
+                QMessageBox.warning(self, "エラー", str(e))
+                return
+
+            if bundle.left_hash == file_hash(left_svg) and bundle.right_hash == file_hash(right_svg):
+                # 縮小画像と矩形をすぐ表示し、SVG の読み込みが終わったら縮小画像を外す
+                images = {side: QImage.fromData(data, "PNG") for side, data in bundle.thumbnails.items()}
+                self.show_thumbnails(images, bundle.width, bundle.height)
+                self.restore_diff_rects(bundle.rects)
+                self.after_load = self.clear_thumbnails
+                preview = False
+                mask = bundle.mask
+            else:
+                print("[INFO] 保存後に SVG が変更されているため差分を計算し直します")
+                self.after_load = None
+        else:
+            # 旧形式: 差分矩形は左右の再読み込み（並列）が終わってから復元する
+            with open(rects_json, "r", encoding="utf-8") as f:
+                rects = np.array([[r["x"], r["y"], r["w"], r["h"]] for r in json.load(f)], np.float32)
+            self.after_load = lambda: self.restore_diff_rects(rects)
+        self.start_load("left", left_svg)
+        self.start_load("right", right_svg)
+        if preview:
+            self.start_preview()
+        else:
+            self.diff_mask = mask  # 読み込みを始めると消えるので最後に戻す
 
-        self.progress.setLabelText("update_scene_pixmaps")
-        self.progress.setValue(51)
-        self.update_scene_pixmaps()
+    def show_thumbnails(self, images, width, height):
+        """縮小画像 {side: QImage} を文書サイズに引き伸ばして仮表示する"""
+        for side in ("left", "right"):
+            img = images.get(side)
+            if img is None or img.isNull():
+                continue
+            item = QGraphicsPixmapItem(QPixmap.fromImage(img))
+            item.setTransformationMode(Qt.SmoothTransformation)
+            item.setScale(width / img.width())
+            if side == "right":
+                item.setOpacity(self.alpha)
+            self.scene.addItem(item)
+            self.thumbnail_items.append(item)
+        self.view.setSceneRect(0, 0, width, height)
 
-        self.progress.setLabelText("差分矩形復元開始")
-        self.progress.setValue(80)
-        for item in self.diff_items:
+    def clear_thumbnails(self):
+        for item in self.thumbnail_items:
             self.scene.removeItem(item)
-        self.diff_items.clear()
-        self.diff_list.clear()
+        self.thumbnail_items.clear()
 
-        # 差分矩形復元
-        with open(rects_json, "r", encoding="utf-8") as f:
-            rects = json.load(f)
+    def set_diff_rects(self, rects, pen=None, visible=None):
+        """差分矩形（(N, 4) または差分領域の構造化配列）を描画アイテムとリストに反映する
 
-        for info in rects:
-            rect = QGraphicsRectItem(info["x"], info["y"], info["w"], info["h"])
+        アイテムは作り直さず差し替える。
+        """
+        is_regions = isinstance(rects, np.ndarray) and rects.dtype == REGION_DTYPE
+        self.diff_regions = rects if is_regions else None
+        self.diff_rects = region_rects(rects)
+        if pen is None:
             pen = QPen(QColor(255, 0, 0, 200))
             pen.setWidth(3)
-            rect.setPen(pen)
-            rect.setBrush(Qt.NoBrush)
-            rect.setVisible(self.diff_enabled)
-            self.scene.addItem(rect)
-            self.diff_items.append(rect)
-
-            item = QListWidgetItem(f"差分 ({info['x']}, {info['y']})")
-            item.setData(Qt.UserRole, rect)
-            self.diff_list.addItem(item)
-        self.progress.setLabelText("差分矩形復元完了")
-        self.progress.setValue(99)
-
-        print(f"[INFO] 保存結果を読み込みました: {folder}")    
-        self.progress.setValue(100)
+        if visible is None:
+            visible = self.diff_enabled
+
+        with tracing.span("diff_view", rects=len(self.diff_rects)):
+            index = RectIndex(self.diff_rects)
+            self.diff_overlay.set_index(index, pen)
+            self.diff_overlay.setVisible(visible)
+            self.diff_model.set_index(index)
+
+    def restore_diff_rects(self, rects):
+        self.set_diff_rects(rects)
+        print("[INFO] 保存結果を読み込みました")
         QMessageBox.information(self, "情報", "保存結果を読み込みました")
-            
+
     # -------------------- UI更新 --------------------
     def update_Ralpha(self, value):
         self.alpha = value / 100.0
@@ -378,8 +705,12 @@ class SVGOverlayCompare(QWidget):
     def toggle_diff(self):
         self.diff_enabled = not self.diff_enabled
         self.diff_toggle_btn.setText(f"差分ハイライト {'ON' if self.diff_enabled else 'OFF'}")
-        for item in self.diff_items:
-            item.setVisible(self.diff_enabled)
+        self.diff_overlay.setVisible(self.diff_enabled)
+
+    def change_tolerance(self):
+        self.tolerance = ANTIALIAS_TOLERANCE if self.tolerance_combo.currentData() == "antialias" else None
+        if not self.load_threads and self.left_renderer is not None and self.right_renderer is not None:
+            self.compute_diff()
 
     def change_background_color(self):
         color = QColorDialog.getColor()
@@ -389,37 +720,12 @@ class SVGOverlayCompare(QWidget):
 
     # -------------------- SVG → QImage --------------------
     def svg_to_qimage(self, renderer):
-        size = renderer.defaultSize()
-        img = QImage(size, QImage.Format_ARGB32)
-        img.fill(Qt.transparent)
-        p = QPainter(img)
-        renderer.render(p)
-        p.end()
-        return img
+        return svg_to_qimage(renderer)
 
     # -------------------- 安全に QImage → NumPy --------------------
     #13秒
     def qimage_to_numpy_safe(self, img: QImage):    #9.7s
-        """
-        QImage → NumPy 配列 高速版（ゼロコピー + パディング対応）
-        """
-        # 形式をRGBAに統一
-        if img.format() != QImage.Format_RGBA8888:
-            img = img.convertToFormat(QImage.Format_RGBA8888)
-
-        w, h = img.width(), img.height()
-        ptr = img.bits()
-
-        # memoryview を使って NumPy 配列を作成
-        byte_count = img.bytesPerLine() * img.height()
-        arr = np.frombuffer(ptr, dtype=np.uint8, count=byte_count)
-        arr = arr.reshape((h, img.bytesPerLine() // 4, 4))
-
-        # 不要な列をカット（bytesPerLineで余った分を除去）
-        arr = arr[:, :w, :]
-        return np.array(arr)  # copyが必要な場合だけここで
-        # return arr.copy()
-        # return arr
+        return qimage_to_numpy_safe(img)
 
     #15秒
     # def qimage_to_numpy_safe(self, img: QImage):
@@ -434,172 +740,87 @@ class SVGOverlayCompare(QWidget):
 
 
     # -------------------- Scene 更新 --------------------
-    def update_scene_pixmaps(self): #10s
-        if not self.left_img or not self.right_img:
-            return
-
-        t0 = time.time()
-        # 10.125 秒
-        left_pix = QPixmap.fromImage(self.left_img)
-        right_pix = QPixmap.fromImage(self.right_img)
-
-        # 10.465 秒
-        # def make_pixmap(img):
-        #     return QPixmap.fromImage(img)
-        # # 左右を別スレッドで QPixmap に変換
-        # with ThreadPoolExecutor(max_workers=2) as executor:
-        #     future_left = executor.submit(make_pixmap, self.left_img)
-        #     future_right = executor.submit(make_pixmap, self.right_img)
-        #     left_pix = future_left.result()
-        #     right_pix = future_right.result()
-
-        print(f"[DEBUG] QPixmapに変換: {time.time() - t0:.3f} 秒")
-
-        t0 = time.time()
-        if not self.left_pixmap_item:
-            self.left_pixmap_item = QGraphicsPixmapItem(left_pix)
-            self.scene.addItem(self.left_pixmap_item)
-        else:
-            self.left_pixmap_item.setPixmap(left_pix)
-
-        if not self.right_pixmap_item:
-            self.right_pixmap_item = QGraphicsPixmapItem(right_pix)
-            self.right_pixmap_item.setOpacity(self.alpha)
-            self.scene.addItem(self.right_pixmap_item)
-        else:
-            self.right_pixmap_item.setPixmap(right_pix)
-            self.right_pixmap_item.setOpacity(self.alpha)
-        print(f"[DEBUG] QGraphicsPixmapItem: {time.time() - t0:.3f} 秒")
-
-        t0 = time.time()
-        self.view.setSceneRect(0, 0,
-                               max(self.left_img.width(), self.right_img.width()),
-                               max(self.left_img.height(), self.right_img.height()))
-        print(f"[DEBUG] setSceneRect: {time.time() - t0:.3f} 秒")
+    def update_scene_pixmaps(self):
+        """左右を SvgTileItem で表示する（巨大な QPixmap は作らず、見えているタイルだけ描画）"""
+        with tracing.span("scene"):
+            for side, renderer in (("left", self.left_renderer), ("right", self.right_renderer)):
+                if renderer is not None:
+                    self.show_renderer(side, renderer)
+        if self.left_renderer and self.right_renderer:
+            self.clear_thumbnails()
+
+    def show_renderer(self, side, renderer):
+        """片側の SvgTileItem に renderer を表示する（同じ renderer なら何もしない）"""
+        item = self.left_pixmap_item if side == "left" else self.right_pixmap_item
+        if item is None:
+            item = SvgTileItem(renderer)
+            if side == "right":
+                item.setOpacity(self.alpha)
+            self.scene.addItem(item)
+            if side == "left":
+                self.left_pixmap_item = item
+            else:
+                self.right_pixmap_item = item
+        elif item.renderer is not renderer:
+            item.setRenderer(renderer)
+
+        rect = QRectF()
+        for it in (self.left_pixmap_item, self.right_pixmap_item):
+            if it is not None:
+                rect = rect.united(it.boundingRect())
+        self.view.setSceneRect(rect)
 
     def compute_diff(self):
         """左右の画像を比較して差分領域を表示（マスク単位で絞り込み対応版）"""
-        if self.left_arr is None or self.right_arr is None:
+        if self.left_renderer is None or self.right_renderer is None:
             print("左右いずれかの画像が未読み込みのため、比較できません。")
             return
 
-        # --- 初期化 ---
+        # 表示中の矩形（仮表示など）は結果が出たところで置き換える
         print("差分計算開始")
-        t0 = time.time()
-        for item in self.diff_items:
-            self.scene.removeItem(item)
-        self.diff_items.clear()
-        self.diff_list.clear()
-        print(f"[DEBUG] 差分矩形クリア: {time.time() - t0:.3f} 秒")
-
-        arr_l = self.left_arr
-        arr_r = self.right_arr
-
-        if arr_l.shape != arr_r.shape:
+        if self.left_renderer.defaultSize() != self.right_renderer.defaultSize():
             print("左右の画像サイズが異なります。比較を中止します。")
+            self.set_diff_rects([])
+            self.diff_mask = None
             return
 
-        h, w, _ = arr_l.shape
-
-        # --- ステップ1: 低解像度比較 ---
-        scale = 0.1  # 1/10サイズで比較
-        arr_l_low = cv2.resize(arr_l, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-        arr_r_low = cv2.resize(arr_r, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-
-        diff_low = cv2.absdiff(arr_l_low, arr_r_low)
-        diff_low = np.any(diff_low != 0, axis=2).astype(np.uint8) * 255
-
-        # --- ステップ2: ノイズ除去（モルフォロジー） ---
-        kernel = np.ones((3, 3), np.uint8)
-        diff_low = cv2.morphologyEx(diff_low, cv2.MORPH_OPEN, kernel)
-        diff_low = cv2.morphologyEx(diff_low, cv2.MORPH_CLOSE, kernel)
-
-        # --- ステップ3: 差分領域をラベリング ---
-        num_labels, labels_low = cv2.connectedComponents(diff_low)
-        print(f"検出された差分領域数: {num_labels - 1}")
-
-        # スケール倍率（低解像度 → 高解像度）
-        scale_x = w / diff_low.shape[1]
-        scale_y = h / diff_low.shape[0]
-
-        # --- ステップ4: 各差分領域ごとに高解像度再比較 ---
-        rects = []
-        for label_id in range(1, num_labels):  # 0 は背景
-            ys, xs = np.nonzero(labels_low == label_id)
-            if len(xs) == 0 or len(ys) == 0:
-                continue
-
-            # ラベル領域（低解像度座標）
-            x1, x2 = xs.min(), xs.max()
-            y1, y2 = ys.min(), ys.max()
-
-            # 高解像度座標に変換
-            x1h = int(x1 * scale_x)
-            x2h = int((x2 + 1) * scale_x)
-            y1h = int(y1 * scale_y)
-            y2h = int((y2 + 1) * scale_y)
-
-            # 安全クリップ
-            x1h = max(0, x1h)
-            y1h = max(0, y1h)
-            x2h = min(w, x2h)
-            y2h = min(h, y2h)
-
-            # 領域抽出
-            arr_l_tile = arr_l[y1h:y2h, x1h:x2h]
-            arr_r_tile = arr_r[y1h:y2h, x1h:x2h]
-            if arr_l_tile.size == 0 or arr_r_tile.size == 0:
-                continue
-
-            # 高解像度差分
-            diff_high = cv2.absdiff(arr_l_tile, arr_r_tile)
-            diff_high = np.any(diff_high != 0, axis=2)
-
-            # 差分座標抽出
-            ys_h, xs_h = np.nonzero(diff_high)
-            if len(xs_h) == 0 or len(ys_h) == 0:
-                continue
-
-            # --- 小さいノイズ除去（面積閾値） ---
-            area = (x2h - x1h) * (y2h - y1h)
-            if area < 100:  # 面積閾値
-                continue
-
-            # --- 最終的な矩形領域を算出 ---
-            rect = QRectF(
-                float(x1h + xs_h.min()),
-                float(y1h + ys_h.min()),
-                float(xs_h.max() - xs_h.min()),
-                float(ys_h.max() - ys_h.min())
-            )
-            rects.append(rect)
+        # 重い差分計算はバックグラウンドで実行
+        self.cancel_diff()
+        if self.left_arr is None or self.right_arr is None:
+            # メモリ上限を超えるページは全体を描画していないので、タイル単位で描画・比較する
+            thread = TiledDiffThread(self.left_path, self.right_path, self.sources.get("left"),
+                                     self.sources.get("right"), self.tolerance, self.normalizer, parent=self)
+        else:
+            thread = DiffThread(self.left_arr, self.right_arr, self.sources.get("left"), self.sources.get("right"),
+                                self.left_hashes, self.right_hashes, self.tolerance, return_mask=True, parent=self)
+        self.make_progress("進捗", thread)
+        thread.succeeded.connect(lambda result, t=thread, t0=tracing.now(): self.on_diff_computed(t, result, t0))
+        thread.canceled.connect(lambda t=thread: self.on_job_canceled(t))
+        thread.failed.connect(lambda message, t=thread: self.on_job_failed(t, message))
+        self.diff_thread = thread
+        thread.start()
+
+    def on_diff_computed(self, thread, result, t0):
+        if not self.is_current_job(thread):
+            return
+        self.forget_job(thread)
+        rects, mask = result
+        tracing.record("compute_diff.total", t0, regions=len(rects), pixels=mask.count())
 
         # --- ステップ5: 差分矩形を描画 ---
-        pen = QPen(Qt.red)
-        for rect in rects:
-            item = QGraphicsRectItem(rect)
-            item.setPen(pen)
-            self.scene.addItem(item)
-            self.diff_items.append(item)
-
-            item = QListWidgetItem(f"差分 ({rect.x()}, {rect.y()})")
-            item.setData(Qt.UserRole, rect)
-            self.diff_list.addItem(item)
+        self.set_diff_rects(rects, QPen(Qt.red), True)
+        self.diff_mask = mask
 
         print(f"描画された差分矩形数: {len(rects)}")
         print("差分計算完了")
         QMessageBox.information(self, "情報", "差分表示完了しました")
 
-    def _on_cancel(self):
-        self.cancel_requested = True
-
     # -------------------- リスト選択処理 --------------------
     def on_diff_selection_changed(self):
-        items = self.diff_list.selectedItems()
-        if not items:
+        indexes = self.diff_list.selectionModel().selectedIndexes()
+        if not indexes:
             return
-        item = items[0]  # 複数選択対応ならループする
-        data = item.data(Qt.UserRole)
+        data = indexes[0].data(Qt.UserRole)  # 複数選択対応ならループする
 
         # QGraphicsRectItem の場合
         if isinstance(data, QRectF):
@@ -607,6 +828,18 @@ class SVGOverlayCompare(QWidget):
             self.view.centerOn(center_point)       # 中心に移動
             self.view.ensureVisible(data, 20, 20)  # 余白20pxで矩形を表示           
 
+    def select_diff(self, step):
+        """現在の並び順で前後の差分を選択する（端では反対側に回る）"""
+        count = self.diff_model.rowCount()
+        if count == 0:
+            return
+        row = self.diff_list.currentIndex().row()
+        row = (row + step) % count if row >= 0 else (0 if step > 0 else count - 1)
+        self.diff_list.setCurrentIndex(self.diff_model.index(row))
+
+    def update_diff_view(self):
+        self.diff_model.set_view(self.diff_sort_combo.currentData(), self.diff_min_area_spin.value())
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,9 +1,128 @@
 import sys 
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PySide6.QtWidgets import ( QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog, QHBoxLayout, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QSlider, QCheckBox ) 
 from PySide6.QtSvg import QSvgRenderer 
-from PySide6.QtGui import QImage, QPainter, QPixmap, QColor, QWheelEvent 
+from PySide6.QtGui import QImage, QPainter, QPixmap, QWheelEvent 
 from PySide6.QtCore import QRectF, Qt
 
+from svg_render import qimage_view
+from diff_engine import diff_mask, highlight_composite
+
+TILE_CACHE_SIZE = 64  # 保持するタイル（左右＋差分）の組数。400×400 なら 1 組あたり約 2MB
+
+
+# -------------------- タイルの描画・比較 --------------------
+def render_tile(renderer, x, y, w, h, scale=1.0):
+    """文書座標 (x, y, w, h) の範囲を scale 倍の解像度で描画する"""
+    size = renderer.defaultSize()
+    image = QImage(max(1, round(w * scale)), max(1, round(h * scale)), QImage.Format_ARGB32)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.scale(scale, scale)
+    painter.translate(-x, -y)
+    renderer.render(painter, QRectF(0, 0, size.width(), size.height()))
+    painter.end()
+    return image
+
+
+def compare_images(img1, img2):
+    view1 = qimage_view(img1)
+    mask = diff_mask(view1, qimage_view(img2))
+    # ARGB32 (0xAARRGGBB): 差分は赤、それ以外は img1 の色を不透明で
+    result = QImage(img1.size(), QImage.Format_ARGB32)
+    highlight_composite(view1 | 0xFF000000, mask, 0xFFFF0000, out=qimage_view(result, writable=True))
+    return result
+
+
+def render_tile_pair(renderer1, renderer2, key):
+    """key = (x, y, w, h, scale) のタイルを左右描画して (img1, img2, 差分) を返す"""
+    img1 = render_tile(renderer1, *key)
+    img2 = render_tile(renderer2, *key)
+    return img1, img2, compare_images(img1, img2)
+
+
+class TileCache:
+    """(x, y, w, h, scale) → (img1, img2, 差分) の LRU（先読みスレッドからも書き込む）
+
+    SVG を読み直すと clear() で世代が進み、それより前に始めた先読みの結果は捨てる。
+    """
+
+    def __init__(self, max_items=TILE_CACHE_SIZE):
+        self.max_items = max_items
+        self.generation = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.generation += 1
+
+
+class TilePrefetcher:
+    """隣のタイルを裏のスレッドで描画・比較してキャッシュに入れる
+
+    QSvgRenderer はスレッドをまたいで共有できないので、先読みスレッドは自分用に読み込んだものを使う。
+    同じパスでも SVG を読み直せば（キャッシュの世代が進めば）読み込み直す。
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = set()
+        self._local = threading.local()
+
+    def _renderers(self, paths, generation):
+        if getattr(self._local, "key", None) != (generation, paths):
+            self._local.key = (generation, paths)
+            self._local.renderers = [QSvgRenderer(path) for path in paths]
+        return self._local.renderers
+
+    def _run(self, paths, key, generation):
+        try:
+            if generation != self.cache.generation or key in self.cache:
+                return
+            self.cache.put(key, render_tile_pair(*self._renderers(paths, generation), key), generation)
+        except Exception as e:
+            print(f"[ERROR] タイルの先読みに失敗しました {key}: {e}")
+        finally:
+            self.pending.discard((generation, key))
+
+    def request(self, paths, keys):
+        generation = self.cache.generation
+        for key in keys:
+            if (generation, key) in self.pending or key in self.cache:
+                continue
+            self.pending.add((generation, key))
+            self.executor.submit(self._run, paths, key, generation)
+
+    def shutdown(self):
+        # 待っている先読みは取り消し、描画中のものだけ終わるのを待つ（終了後にスレッドが Qt を触らないように）
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
 class SvgTileComparer(QWidget): 
     def __init__(self): 
         super().__init__()
@@ -18,6 +137,10 @@ class SvgTileComparer(QWidget):
         self.scale = 1.0
         self.opacity = 0.5
         self.show_diff = True
+        self.renderer1 = None
+        self.renderer2 = None
+        self.tile_cache = TileCache()
+        self.prefetcher = TilePrefetcher(self.tile_cache)
 
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
@@ -54,6 +177,15 @@ class SvgTileComparer(QWidget):
         self.view.setScene(self.scene)
         self.layout.addWidget(self.view)
 
+        # 表示アイテムは作り直さず、タイルの切り替えでは画像だけ差し替える
+        self.pixmap1 = QGraphicsPixmapItem()
+        self.pixmap2 = QGraphicsPixmapItem()
+        self.pixmap2.setOpacity(self.opacity)
+        self.diff_item = QGraphicsPixmapItem()
+        self.diff_item.setVisible(self.show_diff)
+        for item in (self.pixmap1, self.pixmap2, self.diff_item):
+            self.scene.addItem(item)
+
         self.load_btn1.clicked.connect(self.load_svg1)
         self.load_btn2.clicked.connect(self.load_svg2)
         self.compare_btn.clicked.connect(self.compare_svgs)
@@ -68,54 +200,50 @@ class SvgTileComparer(QWidget):
         file, _ = QFileDialog.getOpenFileName(self, "SVG1を選択", "", "SVG Files (*.svg)")
         if file:
             self.svg1_path = file
+            self.renderer1 = QSvgRenderer(file)
+            self.tile_cache.clear()
 
     def load_svg2(self):
         file, _ = QFileDialog.getOpenFileName(self, "SVG2を選択", "", "SVG Files (*.svg)")
         if file:
             self.svg2_path = file
+            self.renderer2 = QSvgRenderer(file)
+            self.tile_cache.clear()
 
-    def render_tile(self, path, x, y, w, h):
-        renderer = QSvgRenderer(path)
-        image = QImage(w, h, QImage.Format_ARGB32)
-        image.fill(Qt.transparent)
-        painter = QPainter(image)
-        renderer.render(painter, QRectF(x, y, w, h))
-        painter.end()
-        return image
-
-    def compare_images(self, img1, img2):
-        result = QImage(img1.size(), QImage.Format_ARGB32)
-        for x in range(img1.width()):
-            for y in range(img1.height()):
-                c1 = img1.pixel(x, y)
-                c2 = img2.pixel(x, y)
-                if c1 != c2:
-                    result.setPixel(x, y, QColor("red").rgb())
-                else:
-                    result.setPixel(x, y, QColor(c1).rgb())
-        return result
+    def tile_key(self, x=None, y=None):
+        return (self.tile_x if x is None else x, self.tile_y if y is None else y,
+                self.tile_width, self.tile_height, self.scale)
 
     def compare_svgs(self):
         if not self.svg1_path or not self.svg2_path:
             return
-        img1 = self.render_tile(self.svg1_path, self.tile_x, self.tile_y, self.tile_width, self.tile_height)
-        img2 = self.render_tile(self.svg2_path, self.tile_x, self.tile_y, self.tile_width, self.tile_height)
-
-        self.scene.clear()
-        pixmap1 = QGraphicsPixmapItem(QPixmap.fromImage(img1))
-        pixmap2 = QGraphicsPixmapItem(QPixmap.fromImage(img2))
-        pixmap2.setOpacity(self.opacity)
-
-        self.scene.addItem(pixmap1)
-        self.scene.addItem(pixmap2)
+        key = self.tile_key()
+        tiles = self.tile_cache.get(key)
+        if tiles is None:
+            tiles = render_tile_pair(self.renderer1, self.renderer2, key)
+            self.tile_cache.put(key, tiles)
+        img1, img2, diff = tiles
 
-        if self.show_diff:
-            diff = self.compare_images(img1, img2)
-            diff_item = QGraphicsPixmapItem(QPixmap.fromImage(diff))
-            self.scene.addItem(diff_item)
+        # 画像は scale 倍の解像度なので、アイテムを 1/scale にして文書座標に合わせる
+        for item, image in ((self.pixmap1, img1), (self.pixmap2, img2), (self.diff_item, diff)):
+            item.setPixmap(QPixmap.fromImage(image))
+            item.setScale(1 / self.scale)
+        self.scene.setSceneRect(0, 0, self.tile_width, self.tile_height)
 
         self.view.resetTransform()
         self.view.scale(self.scale, self.scale)
+        self.prefetch_neighbors()
+
+    def prefetch_neighbors(self):
+        """上下左右の隣のタイル（文書の範囲内のもの）を先読みする"""
+        size = self.renderer1.defaultSize().expandedTo(self.renderer2.defaultSize())
+        keys = []
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            x = self.tile_x + dx * self.tile_width
+            y = self.tile_y + dy * self.tile_height
+            if 0 <= x < size.width() and 0 <= y < size.height():
+                keys.append(self.tile_key(x, y))
+        self.prefetcher.request((self.svg1_path, self.svg2_path), keys)
 
     def next_tile_x(self):
         self.tile_x += self.tile_width
@@ -135,11 +263,15 @@ class SvgTileComparer(QWidget):
 
     def change_opacity(self, value):
         self.opacity = value / 100.0
-        self.compare_svgs()
+        self.pixmap2.setOpacity(self.opacity)
 
     def toggle_diff(self, state):
         self.show_diff = bool(state)
-        self.compare_svgs()
+        self.diff_item.setVisible(self.show_diff)
+
+    def closeEvent(self, event):
+        self.prefetcher.shutdown()
+        super().closeEvent(event)
 
 class GraphicsViewWithZoom(QGraphicsView): 
     def wheelEvent(self, event: QWheelEvent): 
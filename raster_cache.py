@@ -0,0 +1,120 @@
+"""描画済みラスタのディスクキャッシュ（内容ハッシュでアドレス指定）
+
+キー: SVG の内容ハッシュ + 描画サイズ + 背景 + レンダラのバージョン。
+値は .npy で保存し、読み込み時は np.load(mmap_mode="r") でそのまま compute_diff に渡せる配列として開く。
+容量が上限を超えたら最終利用時刻（mtime）の古いものから削除する（LRU）。
+"""
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+from PySide6 import __version__ as PYSIDE_VERSION
+from PySide6.QtCore import qVersion
+
+from diff_engine import BLOCK_SIZE, block_hashes
+
+# 描画方法・配列形式を変えたら上げる（古いキャッシュを無効化）
+CACHE_FORMAT_VERSION = 2  # 2: ARGB32_Premultiplied
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+
+
+def default_cache_dir():
+    base = os.environ.get("SVGDIFF_CACHE_DIR")
+    if base:
+        return base
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "svgdiff", "rasters")
+
+
+def content_hash(data: bytes):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return content_hash(f.read())
+
+
+class RasterCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def make_key(self, svg_hash, width, height, background="transparent"):
+        renderer_version = f"qt{qVersion()}-pyside{PYSIDE_VERSION}-v{CACHE_FORMAT_VERSION}"
+        key = f"{svg_hash}:{width}x{height}:{background}:{renderer_version}"
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    def get(self, key):
+        """キャッシュがあれば読み取り専用の memmap 配列を返す（無ければ None）"""
+        path = self._path(key)
+        try:
+            arr = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # LRU 用に最終利用時刻を更新
+        except OSError:
+            pass
+        return arr
+
+    def put(self, key, arr):
+        """配列を保存し、保存先を memmap で開き直した配列を返す（すぐ追い出された場合は arr のまま）"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書きかけのファイルを読まれないよう一時ファイル経由で置き換える
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, arr)  # 行パディング付きのビューもコピーせず少しずつ書き出される
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+        cached = self.get(key)
+        return arr if cached is None else cached
+
+    def block_hashes(self, key, arr, block=BLOCK_SIZE):
+        """ラスタ key のブロックハッシュ（キャッシュに無ければ計算して保存する）"""
+        hash_key = f"{key}-b{block}"
+        hashes = self.get(hash_key)
+        if hashes is None:
+            hashes = self.put(hash_key, block_hashes(arr, block))
+        return hashes
+
+    def entries(self):
+        """(mtime, size, path) のリスト"""
+        out = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".npy"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def evict(self):
+        """合計サイズが上限を超えていれば古いものから削除する"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
@@ -0,0 +1,92 @@
+"""比較結果のバイナリ形式（result.svgdiff）
+
+    magic "SVGDIFF\\0" | version (uint16) | ヘッダ長 (uint32) | ヘッダ JSON | 各セクションのバイト列
+
+ヘッダには文書サイズ・左右 SVG の内容ハッシュ・セクション表（名前, 位置, 長さ）を持つ。
+セクション:
+    rects        差分矩形 (x, y, w, h) の float32 配列（リトルエンディアン、1件 16 バイト）
+    thumb_left   左 SVG の縮小画像（PNG）
+    thumb_right  右 SVG の縮小画像（PNG）
+    mask         差分画素のラン [y, x0, x1) の int32 配列（sparse_mask.RunMask。あれば）
+矩形は np.frombuffer でそのまま読めるので、件数が多くても JSON のような変換コストがかからない。
+縮小画像があるので、SVG を描画し直す前に結果を表示できる。
+"""
+import json
+import struct
+import numpy as np
+
+from sparse_mask import RunMask
+
+BUNDLE_NAME = "result.svgdiff"
+MAGIC = b"SVGDIFF\x00"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sHI")
+RECT_DTYPE = np.dtype("<f4")
+
+
+class ResultBundle:
+    def __init__(self, width, height, rects, left_hash=None, right_hash=None, thumbnails=None, mask=None):
+        self.width = width
+        self.height = height
+        self.rects = np.asarray(rects, dtype=RECT_DTYPE).reshape(-1, 4)
+        self.left_hash = left_hash
+        self.right_hash = right_hash
+        self.thumbnails = thumbnails or {}  # "left" / "right" -> PNG バイト列
+        self.mask = mask  # RunMask または None
+
+
+def write_bundle(path, bundle):
+    sections = [("rects", np.ascontiguousarray(bundle.rects, dtype=RECT_DTYPE).tobytes())]
+    for side in ("left", "right"):
+        if bundle.thumbnails.get(side):
+            sections.append((f"thumb_{side}", bytes(bundle.thumbnails[side])))
+    if bundle.mask is not None:
+        sections.append(("mask", bundle.mask.to_bytes()))
+
+    table = []
+    offset = 0
+    for name, data in sections:
+        table.append([name, offset, len(data)])
+        offset += len(data)
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "width": bundle.width,
+        "height": bundle.height,
+        "left_hash": bundle.left_hash,
+        "right_hash": bundle.right_hash,
+        "rect_count": len(bundle.rects),
+        "sections": table,
+    }, ensure_ascii=False).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for _, data in sections:
+            f.write(data)
+
+
+def read_bundle(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        magic, version, header_len = _PREAMBLE.unpack_from(data, 0)
+    except struct.error:
+        raise ValueError(f"比較結果ファイルが壊れています: {path}") from None
+    if magic != MAGIC:
+        raise ValueError(f"比較結果ファイルではありません: {path}")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"未対応のバージョンです: {version}")
+
+    start = _PREAMBLE.size
+    header = json.loads(data[start:start + header_len].decode("utf-8"))
+    base = start + header_len
+    # 途中で切れたファイルは、欠けたセクションを黙って空として読まないようにする
+    if any(base + offset + length > len(data) for _, offset, length in header["sections"]):
+        raise ValueError(f"比較結果ファイルが途中で切れています: {path}")
+    sections = {name: data[base + offset:base + offset + length] for name, offset, length in header["sections"]}
+
+    rects = np.frombuffer(sections.get("rects", b""), dtype=RECT_DTYPE).reshape(-1, 4)
+    thumbnails = {side: sections[f"thumb_{side}"] for side in ("left", "right") if f"thumb_{side}" in sections}
+    mask = RunMask.from_bytes(sections["mask"], header["width"], header["height"]) if "mask" in sections else None
+    return ResultBundle(header["width"], header["height"], rects,
+                        header.get("left_hash"), header.get("right_hash"), thumbnails, mask)
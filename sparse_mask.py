@@ -0,0 +1,307 @@
+"""差分マスクの疎な表現（行ごとのランレングス）と PNG 書き出し（GUI 非依存）
+
+差分画素は「行 y の x0 <= x < x1」という連続区間（ラン）の並びで持つ。
+全画素の bool 配列に比べて、差分が少なければ数百〜数千分の 1 の大きさで済み、
+和・積・差は区間の端点の並べ替えと累積和だけで求まる（画素ごとの処理はしない）。
+    mask = RunMask.from_dense(dense)       # 差分計算の候補範囲ごとに作って合わせる
+    mask.union(other) / mask.intersection(other) / mask.difference(other)
+    mask.region_counts(rects)              # 矩形ごとの差分画素数
+    write_mask_png(mask, "heatmap.png", scale=0.1)
+PNG は出力の数十行ずつを計算して書き出すので、全体の RGBA 画像を一度に作らない。
+"""
+import struct
+import zlib
+
+import numpy as np
+import cv2
+
+RUN_DTYPE = np.dtype("<i4")
+OVERLAY_COLOR = (255, 0, 0, 120)  # RGBA（diff_engine.HIGHLIGHT_COLOR と同じ）
+PNG_BAND_ROWS = 64  # PNG 書き出しで一度に計算する出力の行数
+_DENSE_BAND_ROWS = 256  # bool マスクを変換するときに一度に処理する行数
+
+
+# -------------------- 区間の演算 --------------------
+def _linear(runs, width):
+    """(y, x0, x1) を 1 本の数直線上の区間にする（行の間に 1 の隙間を空け、行をまたいで接しないようにする）"""
+    base = runs[:, 0].astype(np.int64) * (width + 1)
+    return base + runs[:, 1], base + runs[:, 2]
+
+
+def _from_linear(p0, p1, width):
+    stride = width + 1
+    y = p0 // stride
+    runs = np.empty((len(p0), 3), RUN_DTYPE)
+    runs[:, 0] = y
+    runs[:, 1] = p0 - y * stride
+    runs[:, 2] = p1 - y * stride
+    return runs
+
+
+def _combine(runs_a, runs_b, width, op):
+    """2 つのラン集合の各区間について op(A に含まれる, B に含まれる) が真の部分をランにする
+
+    入力は重なっていても並んでいなくてもよい。結果は並べ替え済みで、重なり・接触が無い。
+    """
+    pa0, pa1 = _linear(runs_a, width)
+    pb0, pb1 = _linear(runs_b, width)
+    pos = np.concatenate([pa0, pa1, pb0, pb1])
+    na, nb = len(pa0), len(pb0)
+    da = np.concatenate([np.ones(na, np.int32), np.full(na, -1, np.int32), np.zeros(2 * nb, np.int32)])
+    db = np.concatenate([np.zeros(2 * na, np.int32), np.ones(nb, np.int32), np.full(nb, -1, np.int32)])
+    order = np.argsort(pos, kind="stable")
+    pos = pos[order]
+    inside = op(np.cumsum(da[order]) > 0, np.cumsum(db[order]) > 0)[:-1]
+    start, end = pos[:-1][inside], pos[1:][inside]
+    keep = end > start
+    start, end = start[keep], end[keep]
+    if len(start) == 0:
+        return np.zeros((0, 3), RUN_DTYPE)
+    # 接している区間をつなぐ
+    head = np.ones(len(start), bool)
+    head[1:] = start[1:] != end[:-1]
+    tail = np.ones(len(start), bool)
+    tail[:-1] = head[1:]
+    return _from_linear(start[head], end[tail], width)
+
+
+class RunMask:
+    """行ごとのランレングスで表した差分マスク
+
+    runs は (N, 3) の int32 配列 [y, x0, x1)。y・x0 の順に並び、同じ行のランは重ならず接しない。
+    """
+
+    def __init__(self, width, height, runs=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.runs = (np.zeros((0, 3), RUN_DTYPE) if runs is None
+                     else np.ascontiguousarray(runs, RUN_DTYPE).reshape(-1, 3))
+
+    # -------------------- 作成 --------------------
+    @classmethod
+    def from_dense(cls, mask, x=0, y=0, width=None, height=None):
+        """bool の (H, W) マスクから作る（x, y はマスクの左上の位置、width / height は全体の大きさ）"""
+        h, w = mask.shape
+        parts = []
+        for top in range(0, h, _DENSE_BAND_ROWS):
+            band = mask[top:top + _DENSE_BAND_ROWS]
+            padded = np.zeros((band.shape[0], w + 2), np.int8)
+            padded[:, 1:-1] = band
+            edges = np.diff(padded, axis=1)
+            rows, x0 = np.nonzero(edges == 1)
+            _, x1 = np.nonzero(edges == -1)  # 行ごとに始まりと終わりが同じ数だけ同じ順に並ぶ
+            parts.append(np.stack([rows + top + y, x0 + x, x1 + x], axis=1))
+        runs = np.concatenate(parts) if parts else None
+        return cls(x + w if width is None else width, y + h if height is None else height, runs)
+
+    @classmethod
+    def from_rects(cls, rects, width, height):
+        """矩形 (x, y, w, h) の和集合（画像の範囲に切り詰める）"""
+        runs = []
+        for rx, ry, rw, rh in rects:
+            x1, y1 = max(0, int(rx)), max(0, int(ry))
+            x2, y2 = min(width, int(rx + rw)), min(height, int(ry + rh))
+            if x2 > x1 and y2 > y1:
+                ys = np.arange(y1, y2)
+                runs.append(np.stack([ys, np.full_like(ys, x1), np.full_like(ys, x2)], axis=1))
+        mask = cls(width, height, np.concatenate(runs) if runs else None)
+        return mask.normalized()
+
+    @classmethod
+    def concatenate(cls, masks, width, height):
+        """互いに重ならない部分マスク（候補範囲ごとなど）をまとめる"""
+        runs = [m.runs for m in masks if len(m.runs)]
+        if not runs:
+            return cls(width, height)
+        return cls(width, height, np.concatenate(runs)).normalized()
+
+    def normalized(self):
+        """並べ替えて、重なる・接するランをつないだもの"""
+        return RunMask(self.width, self.height,
+                       _combine(self.runs, np.zeros((0, 3), RUN_DTYPE), self.width, np.logical_or))
+
+    def offset(self, dx, dy, width=None, height=None):
+        """(dx, dy) だけずらしたマスク（タイル・部分領域の結果を全体の座標に戻す）"""
+        runs = self.runs.copy()
+        runs[:, 0] += dy
+        runs[:, 1:] += dx
+        return RunMask(self.width + dx if width is None else width, self.height + dy if height is None else height,
+                       runs)
+
+    # -------------------- 集合演算 --------------------
+    def _check(self, other):
+        if (self.width, self.height) != (other.width, other.height):
+            raise ValueError(f"マスクの大きさが違います: {self.width}x{self.height} / {other.width}x{other.height}")
+
+    def union(self, other):
+        self._check(other)
+        return RunMask(self.width, self.height, _combine(self.runs, other.runs, self.width, np.logical_or))
+
+    def intersection(self, other):
+        self._check(other)
+        return RunMask(self.width, self.height, _combine(self.runs, other.runs, self.width, np.logical_and))
+
+    def difference(self, other):
+        self._check(other)
+        return RunMask(self.width, self.height,
+                       _combine(self.runs, other.runs, self.width, lambda a, b: a & ~b))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    # -------------------- 集計 --------------------
+    def __len__(self):
+        """ランの数"""
+        return len(self.runs)
+
+    def __eq__(self, other):
+        return (isinstance(other, RunMask) and (self.width, self.height) == (other.width, other.height)
+                and np.array_equal(self.runs, other.runs))
+
+    def count(self):
+        """差分画素数"""
+        return int((self.runs[:, 2].astype(np.int64) - self.runs[:, 1]).sum())
+
+    def region_counts(self, rects):
+        """矩形 (x, y, w, h) ごとの差分画素数（int64 配列）
+
+        REGION_DTYPE の構造化配列を渡した場合は、w / h を右端 − 左端として 1 画素広げて数える。
+        """
+        rects = np.asarray(rects)
+        if rects.dtype.names:
+            rects = np.stack([rects["x"], rects["y"], rects["w"] + 1, rects["h"] + 1], axis=1)
+        rects = rects.reshape(-1, 4)
+        ys = self.runs[:, 0]
+        counts = np.zeros(len(rects), np.int64)
+        for i, (rx, ry, rw, rh) in enumerate(rects.tolist()):
+            lo, hi = np.searchsorted(ys, [int(ry), int(ry + rh)])
+            seg = self.runs[lo:hi]
+            counts[i] = np.clip(np.minimum(seg[:, 2], int(rx + rw)) - np.maximum(seg[:, 1], int(rx)), 0, None).sum()
+        return counts
+
+    def bbox(self):
+        """差分画素の外接矩形 (x, y, w, h)。差分が無ければ None"""
+        if not len(self.runs):
+            return None
+        x1, y1 = int(self.runs[:, 1].min()), int(self.runs[0, 0])
+        return x1, y1, int(self.runs[:, 2].max()) - x1, int(self.runs[-1, 0]) + 1 - y1
+
+    def to_dense(self, y1=0, y2=None):
+        """行 y1〜y2 の bool 配列（確認・小さい範囲の表示用）"""
+        y2 = self.height if y2 is None else y2
+        out = np.zeros((y2 - y1, self.width), bool)
+        lo, hi = np.searchsorted(self.runs[:, 0], [y1, y2])
+        for y, x0, x1 in self.runs[lo:hi].tolist():
+            out[y - y1, x0:x1] = True
+        return out
+
+    # -------------------- 保存 --------------------
+    def to_bytes(self):
+        return self.runs.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, width, height):
+        return cls(width, height, np.frombuffer(data, RUN_DTYPE).reshape(-1, 3))
+
+
+# -------------------- 縮小・拡大した被覆率 --------------------
+def _coverage_band(mask, oy1, oy2, out_w, out_h):
+    """出力の行 oy1〜oy2 について、各出力画素に占める差分画素の割合（0〜1 の float 配列）
+
+    出力画素が覆う元画像の範囲の面積平均（縮小・拡大とも、倍率が整数でなくてもよい）。
+    """
+    sx, sy = mask.width / out_w, mask.height / out_h
+    ys1 = int(np.floor(oy1 * sy))
+    ys2 = min(mask.height, int(np.ceil(oy2 * sy)))
+
+    # 横方向: 行ごとの「x より左にある差分画素数」G を出力画素の境界で引き、差を取る
+    lo, hi = np.searchsorted(mask.runs[:, 0], [ys1, ys2])
+    runs = mask.runs[lo:hi]
+    stride = mask.width + 1
+    p0, p1 = _linear(runs, mask.width)
+    lengths = p1 - p0
+    before = np.cumsum(lengths) - lengths
+    edges = np.arange(out_w + 1) * sx
+    q = (np.arange(ys1, ys2, dtype=np.int64)[:, None] * stride + edges[None, :]).ravel()
+    idx = np.searchsorted(p0, q, side="right") - 1
+    if len(p0):
+        safe = np.maximum(idx, 0)
+        g = np.where(idx >= 0, before[safe] + np.clip(q - p0[safe], 0, lengths[safe]), 0.0)
+    else:
+        g = np.zeros(len(q))
+    g = g.reshape(ys2 - ys1, out_w + 1)
+    rows = np.diff(g, axis=1) / sx
+
+    # 縦方向: 出力の行が覆う元の行の割合で重み付けして合計する
+    top = np.arange(oy1, oy2)[:, None] * sy
+    src = np.arange(ys1, ys2)[None, :]
+    weights = np.clip(np.minimum(src + 1, top + sy) - np.maximum(src, top), 0, None) / sy
+    return np.clip(weights @ rows, 0.0, 1.0)
+
+
+def _colorize(coverage, mode, color):
+    """被覆率を RGBA（uint8 の (H, W, 4)）にする"""
+    out = np.zeros(coverage.shape + (4,), np.uint8)
+    hit = coverage > 0
+    if mode == "overlay":
+        out[..., :3] = np.array(color[:3], np.uint8)
+        out[..., 3] = np.where(hit, np.maximum(1, np.rint(coverage * color[3])), 0)
+    else:
+        # 少しでも差分がある画素は見えるよう 1〜255 に割り当てる
+        level = np.where(hit, np.maximum(1, np.rint(coverage * 255)), 0).astype(np.uint8)
+        bgr = cv2.applyColorMap(level, cv2.COLORMAP_JET)
+        out[..., 0], out[..., 1], out[..., 2] = bgr[..., 2], bgr[..., 1], bgr[..., 0]
+        out[..., 3] = np.where(hit, 255, 0)
+    return out
+
+
+class _PngWriter:
+    """RGBA 8bit の PNG を行の帯ごとに圧縮しながら書き出す"""
+
+    def __init__(self, f, width, height):
+        self.f = f
+        self.width = width
+        self.compressor = zlib.compressobj(6)
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack(">I", len(data)) + kind + data)
+        self.f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rgba):
+        raw = np.zeros((rgba.shape[0], self.width * 4 + 1), np.uint8)  # 各行の先頭はフィルタ種別 0
+        raw[:, 1:] = rgba.reshape(rgba.shape[0], -1)
+        data = self.compressor.compress(raw.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+def write_mask_png(mask, file, scale=1.0, mode="heatmap", color=OVERLAY_COLOR, progress=None):
+    """マスクを scale 倍の PNG に書き出す（file はパスかバイナリのファイルオブジェクト）
+
+    mode="heatmap"  出力画素ごとの差分の割合を色で表す（差分の無い画素は透明）
+    mode="overlay"  color の半透明の重ね画像（割合に応じて不透明度を下げる）
+    progress(done, total) は出力の帯ごとに呼ばれる（例外を投げれば中断できる）
+    """
+    if mode not in ("heatmap", "overlay"):
+        raise ValueError(f"未対応の mode です: {mode}")
+    out_w = max(1, int(round(mask.width * scale)))
+    out_h = max(1, int(round(mask.height * scale)))
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "wb") as f:
+            return write_mask_png(mask, f, scale, mode, color, progress)
+
+    writer = _PngWriter(file, out_w, out_h)
+    for oy in range(0, out_h, PNG_BAND_ROWS):
+        band = _coverage_band(mask, oy, min(out_h, oy + PNG_BAND_ROWS), out_w, out_h)
+        writer.write_rows(_colorize(band, mode, color))
+        if progress:
+            progress(min(out_h, oy + PNG_BAND_ROWS), out_h)
+    writer.close()
+    return out_w, out_h
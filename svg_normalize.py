@@ -0,0 +1,307 @@
+"""SVG の前処理（描画結果を変えずに QSvgRenderer が読む文書を小さくする。GUI 非依存）
+
+CAD などの書き出しに多い、描画に関係しない内容を取り除く。
+- コメント・処理命令・metadata / title / desc・エディタ独自の名前空間（inkscape / sodipodi / rdf など）の要素と属性
+- どこからも参照されない defs の中身・symbol
+- 属性を持たない <g>、transform だけの <g>（transform は子要素の transform の先頭に付け足す）、恒等変換の transform
+- 字下げなどの空白だけのテキスト、パスデータ（d / points）の余分な区切り文字
+数値は書き換えないので、元の文書と画素単位で同じ描画になる（benchmarks/check_normalize.py で確認）。
+外部ファイルを参照する文書（相対パスの image など）はバイト列から読むと解決できないので、そのまま返す。
+
+結果は元の内容ハッシュで NormalizedCache に保持し、同じ内容の再描画では前処理を省く
+（ディスクの分は合計サイズが上限を超えたら最終利用時刻の古いものから削除する。RasterCache と同じ LRU）。
+前処理そのもの（コーパスで 1 ファイル 120〜266 ミリ秒）は読み込みの短縮（約 8 ミリ秒）より重く、描画時間は変わらないので
+既定では使わない（GUI の「SVG前処理」ボタンで ON にしたときだけ。同じ文書を何度も読み込むときに NormalizedCache が効く）。
+"""
+import os
+import re
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from raster_cache import content_hash, default_cache_dir
+from svg_structure import IDENTITY, IGNORED_TAGS, parse_transform, _TRANSFORM
+
+# 前処理の内容を変えたら上げる（古いキャッシュを無効化）
+NORMALIZE_VERSION = 2  # 2: CSS のある文書では <g> を展開しない
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2  # ディスクに置く前処理済み SVG の合計の上限
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+KEPT_ATTR_NS = {XLINK_NS, XML_NS}
+
+# 空白に意味があるので中身に手を付けない要素
+TEXT_TAGS = {"text", "tspan", "textPath", "tref", "style", "script", "foreignObject"}
+# transform をそのまま付け足せる要素
+TRANSFORMABLE_TAGS = {"g", "a", "rect", "circle", "ellipse", "line", "polyline", "polygon", "path",
+                      "text", "use", "image"}
+# その場では描画されない要素（transform だけの <g> を展開しても影響しない）
+NON_RENDERED_TAGS = {"defs", "style", "linearGradient", "radialGradient", "pattern", "clipPath", "mask",
+                     "marker", "symbol", "filter"}
+
+_URL_REF = re.compile(r"url\(\s*['\"]?#([^'\")\s]+)")
+_PATH_COMMAND = re.compile(r" ?([MmLlHhVvCcSsQqTtAaZz]) ?")
+
+
+def _split(tag):
+    """(名前空間, ローカル名)。コメント等は ("", "")"""
+    if not isinstance(tag, str):
+        return "", ""
+    if tag.startswith("{"):
+        ns, local = tag[1:].split("}", 1)
+        return ns, local
+    return "", tag
+
+
+def _local(tag):
+    return _split(tag)[1]
+
+
+def _href(el):
+    return el.get(f"{{{XLINK_NS}}}href", el.get("href"))
+
+
+# -------------------- 参照の収集 --------------------
+def _references(root):
+    """url(#id) / href="#id" で参照されている id の集合。外部参照があれば None"""
+    refs = set()
+    for el in root.iter():
+        for key, value in el.attrib.items():
+            refs.update(_URL_REF.findall(value))
+            if _local(key) == "href":
+                if value.startswith("#"):
+                    refs.add(value[1:])
+                elif not value.startswith("data:"):
+                    return None
+        if _local(el.tag) == "style" and el.text:
+            refs.update(_URL_REF.findall(el.text))
+    return refs
+
+
+# -------------------- 各処理 --------------------
+def _strip_foreign(el):
+    """エディタ独自の要素・属性と、描画しない説明要素を取り除く"""
+    for child in list(el):
+        ns, tag = _split(child.tag)
+        if not tag or (ns and ns != SVG_NS) or tag in IGNORED_TAGS:
+            el.remove(child)
+        elif tag != "foreignObject":
+            _strip_foreign(child)
+    for key in list(el.attrib):
+        ns, _ = _split(key)
+        if ns and ns not in KEPT_ATTR_NS:
+            del el.attrib[key]
+
+
+def _remove_unused_resources(root, has_css):
+    """参照されない defs の子要素・symbol を取り除く（別の資源から参照されていたものも順に消えるまで繰り返す）"""
+    while True:
+        refs = _references(root)
+        removed = False
+        for parent in list(root.iter()):
+            for child in list(parent):
+                tag = _local(child.tag)
+                in_defs = _local(parent.tag) == "defs"
+                if tag == "style" or not (in_defs or tag == "symbol"):
+                    continue
+                if child.get("id") not in refs and not (has_css and child.get("id")):
+                    parent.remove(child)
+                    removed = True
+        for parent in list(root.iter()):
+            for child in list(parent):
+                if _local(child.tag) == "defs" and len(child) == 0:
+                    parent.remove(child)
+                    removed = True
+        if not removed:
+            return
+
+
+def _is_identity(value):
+    return not _TRANSFORM.sub("", value).strip(" \t\r\n,") and parse_transform(value) == IDENTITY
+
+
+def _flatten_groups(el, refs):
+    """子から順に、展開しても描画が変わらない <g> を親に展開する（CSS のない文書だけ）"""
+    for child in list(el):
+        _flatten_groups(child, refs)
+    if _local(el.tag) == "switch":
+        return  # switch は最初に描画できる子を選ぶので子の並びを変えない
+
+    for child in list(el):
+        if _local(child.tag) != "g":
+            continue
+        attrs = dict(child.attrib)
+        group_id = attrs.pop("id", None)
+        if group_id is not None and group_id in refs:
+            continue
+        transform = attrs.pop("transform", None)
+        if attrs:
+            continue
+        if transform is not None and _is_identity(transform):
+            transform = None
+        grandchildren = list(child)
+        if transform is not None and any(_local(g.tag) not in TRANSFORMABLE_TAGS | NON_RENDERED_TAGS
+                                         for g in grandchildren):
+            continue
+        index = list(el).index(child)
+        el.remove(child)
+        for offset, grandchild in enumerate(grandchildren):
+            if transform is not None and _local(grandchild.tag) in TRANSFORMABLE_TAGS:
+                inner = grandchild.get("transform")
+                grandchild.set("transform", f"{transform} {inner}" if inner else transform)
+            el.insert(index + offset, grandchild)
+
+
+def _serialize(root):
+    """SVG / xlink の名前空間を接頭辞つきの名前で明示して書き出す
+
+    ET.register_namespace はプロセス全体の設定を変えるので使わない（それ以外の名前空間は ET が ns0 などを付ける）。
+    """
+    uses_xlink = False
+    default_ns = _split(root.tag)[0] == SVG_NS
+    for el in root.iter():
+        ns, local = _split(el.tag)
+        if ns == SVG_NS:
+            el.tag = local
+        for key in list(el.attrib):
+            ns, local = _split(key)
+            if ns == XLINK_NS:
+                el.attrib[f"xlink:{local}"] = el.attrib.pop(key)
+                uses_xlink = True
+    if default_ns:
+        root.set("xmlns", SVG_NS)
+    if uses_xlink:
+        root.set("xmlns:xlink", XLINK_NS)
+    return ET.tostring(root, encoding="utf-8")
+
+
+def _compact(el):
+    """空白だけのテキスト・恒等変換・パスデータの余分な区切りを取り除く"""
+    tag = _local(el.tag)
+    if tag in TEXT_TAGS:
+        return
+    if el.text is not None and not el.text.strip():
+        el.text = None
+    for child in el:
+        if child.tail is not None and not child.tail.strip():
+            child.tail = None
+        _compact(child)
+    transform = el.get("transform")
+    if transform is not None and _is_identity(transform):
+        del el.attrib["transform"]
+    if "d" in el.attrib and tag == "path":
+        d = re.sub(r"[\s,]+", " ", el.get("d")).strip()
+        el.set("d", _PATH_COMMAND.sub(r"\1", d))
+    if "points" in el.attrib:
+        el.set("points", re.sub(r"[\s,]+", " ", el.get("points")).strip())
+
+
+# -------------------- 公開 API --------------------
+def normalize_svg(data: bytes):
+    """SVG のバイト列を前処理したバイト列を返す（解析できない・外部参照がある文書はそのまま返す）"""
+    if b"<?xml-stylesheet" in data:
+        return data  # 外部のスタイルシート（処理命令は解析で落ちる）
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError:
+        return data
+    refs = _references(root)
+    if refs is None:
+        return data
+    # CSS のセレクタは id で要素を指せるので、<style> がある文書では id を持つ要素を消さない
+    has_css = any(_local(el.tag) == "style" or el.get("class") is not None for el in root.iter())
+
+    _strip_foreign(root)
+    _remove_unused_resources(root, has_css)
+    if not has_css:
+        # 子孫・子セレクタ（g > path など）は <g> の階層に依存するので、CSS があれば展開しない
+        _flatten_groups(root, _references(root))
+    _compact(root)
+    return _serialize(root)
+
+
+class NormalizedCache:
+    """元の内容ハッシュ → 前処理済みのバイト列（メモリ上の LRU と、指定があればディスクの 2 段）
+
+    複数の読み込みスレッドから同時に使える。
+    """
+
+    def __init__(self, directory=None, max_items=16, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def default(cls):
+        return cls(os.path.join(default_cache_dir(), "normalized"))
+
+    def _path(self, key):
+        name = hashlib.blake2b(f"{key}:v{NORMALIZE_VERSION}".encode("utf-8"), digest_size=20).hexdigest()
+        return os.path.join(self.directory, name + ".svg")
+
+    def normalize(self, data: bytes):
+        key = content_hash(data)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        normalized = None
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    normalized = f.read()
+                os.utime(self._path(key))  # LRU 用に最終利用時刻を更新
+            except OSError:
+                pass
+        if normalized is None:
+            normalized = normalize_svg(data)
+            if self.directory:
+                tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    with open(tmp, "wb") as f:
+                        f.write(normalized)
+                    os.replace(tmp, self._path(key))
+                except OSError as e:
+                    print(f"[ERROR] 前処理済み SVG を保存できません: {e}")
+                self.evict()
+
+        with self._lock:
+            self._items[key] = normalized
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return normalized
+
+    def entries(self):
+        """ディスク上の (mtime, size, path) のリスト"""
+        out = []
+        if not self.directory:
+            return out
+        for name in os.listdir(self.directory):
+            if name.endswith(".svg"):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def evict(self):
+        """ディスク上の合計サイズが上限を超えていれば古いものから削除する"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,206 @@
+"""SVG → ラスタ変換（GUI 非依存）"""
+import os
+import numpy as np
+
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtGui import QGuiApplication, QPainter, QImage
+from PySide6.QtCore import Qt, QCoreApplication, QRect, QRectF, QByteArray, QBuffer, QIODevice
+
+import tracing
+
+
+def ensure_offscreen_app():
+    """QApplication が無い環境（CLI / ワーカープロセス）用に offscreen の QGuiApplication を用意する"""
+    app = QCoreApplication.instance()
+    if app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = QGuiApplication([])
+    return app
+
+
+# -------------------- SVG → QImage --------------------
+def svg_to_qimage(renderer):
+    size = renderer.defaultSize()
+    img = QImage(size, QImage.Format_ARGB32_Premultiplied)
+    img.fill(Qt.transparent)
+    p = QPainter(img)
+    renderer.render(p)
+    p.end()
+    return img
+
+
+# -------------------- 安全に QImage → NumPy --------------------
+def qimage_to_numpy_safe(img: QImage):
+    """
+    QImage → NumPy 配列 高速版（ゼロコピー + パディング対応）
+    """
+    # 形式をRGBAに統一
+    if img.format() != QImage.Format_RGBA8888:
+        img = img.convertToFormat(QImage.Format_RGBA8888)
+
+    w, h = img.width(), img.height()
+    ptr = img.bits()
+
+    # memoryview を使って NumPy 配列を作成
+    byte_count = img.bytesPerLine() * img.height()
+    arr = np.frombuffer(ptr, dtype=np.uint8, count=byte_count)
+    arr = arr.reshape((h, img.bytesPerLine() // 4, 4))
+
+    # 不要な列をカット（bytesPerLineで余った分を除去）
+    arr = arr[:, :w, :]
+    return np.array(arr)  # copyが必要な場合だけここで
+
+
+# -------------------- タイル描画 --------------------
+def render_tile_qimage(renderer, x, y, w, h):
+    """文書座標 (x, y, w, h) の範囲だけを w×h の QImage に描画する"""
+    size = renderer.defaultSize()
+    img = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+    img.fill(Qt.transparent)
+    p = QPainter(img)
+    p.translate(-x, -y)
+    renderer.render(p, QRectF(0, 0, size.width(), size.height()))
+    p.end()
+    return img
+
+
+def render_thumbnail(renderer, max_side=1024):
+    """長辺が max_side 以下になるよう縮小して描画する（拡大はしない）"""
+    size = renderer.defaultSize()
+    scale = min(1.0, max_side / max(size.width(), size.height(), 1))
+    w, h = max(1, round(size.width() * scale)), max(1, round(size.height() * scale))
+    img = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+    img.fill(Qt.transparent)
+    p = QPainter(img)
+    renderer.render(p, QRectF(0, 0, w, h))
+    p.end()
+    return img
+
+
+def qimage_to_png(img: QImage):
+    data = QByteArray()
+    buf = QBuffer(data)
+    buf.open(QIODevice.WriteOnly)
+    img.save(buf, "PNG")
+    buf.close()
+    return bytes(data.data())
+
+
+def render_tile_array(renderer, x, y, w, h):
+    return RasterBuffer.from_tile(renderer, x, y, w, h).array
+
+
+def qimage_view(img: QImage, writable=False):
+    """32bit 形式の QImage の画素を (h, w) の uint32 配列としてコピーせずに参照する"""
+    if img.depth() != 32:
+        img = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    w, h, stride = img.width(), img.height(), img.bytesPerLine() // 4
+    buf = img.bits() if writable else img.constBits()
+    return np.frombuffer(buf, np.uint32, count=stride * h).reshape(h, stride)[:, :w]
+
+
+def numpy_to_qimage(arr):
+    """RGBA 配列をコピーせずに QImage で包む（arr は QImage を使い終わるまで保持すること）"""
+    h, w, _ = arr.shape
+    return QImage(arr.data, w, h, arr.strides[0], QImage.Format_RGBA8888)
+
+
+# -------------------- 描画先バッファ --------------------
+# QPainter のネイティブ形式（描画時の変換なし）。配列は 1 画素 = uint32 0xAARRGGBB（メモリ上は B, G, R, A）、
+# 色は α 乗算済み。差分は uint32 の一致比較だけなのでチャンネル順は問わない
+RASTER_FORMAT = QImage.Format_ARGB32_Premultiplied
+ALIGNMENT = 64                          # 行の先頭をキャッシュライン境界に揃える
+
+
+class RasterBuffer:
+    """1 つの NumPy バッファを QImage（描画先）と配列ビュー（差分計算）で共有するラスタ
+
+    image   バッファを包んだ QImage。QPainter で直接このバッファに描画する
+    array   (H, W, 4) uint8 のビュー（B, G, R, A）
+    packed  (H, W) uint32 のビュー（1画素 = 1要素、0xAARRGGBB）
+    変換・コピーをしないので、1 枚あたりのメモリは画素数 × 4 バイトだけ。
+    """
+
+    def __init__(self, width, height, fmt=RASTER_FORMAT):
+        stride = -(-width * 4 // ALIGNMENT) * ALIGNMENT
+        raw = np.empty(stride * height + ALIGNMENT, np.uint8)
+        offset = -raw.ctypes.data % ALIGNMENT
+        data = raw[offset:offset + stride * height]
+        tracing.count("bytes_allocated", raw.nbytes)
+        self._setup(np.ndarray((height, width, 4), np.uint8, data, strides=(stride, 4, 1)), fmt, data)
+
+    @classmethod
+    def wrap(cls, arr, fmt=RASTER_FORMAT):
+        """既存の (H, W, 4) の C 連続配列（キャッシュの memmap など）をコピーせずに包む"""
+        buf = cls.__new__(cls)
+        buf._setup(arr, fmt)
+        return buf
+
+    def _setup(self, arr, fmt, data=None):
+        self.array = arr
+        self.height, self.width = arr.shape[:2]
+        # QImage には行パディング込みの 1 次元バッファを渡す（配列ビューは行末の余白を含まない）
+        data = arr if data is None else data
+        self.image = QImage(data.data, self.width, self.height, arr.strides[0], fmt)
+
+    @property
+    def packed(self):
+        return self.array.view(np.uint32)[..., 0]
+
+    def clear(self):
+        self.array.fill(0)
+
+    @classmethod
+    def from_renderer(cls, renderer, progress=None):
+        """文書全体を 1 回で描画する（描画の前後に progress(done, total) を呼ぶ。例外で中断可能）
+
+        クリップした帯ごとに描くと、帯の数だけ文書全体をたどり直すことになり 1 回の描画より遅い。
+        QSvgRenderer の描画そのものは中断できないので、キャンセルは描画の前後で確認する。
+        """
+        size = renderer.defaultSize()
+        buf = cls(size.width(), size.height())
+        buf.clear()
+        if progress:
+            progress(0, 1)
+        p = QPainter(buf.image)
+        renderer.render(p)
+        p.end()
+        if progress:
+            progress(1, 1)
+        return buf
+
+    def render_regions(self, renderer, regions, progress=None):
+        """regions (x, y, w, h) の範囲だけを描画し直す（ファイル更新時の部分再描画）
+
+        文書全体を描くのと同じ変換でクリップして描くので、結果は全体描画と画素単位で一致する
+        （タイルとして平行移動して描くとアンチエイリアスの丸めがずれる）。
+        """
+        size = renderer.defaultSize()
+        for i, (x, y, w, h) in enumerate(regions):
+            self.array[y:y + h, x:x + w] = 0
+            p = QPainter(self.image)
+            p.setClipRect(QRect(x, y, w, h))
+            renderer.render(p, QRectF(0, 0, size.width(), size.height()))
+            p.end()
+            if progress:
+                progress(i + 1, len(regions))
+
+    @classmethod
+    def from_tile(cls, renderer, x, y, w, h):
+        """文書座標 (x, y, w, h) の範囲だけを描画する"""
+        size = renderer.defaultSize()
+        buf = cls(w, h)
+        buf.clear()
+        p = QPainter(buf.image)
+        p.translate(-x, -y)
+        renderer.render(p, QRectF(0, 0, size.width(), size.height()))
+        p.end()
+        return buf
+
+
+def render_svg_array(path):
+    """SVG ファイルを描画して RGBA の NumPy 配列を返す"""
+    renderer = QSvgRenderer(path)
+    if not renderer.isValid():
+        raise ValueError(f"SVG を読み込めません: {path}")
+    return RasterBuffer.from_renderer(renderer).array
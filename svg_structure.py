@@ -0,0 +1,391 @@
+"""SVG 構造比較（ラスタライズ前の事前差分）
+
+両方の SVG を XML として解析し、描画要素ごとに正規化した属性・transform・パスデータのハッシュを取る。
+- 構造が同一なら描画そのものを省略できる
+- 違いがあれば、変更された要素のバウンディングボックス（ピクセル座標）だけを比較対象にできる
+
+判断できない変更（defs / style / 参照要素 / text など形状が不明な要素）は、
+安全側に倒して「全体比較が必要」（regions=None）を返す。
+変更要素（またはその祖先・子孫）の id が href="#id" / url(#id) で参照されていれば、<use> などで
+別の位置にも描かれるので全体比較にする。
+CSS（<style> 要素・class 属性・xml-stylesheet）を使う文書は、線幅や filter / marker が
+属性から読めず bbox を求められないので、内容が完全に同じでない限り全体比較にする。
+"""
+import io
+import re
+import math
+import hashlib
+import difflib
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from diff_engine import merge_touching_rects
+
+# identical: 描画結果が同じと判断できる / regions: 比較が必要な矩形 (x, y, w, h) のリスト（None は全体）
+StructuralDiff = namedtuple("StructuralDiff", "identical regions")
+
+# 描画に影響しない要素
+IGNORED_TAGS = {"metadata", "title", "desc"}
+# 子要素ごとに比較するコンテナ
+CONTAINER_TAGS = {"g", "a", "switch"}
+# バウンディングボックスを計算できる図形
+SHAPE_TAGS = {"rect", "circle", "ellipse", "line", "polyline", "polygon", "path"}
+# 他要素から参照される / 効果範囲が読めない属性
+UNBOUNDED_ATTRS = {"filter", "marker-start", "marker-mid", "marker-end", "marker"}
+
+# アンチエイリアスの滲み分（ピクセル）
+AA_PADDING = 2
+
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+_URL_REF = re.compile(r"url\(\s*['\"]?#([^'\")\s]+)")
+_PATH_TOKEN = re.compile(r"[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_PATH_ARGS = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "A": 7, "Z": 0}
+
+
+# -------------------- 正規化 --------------------
+def _local(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _canon_number(m):
+    v = float(m.group(0))
+    return format(0.0 if v == 0 else v, ".10g")
+
+
+def canonical_value(value):
+    """数値表記・区切り文字・空白の揺れを吸収した属性値"""
+    value = _NUMBER.sub(_canon_number, value.strip())
+    value = re.sub(r"[\s,]+", " ", value)
+    value = re.sub(r"\s*([A-Za-z()#;:])\s*", r"\1", value)
+    if value.startswith("#"):
+        value = value.lower()
+    return value
+
+
+def canonical_attrs(el):
+    items = []
+    for key, value in el.attrib.items():
+        key = _local(key)
+        if key == "style":
+            decls = [d.split(":", 1) for d in value.split(";") if ":" in d]
+            decls = sorted((k.strip(), canonical_value(v)) for k, v in decls)
+            value = ";".join(f"{k}:{v}" for k, v in decls)
+        elif key == "d":
+            value = canonical_value(value).replace("z", "Z")  # z と Z は同じ closepath
+        else:
+            value = canonical_value(value)
+        items.append((key, value))
+    return tuple(sorted(items))
+
+
+def _signature(el):
+    text = " ".join(t.strip() for t in el.itertext() if t.strip()) if _local(el.tag) == "text" else ""
+    return repr((_local(el.tag), canonical_attrs(el), text))
+
+
+def _subtree_signature(el):
+    return "".join(_signature(e) + (e.text or "").strip() for e in el.iter())
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# -------------------- transform --------------------
+def _multiply(a, b):
+    """アフィン行列 (a, b, c, d, e, f) の積 a × b"""
+    return (a[0] * b[0] + a[2] * b[1], a[1] * b[0] + a[3] * b[1],
+            a[0] * b[2] + a[2] * b[3], a[1] * b[2] + a[3] * b[3],
+            a[0] * b[4] + a[2] * b[5] + a[4], a[1] * b[4] + a[3] * b[5] + a[5])
+
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def parse_transform(value):
+    m = IDENTITY
+    for name, args in _TRANSFORM.findall(value or ""):
+        v = [float(x) for x in _NUMBER.findall(args)]
+        if name == "matrix" and len(v) == 6:
+            t = tuple(v)
+        elif name == "translate" and v:
+            t = (1, 0, 0, 1, v[0], v[1] if len(v) > 1 else 0)
+        elif name == "scale" and v:
+            t = (v[0], 0, 0, v[1] if len(v) > 1 else v[0], 0, 0)
+        elif name == "rotate" and v:
+            r = math.radians(v[0])
+            t = (math.cos(r), math.sin(r), -math.sin(r), math.cos(r), 0, 0)
+            if len(v) == 3:
+                t = _multiply(_multiply((1, 0, 0, 1, v[1], v[2]), t), (1, 0, 0, 1, -v[1], -v[2]))
+        elif name == "skewX" and v:
+            t = (1, 0, math.tan(math.radians(v[0])), 1, 0, 0)
+        elif name == "skewY" and v:
+            t = (1, math.tan(math.radians(v[0])), 0, 1, 0, 0)
+        else:
+            continue
+        m = _multiply(m, t)
+    return m
+
+
+def _apply(m, x, y):
+    return m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5]
+
+
+# -------------------- バウンディングボックス --------------------
+def _lengths(el, *names):
+    """長さ属性を数値で返す（% や単位付きなど px 以外が混じれば None）"""
+    values = []
+    for name in names:
+        raw = el.get(name, "0").strip()
+        v = _NUMBER.match(raw)
+        if not v or raw[v.end():].strip() not in ("", "px"):
+            return None
+        values.append(float(v.group(0)))
+    return values
+
+
+def _path_points(d):
+    """パスの端点・制御点（制御点の凸包は曲線を含むので bbox として安全）"""
+    tokens = _PATH_TOKEN.findall(d or "")
+    points = []
+    x = y = sx = sy = 0.0
+    cmd = None
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            cmd = tokens[i]
+            i += 1
+            if cmd in "Zz":
+                x, y = sx, sy
+                continue
+        if cmd is None:
+            return None
+        n = _PATH_ARGS[cmd.upper()]
+        raw = tokens[i:i + n]
+        if len(raw) < n or any(t.isalpha() for t in raw):
+            return None
+        args = [float(t) for t in raw]
+        i += n
+        rel = cmd.islower()
+        c = cmd.upper()
+        if c == "H":
+            x = args[0] + (x if rel else 0)
+            points.append((x, y))
+        elif c == "V":
+            y = args[0] + (y if rel else 0)
+            points.append((x, y))
+        elif c == "A":
+            nx, ny = args[5] + (x if rel else 0), args[6] + (y if rel else 0)
+            # 円弧は端点から「楕円の直径（半径が足りなければ弦長）」以内に収まる
+            reach = max(2 * max(abs(args[0]), abs(args[1])), math.hypot(nx - x, ny - y))
+            for px, py in ((x, y), (nx, ny)):
+                points += [(px - reach, py - reach), (px + reach, py + reach)]
+            x, y = nx, ny
+        else:
+            for k in range(0, n, 2):
+                px, py = args[k] + (x if rel else 0), args[k + 1] + (y if rel else 0)
+                points.append((px, py))
+            x, y = points[-1]
+        if c == "M":
+            sx, sy = x, y
+            cmd = "l" if rel else "L"  # M に続く座標は lineto
+    return points
+
+
+def local_points(el):
+    tag = _local(el.tag)
+    if tag == "rect":
+        v = _lengths(el, "x", "y", "width", "height")
+        return v and [(v[0], v[1]), (v[0] + v[2], v[1] + v[3])]
+    if tag == "circle":
+        v = _lengths(el, "cx", "cy", "r")
+        return v and [(v[0] - v[2], v[1] - v[2]), (v[0] + v[2], v[1] + v[2])]
+    if tag == "ellipse":
+        v = _lengths(el, "cx", "cy", "rx", "ry")
+        return v and [(v[0] - v[2], v[1] - v[3]), (v[0] + v[2], v[1] + v[3])]
+    if tag == "line":
+        v = _lengths(el, "x1", "y1", "x2", "y2")
+        return v and [(v[0], v[1]), (v[2], v[3])]
+    if tag in ("polyline", "polygon"):
+        v = [float(n) for n in _NUMBER.findall(el.get("points", ""))]
+        return list(zip(v[0::2], v[1::2]))
+    if tag == "path":
+        return _path_points(el.get("d"))
+    return None
+
+
+def _style_value(el, name):
+    for decl in el.get("style", "").split(";"):
+        if ":" in decl:
+            k, v = decl.split(":", 1)
+            if k.strip() == name:
+                return v.strip()
+    return el.get(name)
+
+
+def _inherited(chain, name, default=None):
+    for el in reversed(chain):
+        v = _style_value(el, name)
+        if v is not None and v != "inherit":
+            return v
+    return default
+
+
+def pixel_bbox(chain, root_matrix):
+    """要素（chain[-1]）のピクセル座標での bbox (x1, y1, x2, y2)。求められなければ None"""
+    el = chain[-1]
+    if any(_style_value(e, a) not in (None, "none") for e in chain for a in UNBOUNDED_ATTRS):
+        return None
+    points = local_points(el)
+    if not points:
+        return None
+
+    m = root_matrix
+    for e in chain:
+        m = _multiply(m, parse_transform(e.get("transform")))
+    pts = [_apply(m, px, py) for px, py in points]
+
+    # 線幅（マイター結合の張り出しも含めて多めに）
+    stroke = _inherited(chain, "stroke", "none")
+    pad = AA_PADDING
+    if stroke != "none":
+        width = _NUMBER.match(_inherited(chain, "stroke-width", "1") or "1")
+        width = float(width.group(0)) if width else 1.0
+        miter = _NUMBER.match(_inherited(chain, "stroke-miterlimit", "4") or "4")
+        miter = float(miter.group(0)) if miter else 4.0
+        pad += width * max(miter, 1.0) / 2 * math.sqrt(abs(m[0] * m[3] - m[1] * m[2]))
+
+    xs = [p[0] for p in pts]
+    ys = [p[1] for p in pts]
+    return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+
+
+# -------------------- 文書解析 --------------------
+def referenced_ids(root):
+    """href="#id" / url(#id)（属性・<style> の中）で参照されている id の集合"""
+    refs = set()
+    for el in root.iter():
+        for key, value in el.attrib.items():
+            refs.update(_URL_REF.findall(value))
+            if _local(key) == "href" and value.startswith("#"):
+                refs.add(value[1:])
+        if _local(el.tag) == "style" and el.text:
+            refs.update(_URL_REF.findall(el.text))
+    return refs
+
+
+def _root_matrix(root):
+    """viewBox → 描画サイズ（QSvgRenderer.defaultSize）への変換行列。px 以外の単位なら None"""
+    size = None
+    if "width" in root.attrib or "height" in root.attrib:
+        if not ("width" in root.attrib and "height" in root.attrib):
+            return None
+        size = _lengths(root, "width", "height")
+        if size is None:
+            return None
+    vb = [float(v) for v in _NUMBER.findall(root.get("viewBox", ""))]
+    if len(vb) != 4 or vb[2] <= 0 or vb[3] <= 0:
+        return IDENTITY
+    if size is None:
+        size = vb[2], vb[3]
+    sx, sy = size[0] / vb[2], size[1] / vb[3]
+    return (sx, 0, 0, sy, -vb[0] * sx, -vb[1] * sy)
+
+
+def parse_document(source):
+    """SVG（パスまたはファイルオブジェクト）を
+    (ルート署名, 資源署名, 描画要素リスト[(ハッシュ, 祖先チェーン)], 描画サイズへの変換行列, CSS を使うか,
+    参照されている id の集合) に分解する
+    """
+    root = ET.parse(source).getroot()
+    resources = []
+    elements = []
+    has_css = any(_local(e.tag) == "style" or e.get("class") is not None for e in root.iter())
+
+    def walk(el, chain, context):
+        for child in el:
+            tag = _local(child.tag)
+            if not tag or tag in IGNORED_TAGS:
+                continue
+            sig = _signature(child)
+            if tag in CONTAINER_TAGS:
+                walk(child, chain + [child], context + sig)
+            elif tag in SHAPE_TAGS or tag in ("text", "image", "use", "foreignObject", "svg"):
+                elements.append((_digest(context + sig), chain + [child]))
+            else:
+                # defs / style / グラデーション等は変更の影響範囲を特定できない
+                resources.append(_digest(context + _subtree_signature(child)))
+
+    walk(root, [root], "")
+    return _signature(root), resources, elements, _root_matrix(root), has_css, referenced_ids(root)
+
+
+def structural_diff(path_l, path_r):
+    """2つの SVG を構造比較する（描画はしない）"""
+    with open(path_l, "rb") as f:
+        data_l = f.read()
+    with open(path_r, "rb") as f:
+        data_r = f.read()
+    return structural_diff_data(data_l, data_r)
+
+
+def structural_diff_data(data_l, data_r):
+    """SVG のバイト列同士を構造比較する（同じファイルの保存前後の比較など）"""
+    if data_l == data_r:
+        return StructuralDiff(True, [])
+
+    if b"<?xml-stylesheet" in data_l or b"<?xml-stylesheet" in data_r:
+        return StructuralDiff(False, None)
+    try:
+        root_l, res_l, el_l, matrix, css_l, refs_l = parse_document(io.BytesIO(data_l))
+        root_r, res_r, el_r, _, css_r, refs_r = parse_document(io.BytesIO(data_r))
+    except (ET.ParseError, ValueError):
+        return StructuralDiff(False, None)
+
+    # セレクタは無視した要素（title など）や並びにも左右されるので、CSS があれば同一とも言い切らない
+    if root_l != root_r or res_l != res_r or css_l or css_r:
+        return StructuralDiff(False, None)
+
+    hashes_l = [h for h, _ in el_l]
+    hashes_r = [h for h, _ in el_r]
+    if hashes_l == hashes_r:
+        return StructuralDiff(True, [])
+    if matrix is None:
+        return StructuralDiff(False, None)
+
+    # 順序も描画結果に影響するので、並びの差分で変更要素を求める
+    changed = []
+    matcher = difflib.SequenceMatcher(None, hashes_l, hashes_r, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op != "equal":
+            changed += [chain for _, chain in el_l[i1:i2]]
+            changed += [chain for _, chain in el_r[j1:j2]]
+
+    # 参照される要素（<use> の複製元など）が変わると、参照している側の位置の描画も変わる
+    refs = refs_l | refs_r
+    for chain in changed:
+        ids = {e.get("id") for e in chain[1:]} | {e.get("id") for e in chain[-1].iter()}
+        if ids & refs:
+            return StructuralDiff(False, None)
+
+    boxes = []
+    for chain in changed:
+        box = pixel_bbox(chain, matrix)
+        if box is None:
+            return StructuralDiff(False, None)
+        x1, y1 = math.floor(box[0]), math.floor(box[1])
+        x2, y2 = math.ceil(box[2]), math.ceil(box[3])
+        boxes.append((x1, y1, x2 - x1, y2 - y1))
+    return StructuralDiff(False, merge_touching_rects(boxes))
+
+
+def clip_regions(regions, width, height):
+    """領域を画像範囲に切り詰め、空になったものを除く"""
+    out = []
+    for x, y, w, h in regions:
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(width, int(x + w)), min(height, int(y + h))
+        if x2 > x1 and y2 > y1:
+            out.append((x1, y1, x2 - x1, y2 - y1))
+    return out
@@ -0,0 +1,109 @@
+"""SVG を表示倍率に合わせたタイルで描画する QGraphicsItem（詳細度ピラミッド）
+
+巨大な QPixmap を 1 枚作る代わりに、ビューに見えている範囲のタイルだけを
+現在のズーム倍率（2 のべき乗に丸めた段）で QSvgRenderer から直接描画する。
+描画したタイルは LRU で保持し、同じ位置・倍率を再表示するときは使い回す。
+"""
+import math
+from collections import OrderedDict
+
+from PySide6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PySide6.QtGui import QImage, QPainter, QPixmap
+from PySide6.QtCore import Qt, QRectF
+
+TILE_SIZE = 512           # タイル一辺（画面ピクセル）
+MAX_TILES = 96            # LRU で保持するタイル数（512×512×4B×96 ≒ 96MB）
+MIN_LEVEL = -8            # 1/256 倍まで縮小
+MAX_LEVEL = 6             # 64 倍まで拡大
+
+
+class SvgTileItem(QGraphicsItem):
+    def __init__(self, renderer, tile_size=TILE_SIZE, max_tiles=MAX_TILES, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()  # (level, tx, ty) -> QPixmap
+        # exposedRect（再描画が必要な範囲）を受け取る
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def setRenderer(self, renderer, regions=None):
+        """renderer を差し替える（regions (x, y, w, h) を渡すとその範囲に掛かるタイルだけ描き直す）"""
+        if regions is None or renderer.defaultSize() != self.renderer.defaultSize():
+            self.prepareGeometryChange()
+            self.renderer = renderer
+            self.tiles.clear()
+            self.update()
+            return
+        self.renderer = renderer
+        for level, tx, ty in list(self.tiles):
+            doc_tile = self.tile_size / 2.0 ** level
+            x1, y1 = tx * doc_tile, ty * doc_tile
+            if any(x < x1 + doc_tile and x1 < x + w and y < y1 + doc_tile and y1 < y + h for x, y, w, h in regions):
+                del self.tiles[(level, tx, ty)]
+        for x, y, w, h in regions:
+            self.update(QRectF(x, y, w, h))
+
+    def boundingRect(self):
+        size = self.renderer.defaultSize()
+        return QRectF(0, 0, size.width(), size.height())
+
+    # -------------------- タイル --------------------
+    def level_for(self, lod):
+        """表示倍率 lod 以上の解像度を持つ段（scale = 2**level）"""
+        level = math.ceil(math.log2(max(lod, 1e-6)))
+        return max(MIN_LEVEL, min(MAX_LEVEL, level))
+
+    def tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+
+        scale = 2.0 ** level
+        size = self.renderer.defaultSize()
+        full_w = math.ceil(size.width() * scale)
+        full_h = math.ceil(size.height() * scale)
+        w = min(self.tile_size, full_w - tx * self.tile_size)
+        h = min(self.tile_size, full_h - ty * self.tile_size)
+
+        img = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+        img.fill(Qt.transparent)
+        p = QPainter(img)
+        p.translate(-tx * self.tile_size, -ty * self.tile_size)
+        p.scale(scale, scale)
+        self.renderer.render(p, QRectF(0, 0, size.width(), size.height()))
+        p.end()
+
+        pixmap = QPixmap.fromImage(img)
+        self.tiles[key] = pixmap
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        if self.renderer is None or not self.renderer.isValid():
+            return
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(lod)
+        scale = 2.0 ** level
+        doc_tile = self.tile_size / scale  # 1タイルが覆う文書座標の長さ
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        tx1 = max(0, int(exposed.left() // doc_tile))
+        ty1 = max(0, int(exposed.top() // doc_tile))
+        tx2 = int(math.ceil(exposed.right() / doc_tile))
+        ty2 = int(math.ceil(exposed.bottom() / doc_tile))
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        for ty in range(ty1, ty2):
+            for tx in range(tx1, tx2):
+                pixmap = self.tile(level, tx, ty)
+                if pixmap.isNull():
+                    continue
+                target = QRectF(tx * doc_tile, ty * doc_tile,
+                                pixmap.width() / scale, pixmap.height() / scale)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
@@ -0,0 +1,100 @@
+"""タイル分割比較（巨大SVG向け・メモリ上限付き）
+
+文書全体を 1 枚の QImage にせず、固定サイズのタイルごとに左右を描画 → 差分 → 破棄する。
+同時に存在するのは 1 タイル分のバッファだけなので、ピークメモリは文書サイズに依存しない。
+タイル境界ではアンチエイリアスの丸めが全体描画と ±1 ずれることがあるが、
+左右とも同じタイル分割で描画するので比較結果には影響しない。
+"""
+import math
+import numpy as np
+
+from PySide6.QtSvg import QSvgRenderer
+
+import tracing
+from svg_render import render_tile_array
+from diff_engine import diff_components, offset_regions, Piece, seam_runs, stitch_regions, refine_regions
+from svg_structure import clip_regions
+from sparse_mask import RunMask
+
+# 1画素あたりの作業メモリ概算（QImage×2 + RGBA配列×2 + 縮小/差分の作業領域）
+BYTES_PER_PIXEL = 24
+MIN_TILE_SIZE = 256
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+def fits_in_budget(width, height, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """文書全体を一度に描画・比較してもメモリ上限に収まるか"""
+    return width * height * BYTES_PER_PIXEL <= memory_budget_mb * 1024 * 1024
+
+
+def tile_size_for_budget(memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """メモリ上限 (MB) に収まるタイル一辺の長さ（64 の倍数）を返す"""
+    side = int(math.sqrt(memory_budget_mb * 1024 * 1024 / BYTES_PER_PIXEL))
+    return max(MIN_TILE_SIZE, side // 64 * 64)
+
+
+def iter_tiles(width, height, tile_size):
+    """(x, y, w, h) のタイルを左上から順に返す"""
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            yield x, y, min(tile_size, width - x), min(tile_size, height - y)
+
+
+def compare_renderers_tiled(renderer_l, renderer_r, tile_size=None,
+                            memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, progress=None, regions=None, tolerance=None,
+                            return_mask=False, **options):
+    """2つの QSvgRenderer をタイル単位で比較し、文書座標の差分領域（REGION_DTYPE の構造化配列）を返す
+
+    regions を渡すとその領域 (x, y, w, h) だけを描画・比較する（構造比較で絞り込んだ場合）。
+    タイル境界で分断された連結成分を画素単位でつなぎ直してから options（min_area / padding / merge_gap）を適用する。
+    tolerance は compute_diff_rects() を参照（孤立画素の判定はタイル内で行う）。
+    return_mask=True なら (差分領域, 差分画素の RunMask) を返す（ランだけを保持するのでメモリは差分の量に比例）。
+    progress(done, total) はタイルごとに呼ばれる（例外を投げれば中断できる）
+    """
+    size_l = renderer_l.defaultSize()
+    size_r = renderer_r.defaultSize()
+    if size_l != size_r:
+        raise ValueError("左右の画像サイズが異なります。")
+
+    width, height = size_l.width(), size_l.height()
+    tile_size = tile_size or tile_size_for_budget(memory_budget_mb)
+    if regions is None:
+        tiles = list(iter_tiles(width, height, tile_size))
+    else:
+        tiles = [(rx + x, ry + y, w, h)
+                 for rx, ry, rw, rh in clip_regions(regions, width, height)
+                 for x, y, w, h in iter_tiles(rw, rh, tile_size)]
+
+    found = []
+    masks = []
+    for i, (x, y, w, h) in enumerate(tiles):
+        with tracing.span("tile.render", x=x, y=y, w=w, h=h):
+            tile_l = render_tile_array(renderer_l, x, y, w, h)
+            tile_r = render_tile_array(renderer_r, x, y, w, h)
+        with tracing.span("tile.diff", x=x, y=y):
+            part, runs, owner = diff_components(tile_l, tile_r, tolerance=tolerance)
+            runs[:, 0] += y
+            runs[:, 1:] += x
+            if return_mask:
+                masks.append(runs)
+            # つなぎ直しに使うのは隣のタイルと接しうる境界のランだけなので、それ以外は捨てる
+            found.append(seam_runs(Piece(offset_regions(part, x, y), runs, owner, (x, y, w, h)), tiles))
+        del tile_l, tile_r
+        if progress:
+            progress(i + 1, len(tiles))
+
+    regions = refine_regions(stitch_regions(found), width, height, **options)
+    if return_mask:
+        return regions, RunMask(width, height, np.concatenate(masks) if masks else None).normalized()
+    return regions
+
+
+def compare_svgs_tiled(path_l, path_r, tile_size=None,
+                       memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, progress=None, **options):
+    """SVG ファイル同士をタイル単位で比較する"""
+    renderer_l = QSvgRenderer(path_l)
+    renderer_r = QSvgRenderer(path_r)
+    for path, renderer in ((path_l, renderer_l), (path_r, renderer_r)):
+        if not renderer.isValid():
+            raise ValueError(f"SVG を読み込めません: {path}")
+    return compare_renderers_tiled(renderer_l, renderer_r, tile_size, memory_budget_mb, progress, **options)
@@ -0,0 +1,211 @@
+"""処理時間の計測（スパン・カウンタ）と書き出し（GUI 非依存）
+
+    with tracing.span("render", side="left"):
+        ...
+    tracing.count("pixels_compared", w * h)
+
+無効なとき（既定）は span() が共有の空オブジェクトを返し、count() はすぐ戻るだけなので、
+計測箇所を残したままでもほぼコストがかからない。
+環境変数 SVGDIFF_TRACE でソースを変えずに有効にできる。
+    SVGDIFF_TRACE=1            スパンを [DEBUG] 行で表示する
+    SVGDIFF_TRACE=trace.json   終了時に Chrome トレース形式（chrome://tracing / Perfetto）で書き出す
+                               （batch_compare のワーカープロセスは trace-<pid>.json に書き出す）
+埋め込み先のアプリは add_hook(callback) で計測結果を受け取れる。
+    callback(kind, name, value, args)  kind は "span"（value は秒）か "counter"（value は増分）
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from multiprocessing import util as mp_util
+
+TRACE_ENV = "SVGDIFF_TRACE"
+
+
+class _NullSpan:
+    """無効時に返す何もしないスパン"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._finish(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        """終了前に結果の件数などを付け加える"""
+        self.args.update(args)
+
+
+class Tracer:
+    def __init__(self, enabled=False, max_events=1_000_000):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.events = []       # (名前, 開始 ns, 終了 ns, スレッド ID, args)
+        self.counters = {}     # 名前 → 合計
+        self.counter_events = []  # (名前, 時刻 ns, 合計)
+        self.hooks = []
+        self.export_path = None
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    # -------------------- 計測 --------------------
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name, start, **args):
+        """now() で取った start から現在までを 1 つのスパンとして記録する（スレッドをまたぐ処理用）"""
+        if self.enabled and start is not None:
+            self._finish(name, start, time.perf_counter_ns(), args)
+
+    def now(self):
+        return time.perf_counter_ns() if self.enabled else None
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            if len(self.counter_events) < self.max_events:
+                self.counter_events.append((name, time.perf_counter_ns(), total))
+        for hook in self.hooks:
+            hook("counter", name, value, None)
+
+    def _finish(self, name, start, end, args):
+        if len(self.events) < self.max_events:
+            self.events.append((name, start, end, threading.get_ident(), args))
+        for hook in self.hooks:
+            hook("span", name, (end - start) / 1e9, args)
+
+    # -------------------- 設定 --------------------
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_hook(self, callback):
+        self.hooks.append(callback)
+
+    def remove_hook(self, callback):
+        if callback in self.hooks:
+            self.hooks.remove(callback)
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self.counters = {}
+            self.counter_events = []
+
+    # -------------------- 集計・書き出し --------------------
+    def summary(self):
+        """スパン名ごとの {count, total, max}（秒）"""
+        stats = {}
+        for name, start, end, _, _ in list(self.events):
+            s = stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            elapsed = (end - start) / 1e9
+            s["count"] += 1
+            s["total"] += elapsed
+            s["max"] = max(s["max"], elapsed)
+        return stats
+
+    def chrome_trace(self):
+        """Chrome トレース形式（Trace Event Format）の dict"""
+        pid = os.getpid()
+        events = []
+        for name, start, end, tid, args in list(self.events):
+            events.append({"name": name, "ph": "X", "pid": pid, "tid": tid,
+                           "ts": (start - self.origin) / 1000, "dur": (end - start) / 1000,
+                           "args": _jsonable(args)})
+        for name, t, total in list(self.counter_events):
+            events.append({"name": name, "ph": "C", "pid": pid, "ts": (t - self.origin) / 1000,
+                           "args": {name: total}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def export_json(self, path):
+        """集計結果（スパンごとの合計・カウンタ）を JSON で書き出す"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"spans": self.summary(), "counters": dict(self.counters)}, f, ensure_ascii=False, indent=2)
+
+
+def _jsonable(args):
+    return {k: v if isinstance(v, (int, float, str, bool, type(None))) else str(v) for k, v in args.items()}
+
+
+def print_hook(kind, name, value, args):
+    """スパンを従来の [DEBUG] 行の形式で表示するフック"""
+    if kind == "span":
+        detail = " ".join(f"{k}={v}" for k, v in (args or {}).items())
+        print(f"[DEBUG] {name}: {value:.3f} 秒" + (f" ({detail})" if detail else ""))
+
+
+# -------------------- 既定のトレーサ --------------------
+tracer = Tracer()
+span = tracer.span
+record = tracer.record
+now = tracer.now
+count = tracer.count
+add_hook = tracer.add_hook
+remove_hook = tracer.remove_hook
+
+
+def configure_from_env(environ=os.environ):
+    """SVGDIFF_TRACE に従って既定のトレーサを有効にする"""
+    value = environ.get(TRACE_ENV, "")
+    if not value or value == "0":
+        return
+    tracer.enable()
+    if value == "1":
+        tracer.add_hook(print_hook)
+    else:
+        tracer.export_path = value
+        atexit.register(tracer.export_chrome_trace, value)
+
+
+def configure_worker():
+    """ワーカープロセスの初期化時に呼ぶ（親から引き継いだ記録を捨て、終了時に別ファイルへ書き出す）
+
+    ワーカープロセスは atexit を実行せずに終了するので、multiprocessing の終了処理に登録する。
+    """
+    if not tracer.enabled or not tracer.export_path:
+        return
+    tracer.clear()
+    root, ext = os.path.splitext(tracer.export_path)
+    tracer.export_path = f"{root}-{os.getpid()}{ext or '.json'}"
+    mp_util.Finalize(tracer, tracer.export_chrome_trace, args=(tracer.export_path,), exitpriority=10)
+
+
+configure_from_env()
@@ -0,0 +1,400 @@
+"""バックグラウンド処理（SVG読み込み・差分計算）
+
+重い処理は QThread 上で実行し、進捗は Signal で GUI スレッドに返す。
+キャンセルは CancelToken で要求し、描画の前後・タイルごと・差分領域ごとに確認する。
+"""
+import threading
+
+import numpy as np
+
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtCore import QByteArray, QThread, Signal, QCoreApplication
+
+import tracing
+from svg_render import RasterBuffer, render_thumbnail, qimage_view
+from raster_cache import content_hash
+from diff_engine import (compute_diff_rects, compute_diff_rects_in_regions, diff_mask, find_regions, block_hashes,
+                         update_block_hashes, empty_regions, region_rects, refine_regions, merge_touching_rects)
+from svg_structure import structural_diff_data, clip_regions
+from sparse_mask import RunMask
+from tiled_compare import fits_in_budget, compare_renderers_tiled
+
+PREVIEW_MAX_SIDE = 1024                # 仮表示の長辺（画素）
+PROGRESSIVE_MIN_PIXELS = 2048 * 2048   # これより大きいページだけ仮表示する
+MEMORY_BUDGET_MB = 1024                # 全体を描画して比較する上限。超えるページはタイル単位で比較する
+
+
+def load_renderer(path, data, normalizer=None, side=None):
+    """(QSvgRenderer, 描画する文書の内容) を返す（normalizer (NormalizedCache) があれば前処理した文書から読む）"""
+    if normalizer is not None:
+        with tracing.span("normalize", side=side, size=len(data)):
+            data = normalizer.normalize(data)
+        with tracing.span("parse", side=side):
+            return QSvgRenderer(QByteArray(data)), data
+    with tracing.span("parse", side=side):
+        return QSvgRenderer(path), data
+
+
+class MyExceptionCancel(Exception):
+    def __init__(self, arg=""):
+        self.arg = arg
+
+
+class CancelToken:
+    """スレッド間で共有するキャンセル要求フラグ"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise MyExceptionCancel("")
+
+
+class PipelineThread(QThread):
+    """work() をバックグラウンドで実行し、結果を Signal で通知する基底クラス"""
+    progress = Signal(int, str)     # (0-100, ラベル)
+    succeeded = Signal(object)
+    failed = Signal(str)
+    canceled = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.token = CancelToken()
+
+    def cancel(self):
+        self.token.cancel()
+
+    def report(self, start, end, label):
+        """progress(done, total) 形式のコールバックを作る（start〜end% に割り当て、キャンセルも確認）"""
+        def callback(done, total):
+            self.token.check()
+            self.progress.emit(start + (end - start) * done // max(total, 1), label)
+        return callback
+
+    def run(self):
+        try:
+            result = self.work()
+            self.token.check()
+        except MyExceptionCancel:
+            self.canceled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.succeeded.emit(result)
+
+    def work(self):
+        raise NotImplementedError
+
+
+class SvgLoadThread(PipelineThread):
+    """SVG の解析 → 描画 → ブロックハッシュ（結果: dict(side, path, data, renderer, raster, img, arr, hashes)）
+
+    RasterBuffer に直接描画し、img / arr はそのバッファを共有するビュー（変換・コピーなし）。
+    cache (RasterCache) があれば内容ハッシュで引き、ヒットすれば描画・ハッシュ計算を省略する。
+    normalizer (svg_normalize.NormalizedCache) があれば前処理した文書を描画する。
+    全体の描画が memory_budget_mb に収まらないページは描画せず、raster / img / arr / hashes を None で返す
+    （差分は TiledDiffThread でタイルごとに計算する）。
+    解析が終わった時点で parsed（dict(side, path, renderer)）を通知する。renderer は GUI スレッドに移した
+    表示用の QSvgRenderer で、GUI は描画・ハッシュ計算の完了を待たずにすぐ表示できる（GUI スレッドでは解析しない）。
+    表示用の renderer はこのスレッドでは使わないので、全体を描画するとき（キャッシュに無いとき）だけ描画用にもう 1 つ作る。
+    """
+    parsed = Signal(object)
+
+    def __init__(self, side, path, cache=None, normalizer=None, memory_budget_mb=MEMORY_BUDGET_MB, parent=None):
+        super().__init__(parent)
+        self.side = side
+        self.path = path
+        self.cache = cache
+        self.normalizer = normalizer
+        self.memory_budget_mb = memory_budget_mb
+
+    def work(self):
+        self.progress.emit(5, "QSvgRenderer作成")
+        with open(self.path, "rb") as f:
+            self.data = f.read()  # 監視中に保存し直されたとき、この内容と構造比較する
+        renderer, document = load_renderer(self.path, self.data, self.normalizer, self.side)
+        if not renderer.isValid():
+            raise ValueError(f"SVG を読み込めません: {self.path}")
+        self.token.check()
+        # GUI スレッドで使うので所属スレッドを移してから渡す（以後このスレッドでは描画に使わない）
+        size = renderer.defaultSize()
+        renderer.moveToThread(QCoreApplication.instance().thread())
+        self.parsed.emit({"side": self.side, "path": self.path, "renderer": renderer})
+
+        if not fits_in_budget(size.width(), size.height(), self.memory_budget_mb):
+            print(f"[INFO] {size.width()}x{size.height()} はメモリ上限 {self.memory_budget_mb}MB を超えるため"
+                  f"タイル単位で比較します: {self.path}")
+            self.progress.emit(100, "完了")
+            return self.result(renderer, None, None)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(content_hash(document), size.width(), size.height())
+            with tracing.span("cache.get", side=self.side):
+                arr = self.cache.get(key)
+            if arr is not None:
+                tracing.count("cache.hit")
+                hashes = self.cache.block_hashes(key, arr)
+                self.progress.emit(100, "完了")
+                return self.result(renderer, RasterBuffer.wrap(arr), hashes)
+
+        with tracing.span("parse.raster", side=self.side):
+            raster_renderer = QSvgRenderer(QByteArray(document))
+        with tracing.span("render", side=self.side, width=size.width(), height=size.height()):
+            raster = RasterBuffer.from_renderer(raster_renderer, self.report(20, 85, "svg_to_qimage"))
+        del raster_renderer
+
+        self.progress.emit(85, "block_hashes")
+        if key is not None:
+            tracing.count("cache.miss")
+            # 保存後はキャッシュの memmap を使い、描画用のバッファは手放す
+            with tracing.span("cache.put", side=self.side):
+                cached = self.cache.put(key, raster.array)
+            if cached is not raster.array:
+                raster = RasterBuffer.wrap(cached)
+        with tracing.span("block_hashes", side=self.side):
+            if key is not None:
+                hashes = self.cache.block_hashes(key, raster.array)
+            else:
+                hashes = block_hashes(raster.array)
+        self.progress.emit(100, "完了")
+        return self.result(renderer, raster, hashes)
+
+    def result(self, renderer, raster, hashes):
+        return {"side": self.side, "path": self.path, "data": self.data, "renderer": renderer, "raster": raster,
+                "img": raster and raster.image, "arr": raster and raster.array, "hashes": hashes}
+
+
+class SvgUpdateThread(PipelineThread):
+    """保存し直された SVG を、前の内容との構造比較で変わった範囲だけ描画・比較し直す（監視モード用）
+
+    結果: dict(mode, side, path, data, ...)
+        mode="same"         描画結果は変わらない（data だけ更新）
+        mode="full"         変更範囲を特定できない・サイズが変わった（通常の読み込みをやり直す）
+        mode="incremental"  SvgLoadThread と同じ項目に加え、regions（新しい差分領域）と changed（描き直した範囲）、
+                            mask（差分画素の RunMask。元の mask を渡さなければ None）
+    もう片側のラスタ・ハッシュはそのまま使う。描き直しは元のラスタのコピーに対して行うので、
+    途中でキャンセルしても表示中の状態は変わらない。
+    """
+
+    def __init__(self, side, path, data, arr, hashes, other_arr, regions, tolerance=None, normalizer=None,
+                 mask=None, parent=None):
+        super().__init__(parent)
+        self.side = side
+        self.path = path
+        self.old_data = data
+        self.arr = arr
+        self.hashes = hashes
+        self.other_arr = other_arr
+        self.regions = regions  # 現在の差分領域（REGION_DTYPE または (N, 4)）
+        self.tolerance = tolerance
+        self.normalizer = normalizer  # 元のラスタと同じく前処理した文書から描く
+        self.mask = mask  # 現在の差分画素（RunMask）。比較し直した範囲だけ置き換える
+
+    def work(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        result = {"side": self.side, "path": self.path, "data": data}
+        self.progress.emit(5, "構造比較")
+        with tracing.span("watch.structural_diff", side=self.side):
+            structure = structural_diff_data(self.old_data, data)
+        if structure.identical:
+            return dict(result, mode="same")
+        if structure.regions is None:
+            return dict(result, mode="full")
+
+        renderer, _ = load_renderer(self.path, data, self.normalizer, self.side)
+        if not renderer.isValid():
+            raise ValueError(f"SVG を読み込めません: {self.path}")
+        size = renderer.defaultSize()
+        width, height = size.width(), size.height()
+        if (height, width) != self.arr.shape[:2]:
+            return dict(result, mode="full")
+        changed = clip_regions(structure.regions, width, height)
+        self.token.check()
+
+        # 変わった範囲だけ描き直す（全体描画と画素単位で一致する）
+        raster = RasterBuffer(width, height)
+        np.copyto(raster.array, self.arr)
+        with tracing.span("watch.render", side=self.side, regions=len(changed)):
+            raster.render_regions(renderer, changed, self.report(10, 60, "部分再描画"))
+        hashes = update_block_hashes(self.hashes.copy(), raster.array, changed)
+
+        # 変更範囲に掛かる既存の差分領域は範囲ごと比較し直し、掛からないものはそのまま残す
+        old = self.regions if self.regions is not None else empty_regions()
+        rects = region_rects(old)
+        touched = np.zeros(len(rects), bool)
+        for x, y, w, h in changed:
+            touched |= ((rects[:, 0] <= x + w) & (rects[:, 0] + rects[:, 2] >= x)
+                        & (rects[:, 1] <= y + h) & (rects[:, 1] + rects[:, 3] >= y))
+        targets = changed + [(int(x), int(y), int(w) + 1, int(h) + 1) for x, y, w, h in rects[touched].tolist()]
+        arr_l, arr_r = (raster.array, self.other_arr) if self.side == "left" else (self.other_arr, raster.array)
+        targets = clip_regions(merge_touching_rects(targets), width, height)
+        with tracing.span("watch.diff", side=self.side, regions=len(targets)):
+            found = compute_diff_rects_in_regions(arr_l, arr_r, targets, self.report(60, 100, "差分計算"),
+                                                  self.tolerance, return_mask=self.mask is not None)
+        mask = None
+        if self.mask is not None:
+            found, found_mask = found
+            mask = self.mask.difference(RunMask.from_rects(targets, width, height)).union(found_mask)
+        if old.dtype == found.dtype:
+            kept = old[~touched]
+        else:
+            # 保存結果から復元した矩形だけの場合（面積・重心は 0 のまま）
+            kept = np.zeros(int((~touched).sum()), found.dtype)
+            kept["x"], kept["y"], kept["w"], kept["h"] = rects[~touched].T
+        regions = refine_regions(np.concatenate([kept, found]), width, height)
+
+        renderer.moveToThread(QCoreApplication.instance().thread())
+        return dict(result, mode="incremental", renderer=renderer, raster=raster, img=raster.image,
+                    arr=raster.array, hashes=hashes, regions=regions, changed=changed, mask=mask)
+
+
+class PreviewThread(PipelineThread):
+    """左右を縮小描画して概略の差分矩形を出す（段階表示の 1 段目）
+
+    結果: dict(width, height, images={"left", "right"}, rects) / 小さいページなら None。
+    矩形は文書座標に戻し、縮小でつぶれた分を見込んで縮小画像の 1 画素ぶん広げておく。
+    """
+
+    def __init__(self, path_l, path_r, max_side=PREVIEW_MAX_SIDE, parent=None):
+        super().__init__(parent)
+        self.path_l = path_l
+        self.path_r = path_r
+        self.max_side = max_side
+
+    def work(self):
+        renderers = []
+        for path in (self.path_l, self.path_r):
+            renderer = QSvgRenderer(path)
+            if not renderer.isValid():
+                raise ValueError(f"SVG を読み込めません: {path}")
+            renderers.append(renderer)
+        size_l, size_r = renderers[0].defaultSize(), renderers[1].defaultSize()
+        if max(size_l.width() * size_l.height(), size_r.width() * size_r.height()) < PROGRESSIVE_MIN_PIXELS:
+            return None
+
+        with tracing.span("preview") as preview:
+            images = []
+            for renderer in renderers:
+                self.token.check()
+                images.append(render_thumbnail(renderer, self.max_side))
+
+            rects = []
+            if size_l == size_r:
+                img_l, img_r = images
+                sx = size_l.width() / img_l.width()
+                sy = size_l.height() / img_l.height()
+                mask = diff_mask(qimage_view(img_l), qimage_view(img_r))
+                for x, y, w, h in find_regions(mask):
+                    x1, y1 = max(0, (x - 1) * sx), max(0, (y - 1) * sy)
+                    x2, y2 = min(size_l.width(), (x + w + 1) * sx), min(size_l.height(), (y + h + 1) * sy)
+                    rects.append((x1, y1, x2 - x1, y2 - y1))
+            preview.set(rects=len(rects))
+        return {"width": max(size_l.width(), size_r.width()), "height": max(size_l.height(), size_r.height()),
+                "images": {"left": images[0], "right": images[1]}, "rects": rects}
+
+
+class DiffThread(PipelineThread):
+    """左右の配列から差分領域を計算する（結果: REGION_DTYPE の構造化配列）
+
+    data_l / data_r（配列を描画した SVG の内容）があれば先に構造比較し、同一なら画素比較を省略、
+    変更要素が特定できればその範囲だけを比較する（ファイルは読み直さないので、配列と食い違わない）。
+    tolerance（Tolerance）を渡すとアンチエイリアス程度の違いを差分に数えない。
+    return_mask=True なら結果は (差分領域, 差分画素の RunMask)。
+    """
+
+    def __init__(self, arr_l, arr_r, data_l=None, data_r=None, hashes_l=None, hashes_r=None, tolerance=None,
+                 return_mask=False, parent=None):
+        super().__init__(parent)
+        self.arr_l = arr_l
+        self.arr_r = arr_r
+        self.data_l = data_l
+        self.data_r = data_r
+        self.hashes_l = hashes_l
+        self.hashes_r = hashes_r
+        self.tolerance = tolerance
+        self.return_mask = return_mask
+
+    def work(self):
+        regions = None
+        if self.data_l is not None and self.data_r is not None:
+            self.progress.emit(0, "構造比較")
+            with tracing.span("structural_diff") as sp:
+                structure = structural_diff_data(self.data_l, self.data_r)
+                sp.set(identical=structure.identical,
+                       regions=None if structure.regions is None else len(structure.regions))
+            if structure.identical:
+                h, w = self.arr_l.shape[:2]
+                return (empty_regions(), RunMask(w, h)) if self.return_mask else empty_regions()
+            regions = structure.regions
+            self.token.check()
+
+        self.progress.emit(10, "compute_diff")
+        if regions is not None:
+            with tracing.span("compute_diff_in_regions", regions=len(regions)):
+                return compute_diff_rects_in_regions(self.arr_l, self.arr_r, regions,
+                                                     self.report(10, 100, "compute_diff"), self.tolerance,
+                                                     self.return_mask)
+        with tracing.span("compute_diff"):
+            return compute_diff_rects(self.arr_l, self.arr_r, self.report(10, 100, "compute_diff"),
+                                      self.hashes_l, self.hashes_r, tolerance=self.tolerance,
+                                      return_mask=self.return_mask)
+
+
+class TiledDiffThread(PipelineThread):
+    """全体を描画しない（メモリ上限を超える）ページの差分をタイル単位で計算する
+
+    左右の SVG をこのスレッドで解析し直し、tiled_compare.compare_renderers_tiled() で比較する。
+    data_l / data_r（読み込んだ内容）があれば先に構造比較し、同一なら描画を省略、変更範囲が分かればそこだけ比較する。
+    結果は DiffThread(return_mask=True) と同じ (差分領域, 差分画素の RunMask)。
+    """
+
+    def __init__(self, path_l, path_r, data_l=None, data_r=None, tolerance=None, normalizer=None,
+                 memory_budget_mb=MEMORY_BUDGET_MB, parent=None):
+        super().__init__(parent)
+        self.path_l = path_l
+        self.path_r = path_r
+        self.data_l = data_l
+        self.data_r = data_r
+        self.tolerance = tolerance
+        self.normalizer = normalizer
+        self.memory_budget_mb = memory_budget_mb
+
+    def work(self):
+        renderers = []
+        for side, path, data in (("left", self.path_l, self.data_l), ("right", self.path_r, self.data_r)):
+            if data is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+            renderer, _ = load_renderer(path, data, self.normalizer, side)
+            if not renderer.isValid():
+                raise ValueError(f"SVG を読み込めません: {path}")
+            renderers.append((renderer, data))
+        (renderer_l, data_l), (renderer_r, data_r) = renderers
+        size = renderer_l.defaultSize()
+        if size != renderer_r.defaultSize():
+            raise ValueError("左右の画像サイズが異なります。")
+
+        self.progress.emit(0, "構造比較")
+        with tracing.span("structural_diff") as sp:
+            structure = structural_diff_data(data_l, data_r)
+            sp.set(identical=structure.identical,
+                   regions=None if structure.regions is None else len(structure.regions))
+        if structure.identical:
+            return empty_regions(), RunMask(size.width(), size.height())
+        self.token.check()
+
+        with tracing.span("compare_tiled", regions=None if structure.regions is None else len(structure.regions)):
+            return compare_renderers_tiled(renderer_l, renderer_r, memory_budget_mb=self.memory_budget_mb,
+                                           progress=self.report(10, 100, "タイル比較"), regions=structure.regions,
+                                           tolerance=self.tolerance, return_mask=True)